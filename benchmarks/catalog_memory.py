@@ -0,0 +1,99 @@
+"""
+Measures the memory needed to hold a large catalog in memory, as fully
+materialized ColumnCatalogItems and as a compact CatalogStore.
+
+Does not need a database. Usage:
+
+    uv run python benchmarks/catalog_memory.py [n_tables] [n_columns]
+"""
+
+from __future__ import annotations
+
+import gc
+import sys
+import tracemalloc
+from typing import Any, Callable
+
+from harlequin_postgres.catalog import (
+    ColumnCatalogItem,
+    SchemaCatalogItem,
+    TableCatalogItem,
+)
+from harlequin_postgres.store import CatalogStore, SchemaSlice
+
+INT4_OID = 23
+
+
+def column_name(i: int) -> str:
+    # build a new string each time, like rows fetched from the server
+    return "".join(["col_", str(i)])
+
+
+def build_items(n_tables: int, n_columns: int) -> list[Any]:
+    schema = SchemaCatalogItem(
+        qualified_identifier='"bench"',
+        query_name='"bench"',
+        label="bench",
+        type_label="sch",
+        oid=1,
+    )
+    items: list[Any] = []
+    for i in range(n_tables):
+        table = TableCatalogItem(
+            qualified_identifier=f'"bench"."table_{i}"',
+            query_name=f'"bench"."table_{i}"',
+            label=f"table_{i}",
+            type_label="t",
+            parent=schema,
+            oid=i,
+        )
+        table.children = [
+            ColumnCatalogItem.from_parent(
+                parent=table, label=column_name(j), type_label="#"
+            )
+            for j in range(n_columns)
+        ]
+        items.append(table)
+    return items
+
+
+def build_store(n_tables: int, n_columns: int) -> CatalogStore:
+    schema_slice = SchemaSlice(1, "bench")
+    for i in range(n_tables):
+        schema_slice.add_relation(i, f"table_{i}", "r", "p")
+        for j in range(n_columns):
+            schema_slice.add_column(column_name(j), INT4_OID)
+    store = CatalogStore()
+    store.replace([schema_slice])
+    return store
+
+
+def measure(build: Callable[[int, int], Any], n_tables: int, n_columns: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = build(n_tables, n_columns)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main() -> None:
+    n_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 25_000
+    n_columns = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    results = {
+        "items": measure(build_items, n_tables, n_columns),
+        "store": measure(build_store, n_tables, n_columns),
+    }
+
+    print(f"Holding {n_tables} relations with {n_columns} columns each:")
+    for label, size in results.items():
+        print(
+            f"  {label:>6}: {size / 1024 / 1024:.1f} MiB total, "
+            f"{size / (n_tables * n_columns):.0f} bytes per column"
+        )
+    print(f"  {'ratio':>6}: {results['items'] / results['store']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measures prefix lookups in the CompletionIndex, compared to scanning a flat
+list of completions, with a large number of candidates.
+
+Does not need a database. Usage:
+
+    uv run python benchmarks/completion_lookup.py [n_candidates]
+"""
+
+from __future__ import annotations
+
+import sys
+from time import perf_counter
+
+from harlequin import HarlequinCompletion
+
+from harlequin_postgres.completions import CompletionIndex
+
+PREFIXES = ["s", "se", "sel", "cust", "order_1", "zzz"]
+
+
+def build_completions(n_candidates: int) -> list[HarlequinCompletion]:
+    words = ["customer", "order", "invoice", "select", "session", "shipment"]
+    return [
+        HarlequinCompletion(
+            label=f"{words[i % len(words)]}_{i}",
+            type_label="fn" if i % 3 else "t",
+            value=f"{words[i % len(words)]}_{i}",
+            priority=500 if i % 3 else 1000,
+            context=None,
+        )
+        for i in range(n_candidates)
+    ]
+
+
+def scan(completions: list[HarlequinCompletion], prefix: str) -> list[str]:
+    matches = [c for c in completions if c.match_val.startswith(prefix)]
+    return [c.label for c in sorted(matches)[:50]]
+
+
+def main() -> None:
+    n_candidates = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    completions = build_completions(n_candidates)
+    index = CompletionIndex()
+    start = perf_counter()
+    index.replace_completions(completions, type_labels=("fn", "t"))
+    print(f"Indexed {len(index)} completions in {perf_counter() - start:.2f}s")
+
+    print(f"{'prefix':>10} {'scan':>10} {'index':>10}")
+    for prefix in PREFIXES:
+        start = perf_counter()
+        expected = scan(completions, prefix)
+        scanned = perf_counter() - start
+        start = perf_counter()
+        for _ in range(100):
+            result = [c.label for c in index.complete(prefix)]
+        indexed = (perf_counter() - start) / 100
+        assert result == expected, prefix
+        print(f"{prefix:>10} {scanned * 1000:>8.2f}ms {indexed * 1000:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from itertools import cycle
-from typing import Any, Sequence
+from threading import Lock, RLock
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Mapping, Sequence
 
 from harlequin import (
     HarlequinAdapter,
@@ -12,16 +14,83 @@ from harlequin import (
 )
 from harlequin.catalog import Catalog, CatalogItem
 from harlequin.exception import HarlequinConnectionError, HarlequinQueryError
-from psycopg import Connection, Cursor, conninfo
+from psycopg import Connection, Cursor, OperationalError, conninfo
 from psycopg.errors import QueryCanceled
 from psycopg.pq import TransactionStatus
-from psycopg_pool import ConnectionPool
+from psycopg_pool import ConnectionPool, PoolTimeout
 from textual_fastdatatable.backend import AutoBackendType
 
 from harlequin_postgres.catalog import DatabaseCatalogItem
 from harlequin_postgres.cli_options import POSTGRES_OPTIONS
-from harlequin_postgres.completions import _get_completions
+from harlequin_postgres.completions import CompletionIndex, _get_completions
+from harlequin_postgres.explain import hot_node_rows, parse_plan
+from harlequin_postgres.idle_transactions import (
+    SERVER_TIMEOUT_MARGIN,
+    IdleTransactionGuard,
+)
 from harlequin_postgres.loaders import register_inf_loaders
+from harlequin_postgres.local import LocalDatabase
+from harlequin_postgres.meta_commands import (
+    MetaCommand,
+    StaticCursor,
+    run_meta_command,
+)
+from harlequin_postgres.profiles import (
+    BUILTIN_PROFILES,
+    CATALOG_SETTINGS,
+    DEFAULT_PROFILE,
+    apply_settings,
+    parse_profiles,
+)
+from harlequin_postgres.progress import (
+    PROGRESS_INTERVAL,
+    ProgressMonitor,
+    progress_query,
+)
+from harlequin_postgres.replicas import (
+    APPLY_SETTINGS_QUERY,
+    SESSION_SETTINGS_QUERY,
+    Replica,
+    ReplicaRouter,
+    is_read_only,
+    parse_replica_hosts,
+)
+from harlequin_postgres.result_cache import (
+    CACHE_FETCH_ROWS,
+    RESULT_CACHE_TTL,
+    SETTINGS_STATEMENT,
+    VOLATILE_FUNCTIONS_QUERY,
+    ResultCache,
+    called_functions,
+    normalize_query,
+    result_size,
+)
+from harlequin_postgres.schema_filter import SchemaFilter
+from harlequin_postgres.search import CatalogSearchIndex
+from harlequin_postgres.sessions import (
+    SESSIONS_QUERY,
+    Session,
+    SessionMonitor,
+)
+from harlequin_postgres.stat_statements import (
+    StatementsSnapshot,
+    StatStatementsSource,
+)
+from harlequin_postgres.store import CatalogStore, slices_from_rows
+from harlequin_postgres.type_labels import TypeLabelRegistry
+
+if TYPE_CHECKING:
+    from harlequin.driver import HarlequinDriver
+
+COLUMNS_QUERY = """
+    select a.attname, a.atttypid
+    from pg_catalog.pg_attribute a
+    where
+        a.attrelid = %s
+        and a.attnum > 0
+        and not a.attisdropped
+    order by a.attnum asc
+    ;"""
 
 
 class HarlequinPostgresCursor(HarlequinCursor):
@@ -46,10 +115,7 @@ class HarlequinPostgresCursor(HarlequinCursor):
 
     def fetchall(self) -> AutoBackendType:
         try:
-            if self._limit is None:
-                return self.cur.fetchall()
-            else:
-                return self.cur.fetchmany(self._limit)
+            return self._fetch()
         except QueryCanceled:
             return []
         except Exception as e:
@@ -60,6 +126,56 @@ class HarlequinPostgresCursor(HarlequinCursor):
         finally:
             self.cur.close()
 
+    def _fetch(self) -> list[tuple[Any, ...]]:
+        if self._limit is None:
+            return self.cur.fetchall()
+        else:
+            return self.cur.fetchmany(self._limit)
+
+
+class CachingCursor(HarlequinPostgresCursor):
+    """
+    A cursor that stores its result in the result cache as it is fetched,
+    unless the result is larger than the cache, or more rows than the limit.
+    """
+
+    def __init__(
+        self,
+        conn: HarlequinPostgresConnection,
+        cur: Cursor,
+        cache: ResultCache,
+        key: Hashable,
+    ) -> None:
+        super().__init__(conn, cur)
+        self.cache = cache
+        self.key = key
+
+    def _fetch(self) -> list[tuple[Any, ...]]:
+        limit = self._limit
+        rows: list[tuple[Any, ...]] = []
+        size = 0
+        while limit is None or len(rows) < limit:
+            n = (
+                CACHE_FETCH_ROWS
+                if limit is None
+                else min(CACHE_FETCH_ROWS, limit - len(rows))
+            )
+            batch = self.cur.fetchmany(n)
+            rows.extend(batch)
+            size += result_size(batch)
+            if len(batch) < n:
+                # that was the whole result
+                self.cache.put(self.key, self.columns(), rows, size=size)
+                return rows
+            if size > self.cache.max_bytes:
+                break
+        # too large to cache, so the rest is fetched without sizing it
+        if limit is None:
+            rows.extend(self.cur.fetchall())
+        elif len(rows) < limit:
+            rows.extend(self.cur.fetchmany(limit - len(rows)))
+        return rows
+
 
 class HarlequinPostgresConnection(HarlequinConnection):
     def __init__(
@@ -68,8 +184,26 @@ class HarlequinPostgresConnection(HarlequinConnection):
         *_: Any,
         init_message: str = "",
         options: dict[str, Any],
+        prepare_statements: bool = True,
+        schema_filter: SchemaFilter | None = None,
+        replica_hosts: Sequence[tuple[str, str | None]] = (),
+        idle_transaction_timeout: float | None = None,
+        idle_transaction_server_timeout: bool = False,
+        profiles: Mapping[str, Mapping[str, str]] | None = None,
+        profile: str = DEFAULT_PROFILE,
+        result_cache_size: float | None = None,
+        result_cache_ttl: float = RESULT_CACHE_TTL,
     ) -> None:
         self.init_message = init_message
+        self.prepare_statements = prepare_statements
+        self.idle_transaction_timeout = idle_transaction_timeout
+        self.idle_transaction_server_timeout = idle_transaction_server_timeout
+        self.profiles: dict[str, Mapping[str, str]] = {
+            **BUILTIN_PROFILES,
+            **(profiles or {}),
+        }
+        self.profile = profile
+        self.schema_filter = schema_filter or SchemaFilter()
         try:
             self.conn_info = conninfo.conninfo_to_dict(
                 conninfo=conn_str[0] if conn_str else "", **options
@@ -93,21 +227,84 @@ class HarlequinPostgresConnection(HarlequinConnection):
                     "Invalid value for connection_timeout."
                 ),
             ) from e
+        options = {
+            **{k: v for k, v in KEEPALIVE_OPTIONS.items() if k not in self.conn_info},
+            **options,
+        }
+        # held while a statement runs on the main connection, so the idle
+        # transaction guard never rolls back a transaction that is in use
+        self._main_conn_lock = RLock()
+        # when the main connection's transaction started, and the message for
+        # the next statement if the guard rolled it back
+        self._transaction_started_at: float | None = None
+        self._idle_rollback: str | None = None
         try:
             self.pool: ConnectionPool = ConnectionPool(
                 conninfo=conn_str[0] if conn_str and conn_str[0] else "",
                 min_size=2,
                 max_size=5,
                 kwargs=options,
+                configure=self._configure_connection,
+                check=ConnectionPool.check_connection,
                 open=True,
                 timeout=timeout,
             )
             self._main_conn: Connection = self.pool.getconn()
+            self._main_conn_used_at = monotonic()
+            self._apply_profile()
         except Exception as e:
             raise HarlequinConnectionError(
                 msg=str(e), title="Harlequin could not connect to Postgres."
             ) from e
 
+        self._type_registry: TypeLabelRegistry | None = None
+        self._type_registry_lock = Lock()
+        self.catalog_store = CatalogStore()
+        # set when DDL runs in a transaction that has not committed yet
+        self._uncommitted_ddl = False
+        self._search_index = CatalogSearchIndex()
+        self._completion_index = CompletionIndex()
+        # the latest completions from get_completions(), which complete()
+        # indexes the next time it is called
+        self._unindexed_completions: list[HarlequinCompletion] | None = None
+        self._completions_indexed = False
+        self.statements_snapshot: StatementsSnapshot | None = None
+        # a pool connection held for the sessions view and the lock monitor,
+        # so they can still run when the rest of the pool is busy or blocked
+        self._monitor_conn: Connection | None = None
+        self._monitor_lock = Lock()
+        self.session_monitor: SessionMonitor | None = None
+        # when set, maintenance statements report their progress to it
+        self.progress_notifier: Callable[[str], None] | None = None
+        self.progress_interval = PROGRESS_INTERVAL
+        # read-only statements and catalog queries go to a replica, if any
+        self.replicas: ReplicaRouter | None = None
+        if replica_hosts:
+            self.replicas = ReplicaRouter(
+                [
+                    Replica(
+                        host,
+                        port,
+                        conninfo=conn_str[0] if conn_str and conn_str[0] else "",
+                        options=options,
+                        configure=self._configure_connection,
+                    )
+                    for host, port in replica_hosts
+                ]
+            )
+        self._replica_conn: Connection | None = None
+        # query results copied into DuckDB by \\materialize, created on first use
+        self._local_database: LocalDatabase | None = None
+        # results of read-only queries, if the user turned the cache on
+        self.result_cache: ResultCache | None = None
+        if result_cache_size:
+            self.result_cache = ResultCache(
+                max_bytes=int(result_cache_size * 1024 * 1024),
+                ttl=result_cache_ttl,
+            )
+        # the main connection's SET settings, reloaded after they change
+        self._session_settings: list[tuple[str, str]] | None = None
+
         self._transaction_modes = cycle(
             [
                 HarlequinTransactionMode(label="Auto"),
@@ -120,54 +317,514 @@ class HarlequinPostgresConnection(HarlequinConnection):
         )
         self.toggle_transaction_mode()
 
+        self.idle_transaction_guard: IdleTransactionGuard | None = None
+        if idle_transaction_timeout:
+            self.idle_transaction_guard = IdleTransactionGuard(
+                self, timeout=idle_transaction_timeout
+            )
+            self.idle_transaction_guard.start()
+
+    def _configure_connection(self, conn: Connection) -> None:
+        """
+        Configure each new connection in the pool. Pooled connections run in
+        autocommit, so catalog queries don't wait on an implicit begin, and
+        the pool doesn't need to roll them back when they are returned.
+        """
+        conn.autocommit = True
+        if not self.prepare_statements:
+            # psycopg otherwise prepares any query executed 5 times
+            conn.prepare_threshold = None
+        apply_settings(conn, self._pool_settings())
+
+    def _pool_settings(self) -> dict[str, str]:
+        settings = dict(CATALOG_SETTINGS)
+        if self.idle_transaction_server_timeout and self.idle_transaction_timeout:
+            # a backstop for when Harlequin can't roll back, which ends the
+            # session instead
+            timeout_ms = int(
+                (self.idle_transaction_timeout + SERVER_TIMEOUT_MARGIN) * 1000
+            )
+            settings["idle_in_transaction_session_timeout"] = str(timeout_ms)
+        return settings
+
+    def _apply_profile(self) -> None:
+        """
+        Applies the active profile to the main connection, which the pool
+        configured for catalog queries, so the catalog's timeouts are reset
+        unless the profile sets them.
+        """
+        apply_settings(
+            self._main_conn,
+            self.profiles[self.profile],
+            reset=set(CATALOG_SETTINGS),
+        )
+
+    def set_profile(self, name: str) -> None:
+        """
+        Switches the main connection to the named profile. The old profile's
+        settings are reset first, so they don't leak into the new one.
+        """
+        title = "Harlequin could not switch profiles."
+        if name not in self.profiles:
+            raise HarlequinQueryError(
+                msg=(
+                    f"There is no profile named {name}. The profiles are: "
+                    f"{', '.join(self.profiles)}."
+                ),
+                title=title,
+            )
+        if self._in_transaction():
+            raise HarlequinQueryError(
+                msg=(
+                    "Commit or roll back your transaction first, since rolling "
+                    "it back would also undo the new profile's settings."
+                ),
+                title=title,
+            )
+        try:
+            apply_settings(
+                self._main_conn,
+                self.profiles[name],
+                reset=set(CATALOG_SETTINGS) | set(self.profiles[self.profile]),
+            )
+        except Exception as e:
+            raise HarlequinQueryError(msg=str(e), title=title) from e
+        finally:
+            self._session_settings = None
+        self.profile = name
+
     def execute(self, query: str) -> HarlequinCursor | None:
+        with self._main_conn_lock:
+            if self._idle_rollback is not None:
+                msg, self._idle_rollback = self._idle_rollback, None
+                raise HarlequinQueryError(
+                    msg=f"{msg} Your statement was not run.",
+                    title="Harlequin rolled back your idle transaction.",
+                )
+            started = monotonic()
+            try:
+                if self.result_cache is not None and MetaCommand.parse(query) is None:
+                    return self._execute_cached(query)
+                return self._execute_with_reconnect(query)
+            finally:
+                # meta-commands don't use the transaction, so they don't
+                # count as activity
+                if MetaCommand.parse(query) is None:
+                    self._main_conn_used_at = monotonic()
+                if not self._in_open_transaction():
+                    self._transaction_started_at = None
+                elif self._transaction_started_at is None:
+                    self._transaction_started_at = started
+
+    def _execute_cached(self, query: str) -> HarlequinCursor | None:
+        """
+        Answers a read-only query that runs outside of a transaction, and
+        doesn't call a volatile function, from the result cache, or runs it
+        and caches its result as it is fetched. The key includes the session's
+        settings, like the search_path. Any other statement, except SET, RESET,
+        and SHOW, may write, so it clears the cache.
+        """
+        assert self.result_cache is not None
+        if not is_read_only(query):
+            if SETTINGS_STATEMENT.match(query) is None:
+                self.result_cache.clear()
+            return self._execute_with_reconnect(query)
+        if self.transaction_mode.label != "Auto" or self._in_transaction():
+            return self._execute_with_reconnect(query)
+        if self._calls_volatile_function(query):
+            return self._execute_with_reconnect(query)
+        if self._session_settings is None:
+            # loading the settings is a query, but a cache hit is not
+            self._ensure_main_conn()
+        key = (normalize_query(query), tuple(self._get_session_settings()))
+        hit = self.result_cache.get(key)
+        if hit is not None:
+            return StaticCursor(*hit)
+        cur = self._execute_with_reconnect(query)
+        if not isinstance(cur, HarlequinPostgresCursor):
+            return cur
+        return CachingCursor(self, cur.cur, self.result_cache, key)
+
+    def _calls_volatile_function(self, query: str) -> bool:
+        """
+        Returns True if query calls a function that may write, like
+        pg_advisory_lock() or set_config(), or that may return a different
+        result each time, like random(). Also True if that can't be checked.
+        """
+        assert self.result_cache is not None
+        names = called_functions(query)
+        if not names:
+            return False
+        volatile = self.result_cache.volatile.get(names)
+        if volatile is None:
+            pool = self._catalog_pool()
+            try:
+                conn: Connection = pool.getconn()
+            except PoolTimeout:
+                return True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(VOLATILE_FUNCTIONS_QUERY, (sorted(names),))
+                    row = cur.fetchone()
+                volatile = row is None or bool(row[0])
+            except Exception:
+                return True
+            finally:
+                pool.putconn(conn)
+            self.result_cache.volatile[names] = volatile
+        return volatile
+
+    def _execute_with_reconnect(self, query: str) -> HarlequinCursor | None:
+        self._ensure_main_conn()
+        in_transaction = self.transaction_mode.label != "Auto" or self._in_transaction()
+        try:
+            return self._execute(query)
+        except OperationalError as e:
+            if not self._main_conn.broken and not self._main_conn.closed:
+                raise
+            # the server restarted or the connection was dropped
+            self._replace_main_conn()
+            if not in_transaction and is_read_only(query):
+                return self._execute(query)
+            raise HarlequinQueryError(
+                msg=(
+                    f"{e}\n\nThe connection to the server was lost, so Harlequin "
+                    "opened a new one. "
+                    + (
+                        "Your open transaction was rolled back. "
+                        if in_transaction
+                        else "Your statement may or may not have run. "
+                    )
+                    + "Session settings and temporary tables were lost."
+                ),
+                title="Harlequin lost its connection to Postgres.",
+            ) from e
+
+    def _ensure_main_conn(self) -> None:
+        """
+        Replaces the main connection if it is closed, or, after it has been
+        idle for a while, if it fails a health check. A connection in a
+        transaction is never replaced, since that would lose the transaction.
+        """
+        conn = self._main_conn
+        if conn.info.transaction_status not in (
+            TransactionStatus.IDLE,
+            TransactionStatus.UNKNOWN,
+        ):
+            return
+        if not conn.closed and not conn.broken:
+            if monotonic() - self._main_conn_used_at < MAIN_CONN_CHECK_INTERVAL:
+                return
+            try:
+                ConnectionPool.check_connection(conn)
+                return
+            except Exception:
+                pass
+        self._replace_main_conn()
+
+    def _replace_main_conn(self) -> None:
+        # the pool discards connections that are returned broken
+        old = self._main_conn
+        try:
+            self.pool.putconn(old)
+        except Exception:
+            pass
+        try:
+            self._main_conn = self.pool.getconn()
+            self._apply_profile()
+        except Exception as e:
+            raise HarlequinQueryError(
+                msg=str(e), title="Harlequin could not reconnect to Postgres."
+            ) from e
+        self._uncommitted_ddl = False
+        self._session_settings = None
+
+    def _execute(self, query: str) -> HarlequinCursor | None:
+        meta_command = MetaCommand.parse(query)
+        if meta_command is not None:
+            return run_meta_command(self, meta_command)
         if (
+            self.replicas is not None
+            and self.transaction_mode.label == "Auto"
+            and not self._in_transaction()
+            and is_read_only(query)
+        ):
+            try:
+                replica_cur = self._execute_on_replica(query)
+            except QueryCanceled:
+                return None
+            if replica_cur is not None:
+                return replica_cur
+        # the main connection stays in autocommit, and Manual mode opens its
+        # transactions explicitly, so that the begin can be pipelined with the
+        # first statement instead of costing its own round trip.
+        begin = (
             self.transaction_mode.label != "Auto"
             and self._main_conn.info.transaction_status == TransactionStatus.IDLE
-        ):
-            cur = self._main_conn.cursor()
-            cur.execute(query="begin;")
-            cur.close()
-
+        )
+        progress = self._start_progress_monitor(query)
         try:
             cur = self._main_conn.cursor()
-            cur.execute(query=query)
+            if begin and _can_pipeline(query):
+                with self._main_conn.pipeline():
+                    self._main_conn.execute("begin")
+                    cur.execute(query=query)
+            else:
+                if begin:
+                    self._main_conn.execute("begin")
+                cur.execute(query=query)
         except QueryCanceled:
             cur.close()
             return None
         except Exception as e:
-            msg_suffix = ""
+            if self._main_conn.broken or self._main_conn.closed:
+                # execute() reconnects
+                raise
             try:
                 cur.close()
                 self.rollback()
             except Exception:
-                # likely connection is closed; error messages
-                # can be cryptic, so help the user.
-                msg_suffix = (
-                    "\n\nYou may need to restart Harlequin to reconnect to the "
-                    "database."
-                )
+                if self._main_conn.broken or self._main_conn.closed:
+                    raise
             raise HarlequinQueryError(
-                msg=f"{e}{msg_suffix}",
+                msg=str(e),
                 title="Harlequin encountered an error while executing your query.",
             ) from e
         else:
             if cur.description is not None:
                 return HarlequinPostgresCursor(self, cur)
             else:
+                # DDL may have changed the catalog, so meta-commands should not
+                # be answered from the catalog store until it is reloaded. The
+                # catalog pool can't see DDL in an open transaction, so check
+                # again when it commits.
+                tags = _command_tags(cur)
+                if not NON_DDL_COMMANDS.issuperset(tags):
+                    self.catalog_store.invalidate()
+                    self._uncommitted_ddl = self._in_transaction()
+                elif tags[-1] in ("COMMIT", "ROLLBACK"):
+                    self._end_transaction(commit=tags[-1] == "COMMIT")
+                if SETTINGS_COMMANDS.intersection(tags):
+                    self._session_settings = None
                 cur.close()
                 return None
+        finally:
+            if progress is not None:
+                progress.stop()
+
+    def _execute_on_replica(self, query: str) -> HarlequinPostgresCursor | None:
+        """
+        Runs a read-only query on the least-lagged healthy replica, with the
+        main connection's session settings. Returns None if no replica can
+        run it, so that it runs on the primary, which reports any error.
+        """
+        assert self.replicas is not None
+        replica = self.replicas.pick()
+        if replica is None:
+            return None
+        settings = self._get_session_settings()
+        try:
+            with replica.pool.connection() as conn:
+                self._replica_conn = conn
+                try:
+                    # SET LOCAL settings expire with this transaction, so the
+                    # pooled connection is left as it was
+                    with conn.transaction():
+                        if settings:
+                            conn.execute(
+                                APPLY_SETTINGS_QUERY,
+                                (
+                                    [name for name, _ in settings],
+                                    [value for _, value in settings],
+                                ),
+                            )
+                        cur = conn.cursor()
+                        cur.execute(query)
+                finally:
+                    self._replica_conn = None
+        except QueryCanceled:
+            raise
+        except (OperationalError, PoolTimeout):
+            replica.mark_down()
+            return None
+        except Exception:
+            # e.g., a function that writes, or a conflict with recovery
+            return None
+        if cur.description is None:
+            return None
+        return HarlequinPostgresCursor(self, cur)
+
+    def _get_session_settings(self) -> list[tuple[str, str]]:
+        if self._session_settings is None:
+            self._session_settings = self._main_conn.execute(
+                SESSION_SETTINGS_QUERY
+            ).fetchall()
+        return self._session_settings
+
+    def _catalog_pool(self) -> ConnectionPool:
+        """
+        The pool for catalog and completion queries: the least-lagged healthy
+        replica's, or the primary's.
+        """
+        replica = self.replicas.pick() if self.replicas is not None else None
+        return replica.pool if replica is not None else self.pool
+
+    def _start_progress_monitor(self, query: str) -> ProgressMonitor | None:
+        """
+        Starts polling the progress of query on the main connection, if a
+        progress notifier is set and Postgres reports progress for the query.
+        """
+        if self.progress_notifier is None:
+            return None
+        monitor_query = progress_query(query)
+        if monitor_query is None:
+            return None
+        monitor = ProgressMonitor(
+            self.pool,
+            pid=self._main_conn.info.backend_pid,
+            query=monitor_query,
+            notify=self.progress_notifier,
+            interval=self.progress_interval,
+        )
+        monitor.start()
+        return monitor
+
+    def explain(self, query: str, analyze: bool = False) -> StaticCursor:
+        """
+        Runs EXPLAIN (FORMAT JSON) for query on the main connection, so it sees
+        the session's settings and temp tables, and returns one row per plan
+        node, hottest first. With analyze, the query is executed (with
+        BUFFERS) inside a transaction or savepoint that is always rolled back,
+        so data-modifying statements leave no trace.
+        """
+        options = "analyze, buffers, format json" if analyze else "format json"
+        try:
+            with self._main_conn.transaction(force_rollback=True):
+                with self._main_conn.cursor() as cur:
+                    cur.execute(f"explain ({options}) {query}")
+                    row = cur.fetchone()
+        except QueryCanceled as e:
+            raise HarlequinQueryError(
+                msg="The query was canceled.",
+                title="Harlequin could not explain your query.",
+            ) from e
+        except Exception as e:
+            raise HarlequinQueryError(
+                msg=str(e), title="Harlequin could not explain your query."
+            ) from e
+        assert row is not None
+        columns, rows = hot_node_rows(parse_plan(row[0]), analyze=analyze)
+        return StaticCursor(columns, rows)
+
+    def materialize(self, name: str, query: str) -> int:
+        """
+        Copies the result of query, run on the main connection, into a local
+        DuckDB table called name, and returns the number of rows copied. In a
+        transaction, it runs in a savepoint, so an error does not abort it.
+        """
+        title = "Harlequin could not materialize your query."
+        try:
+            local = self.local_database
+            with self._main_conn.transaction():
+                return local.materialize(self._main_conn, name, query)
+        except QueryCanceled as e:
+            raise HarlequinQueryError(msg="The query was canceled.", title=title) from e
+        except Exception as e:
+            if self._main_conn.broken or self._main_conn.closed:
+                raise
+            raise HarlequinQueryError(msg=str(e), title=title) from e
+
+    @property
+    def local_database(self) -> LocalDatabase:
+        if self._local_database is None:
+            self._local_database = LocalDatabase()
+        return self._local_database
 
     def cancel(self) -> None:
+        replica_conn = self._replica_conn
+        if replica_conn is not None:
+            replica_conn.cancel_safe()
         self._main_conn.cancel_safe()
 
     def commit(self) -> None:
-        self._main_conn.commit()
+        with self._main_conn_lock:
+            if self._idle_rollback is not None:
+                msg, self._idle_rollback = self._idle_rollback, None
+                raise HarlequinQueryError(
+                    msg=f"{msg} Nothing was committed.",
+                    title="Harlequin rolled back your idle transaction.",
+                )
+            self._commit()
+
+    def _commit(self) -> None:
+        with self._main_conn_lock:
+            self._main_conn.commit()
+            self._end_transaction(commit=True)
 
     def rollback(self) -> None:
-        self._main_conn.rollback()
+        with self._main_conn_lock:
+            self._idle_rollback = None
+            self._main_conn.rollback()
+            self._end_transaction(commit=False)
+
+    def _in_transaction(self) -> bool:
+        return self._main_conn.info.transaction_status != TransactionStatus.IDLE
+
+    def _in_open_transaction(self) -> bool:
+        # unlike _in_transaction, False for a closed or broken connection
+        return self._main_conn.info.transaction_status in (
+            TransactionStatus.INTRANS,
+            TransactionStatus.INERROR,
+        )
+
+    def _idle_transaction_times(self) -> tuple[float, float] | None:
+        """
+        Returns the seconds since the main connection's transaction started,
+        and since its last statement finished, or None if no transaction is
+        open or a statement is running.
+        """
+        if not self._main_conn_lock.acquire(blocking=False):
+            return None
+        try:
+            if self._transaction_started_at is None or not self._in_open_transaction():
+                return None
+            now = monotonic()
+            return now - self._transaction_started_at, now - self._main_conn_used_at
+        finally:
+            self._main_conn_lock.release()
+
+    def _rollback_idle_transaction(self, timeout: float) -> bool:
+        """
+        Rolls back the main connection's transaction if it is still idle after
+        timeout seconds. Returns True if it was rolled back.
+        """
+        if not self._main_conn_lock.acquire(blocking=False):
+            return False
+        try:
+            times = self._idle_transaction_times()
+            if times is None or times[1] < timeout:
+                return False
+            self.rollback()
+            self._idle_rollback = (
+                f"Your transaction was idle for {int(times[1])} seconds, so "
+                "Harlequin rolled it back to release its locks."
+            )
+            return True
+        finally:
+            self._main_conn_lock.release()
+
+    def _end_transaction(self, commit: bool) -> None:
+        if commit and self._uncommitted_ddl:
+            self.catalog_store.invalidate()
+        self._uncommitted_ddl = False
+        self._transaction_started_at = None
+        # a rollback undoes SET, and a commit makes SET LOCAL expire
+        self._session_settings = None
 
     def get_catalog(self) -> Catalog:
+        # a catalog refresh usually follows DDL, which may have created types
+        self._type_registry = None
+        self.catalog_store = CatalogStore()
         databases = self._get_databases()
         db_items: list[CatalogItem] = [
             DatabaseCatalogItem.from_label(label=db, connection=self)
@@ -175,15 +832,110 @@ class HarlequinPostgresConnection(HarlequinConnection):
         ]
         return Catalog(items=db_items)
 
+    def search_catalog(self, query: str, limit: int = 20) -> list[CatalogItem]:
+        """
+        Returns up to `limit` schemas, relations, and columns in the current
+        database whose names fuzzily match `query`, best matches first. The
+        first search loads every schema into the catalog store with a single
+        query; later searches only re-index schemas that were reloaded.
+        """
+        dbname = self._main_conn.info.dbname
+        if not self.catalog_store.complete:
+            self._load_catalog_store(dbname)
+        self._search_index.sync(self.catalog_store)
+        hits = self._search_index.search(query, limit=limit)
+        database = DatabaseCatalogItem.from_label(label=dbname, connection=self)
+        return database.items_from_search_hits(hits)
+
     def get_completions(self) -> list[HarlequinCompletion]:
-        conn: Connection = self.pool.getconn()
-        completions = _get_completions(conn)
-        self.pool.putconn(conn)
+        pool = self._catalog_pool()
+        conn: Connection = pool.getconn()
+        completions = _get_completions(conn, self.schema_filter)
+        pool.putconn(conn)
+        self._unindexed_completions = completions
         return completions
 
+    def complete(
+        self,
+        prefix: str,
+        context: str | None = None,
+        type_labels: Sequence[str] | None = None,
+        limit: int = 50,
+    ) -> list[HarlequinCompletion]:
+        """
+        Looks up completions by prefix in the completion index, which holds
+        the keywords, functions, and settings from get_completions(), plus
+        the relations (in a schema's context) and columns (in a
+        "schema.relation" context) of every schema in the catalog store.
+        Harlequin's editor does not call this; its completions still come from
+        get_completions() and the catalog, so the index is only built (and
+        updated) when this is called.
+        """
+        if self._unindexed_completions is None and not self._completions_indexed:
+            self.get_completions()
+        if self._unindexed_completions is not None:
+            self._completion_index.replace_completions(
+                self._unindexed_completions, type_labels=("kw", "fn", "agg", "set")
+            )
+            self._unindexed_completions = None
+            self._completions_indexed = True
+        self._completion_index.sync(self.catalog_store)
+        return self._completion_index.complete(
+            prefix, context=context, type_labels=type_labels, limit=limit
+        )
+
+    def get_sessions(self) -> list[Session]:
+        """
+        Returns every client backend in the cluster (except the monitor's
+        own), with the pids that block it and the lock it is waiting for.
+        """
+        rows = self._run_on_monitor_conn(SESSIONS_QUERY)
+        return [Session.from_row(row) for row in rows]
+
+    def signal_backend(self, pid: int, terminate: bool = False) -> bool:
+        """
+        Cancels the current query of the backend with pid, or terminates its
+        session. Returns False if there is no backend with that pid.
+        """
+        func = "pg_terminate_backend" if terminate else "pg_cancel_backend"
+        rows = self._run_on_monitor_conn(f"select pg_catalog.{func}(%s)", (pid,))
+        return bool(rows and rows[0][0])
+
+    def start_session_monitor(
+        self, driver: HarlequinDriver, interval: float = 5.0
+    ) -> bool:
+        """
+        Starts polling for blocked sessions in a background thread. Returns
+        False if the monitor was already running.
+        """
+        if self.session_monitor is not None and self.session_monitor.is_alive():
+            return False
+        self.session_monitor = SessionMonitor(self, driver, interval=interval)
+        self.session_monitor.start()
+        return True
+
+    def stop_session_monitor(self) -> bool:
+        """
+        Stops the lock monitor. Returns False if it was not running.
+        """
+        monitor, self.session_monitor = self.session_monitor, None
+        if monitor is None or not monitor.is_alive():
+            return False
+        monitor.stop()
+        return True
+
     def close(self) -> None:
+        self.stop_session_monitor()
+        if self.idle_transaction_guard is not None:
+            self.idle_transaction_guard.stop()
+        if self._local_database is not None:
+            self._local_database.close()
+        if self._monitor_conn is not None:
+            self.pool.putconn(self._monitor_conn)
         self.pool.putconn(self._main_conn)
         self.pool.close()
+        if self.replicas is not None:
+            self.replicas.close()
 
     @property
     def transaction_mode(self) -> HarlequinTransactionMode:
@@ -198,15 +950,13 @@ class HarlequinPostgresConnection(HarlequinConnection):
         """
         Sync this class's transaction mode with the main connection
         """
-        conn = self._main_conn
         if self.transaction_mode.label == "Auto":
-            conn.autocommit = True
-            conn.commit()
-        else:
-            conn.autocommit = False
+            # a pending idle rollback is still reported by the next statement
+            self._commit()
 
     def _get_databases(self) -> list[tuple[str]]:
-        conn: Connection = self.pool.getconn()
+        pool = self._catalog_pool()
+        conn: Connection = pool.getconn()
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -219,224 +969,485 @@ class HarlequinPostgresConnection(HarlequinConnection):
                 ;"""
             )
             results: list[tuple[str]] = cur.fetchall()
-        self.pool.putconn(conn)
+        pool.putconn(conn)
         return results
 
-    def _get_schemas(self, dbname: str) -> list[tuple[str]]:
-        conn: Connection = self.pool.getconn()
+    def _get_schemas(self, dbname: str) -> list[tuple[int, str]]:
+        pool = self._catalog_pool()
+        conn: Connection = pool.getconn()
         with conn.cursor() as cur:
             cur.execute(
-                """
-                select schema_name
-                from information_schema.schemata
+                f"""
+                select n.oid, n.nspname
+                from pg_catalog.pg_namespace n
                 where
-                    catalog_name = %s
-                    and schema_name != 'information_schema'
-                    and schema_name not like 'pg\\_%%' escape '\\'
-                order by schema_name asc
+                    current_database() = %(dbname)s
+                    and n.nspname != 'information_schema'
+                    and n.nspname not like 'pg\\_%%' escape '\\'
+                    and (
+                        pg_catalog.pg_has_role(n.nspowner, 'usage')
+                        or pg_catalog.has_schema_privilege(n.oid, 'create, usage')
+                    )
+                    and {SchemaFilter.clause("n.nspname")}
+                order by n.nspname asc
                 ;""",
-                (dbname,),
+                {"dbname": dbname, **self.schema_filter.params},
+                prepare=self.prepare_statements,
             )
-            results: list[tuple[str]] = cur.fetchall()
-        self.pool.putconn(conn)
+            results: list[tuple[int, str]] = cur.fetchall()
+        # the store only holds schemas of the database Harlequin connected to
+        if dbname == conn.info.dbname:
+            self.catalog_store.list_schemas(results)
+        pool.putconn(conn)
         return results
 
-    def _get_relations(self, dbname: str, schema: str) -> list[tuple[str, str]]:
-        conn: Connection = self.pool.getconn()
+    def _load_catalog_store(
+        self, dbname: str, schema_oids: Sequence[int] = ()
+    ) -> CatalogStore:
+        """
+        Loads the relations and columns of the given schemas (or of every
+        visible schema, if none are given) into the catalog store, replacing
+        any slices that were loaded before. Expanding a schema runs a prepared
+        query; loading every schema streams its rows from a server-side cursor
+        instead, so the full result set is never held in memory at once.
+        """
+        query = f"""
+        select
+            n.oid,
+            n.nspname,
+            c.oid,
+            c.relname,
+            c.relkind,
+            c.relpersistence,
+            a.attname,
+            a.atttypid
+        from pg_catalog.pg_namespace n
+        left join pg_catalog.pg_class c
+            on c.relnamespace = n.oid
+            and c.relkind in ('r', 'p', 'v', 'f', 'm')
+            and not c.relispartition
+            and (
+                pg_catalog.pg_has_role(c.relowner, 'usage')
+                or pg_catalog.has_table_privilege(
+                    c.oid,
+                    'select, insert, update, delete, truncate, '
+                    'references, trigger'
+                )
+                or pg_catalog.has_any_column_privilege(
+                    c.oid, 'select, insert, update, references'
+                )
+            )
+        left join pg_catalog.pg_attribute a
+            on a.attrelid = c.oid
+            and a.attnum > 0
+            and not a.attisdropped
+        where
+            current_database() = %(dbname)s
+            and (
+                cardinality(%(schema_oids)s::oid[]) = 0
+                or n.oid = any(%(schema_oids)s::oid[])
+            )
+            and n.nspname != 'information_schema'
+            and n.nspname not like 'pg\\_%%' escape '\\'
+            and {SchemaFilter.clause("n.nspname")}
+        order by
+            n.oid asc,
+            c.relkind = 'm' asc,
+            c.relname asc,
+            c.oid asc,
+            a.attnum asc
+        ;"""
+        params = {
+            "dbname": dbname,
+            "schema_oids": list(schema_oids),
+            **self.schema_filter.params,
+        }
+        pool = self._catalog_pool()
+        conn: Connection = pool.getconn()
+        try:
+            if schema_oids:
+                with conn.cursor() as cur:
+                    cur.execute(query, params, prepare=self.prepare_statements)
+                    slices = slices_from_rows(cur)
+            else:
+                # named cursors are declared in a transaction and can't be
+                # prepared
+                with conn.transaction():
+                    with conn.cursor(name="harlequin_catalog_store") as cur:
+                        cur.itersize = 10_000
+                        cur.execute(query, params)
+                        slices = slices_from_rows(cur)
+        finally:
+            pool.putconn(conn)
+        # schemas that were dropped since they were last loaded return no rows
+        for schema_oid in set(schema_oids) - {s.oid for s in slices}:
+            self.catalog_store.remove(schema_oid)
+        self.catalog_store.replace(slices)
+        if not schema_oids:
+            self.catalog_store.complete = True
+            self.catalog_store.list_schemas((s.oid, s.name) for s in slices)
+        return self.catalog_store
+
+    def _get_columns(self, relation_oid: int) -> list[tuple[str, int]]:
+        pool = self._catalog_pool()
+        conn: Connection = pool.getconn()
+        with conn.cursor() as cur:
+            cur.execute(COLUMNS_QUERY, (relation_oid,), prepare=self.prepare_statements)
+            results: list[tuple[str, int]] = cur.fetchall()
+        pool.putconn(conn)
+        return results
+
+    def _get_partitioned_table_children(
+        self, relation_oid: int
+    ) -> tuple[list[tuple[str, int]], tuple[int, str]]:
+        """
+        Returns the columns of a partitioned table, plus the number of its
+        partitions and the total size of its leaf partitions. The two queries
+        are pipelined, so they cost a single round trip.
+        """
+        pool = self._catalog_pool()
+        conn: Connection = pool.getconn()
+        with conn.cursor() as columns_cur, conn.cursor() as summary_cur:
+            with conn.pipeline():
+                columns_cur.execute(
+                    COLUMNS_QUERY, (relation_oid,), prepare=self.prepare_statements
+                )
+                summary_cur.execute(
+                    """
+                    with recursive
+                        partitions as (
+                            select i.inhrelid as relid, 1 as depth
+                            from pg_catalog.pg_inherits i
+                            where i.inhparent = %(oid)s
+                            union all
+                            select i.inhrelid, p.depth + 1
+                            from pg_catalog.pg_inherits i
+                            join partitions p on i.inhparent = p.relid
+                        )
+                    select
+                        count(*) filter (where depth = 1),
+                        pg_catalog.pg_size_pretty(
+                            coalesce(sum(pg_catalog.pg_total_relation_size(relid)), 0)
+                        )
+                    from partitions
+                    ;""",
+                    {"oid": relation_oid},
+                    prepare=self.prepare_statements,
+                )
+            columns: list[tuple[str, int]] = columns_cur.fetchall()
+            summary: tuple[int, str] | None = summary_cur.fetchone()
+        pool.putconn(conn)
+        return columns, summary or (0, "0 bytes")
+
+    def _get_partitions(
+        self, relation_oid: int
+    ) -> list[tuple[int, int, str, str, str, str]]:
+        pool = self._catalog_pool()
+        conn: Connection = pool.getconn()
         with conn.cursor() as cur:
             cur.execute(
                 """
-                select table_name, table_type
-                from information_schema.tables
-                where
-                    table_catalog = %s
-                    and table_schema = %s
-                order by table_name asc
+                select
+                    c.oid,
+                    n.oid,
+                    n.nspname,
+                    c.relname,
+                    c.relkind,
+                    c.relpersistence
+                from pg_catalog.pg_inherits i
+                join pg_catalog.pg_class c on c.oid = i.inhrelid
+                join pg_catalog.pg_namespace n on n.oid = c.relnamespace
+                where i.inhparent = %s
+                order by c.relname asc
                 ;""",
-                (dbname, schema),
+                (relation_oid,),
+                prepare=self.prepare_statements,
             )
-            results: list[tuple[str, str]] = cur.fetchall()
-        self.pool.putconn(conn)
+            results: list[tuple[int, int, str, str, str, str]] = cur.fetchall()
+        pool.putconn(conn)
         return results
 
-    # only works for the currently-connected db
-    def _get_mvs(self, schema: str) -> list[tuple[str]]:
+    def _get_view_definition(self, view_oid: int) -> str | None:
+        pool = self._catalog_pool()
+        conn: Connection = pool.getconn()
+        with conn.cursor() as cur:
+            cur.execute("select pg_catalog.pg_get_viewdef(%s::oid, true)", (view_oid,))
+            result: tuple[str | None] | None = cur.fetchone()
+        pool.putconn(conn)
+        return result[0] if result is not None else None
+
+    def _get_stat_statements_source(self) -> StatStatementsSource | None:
+        """
+        Finds the pg_stat_statements view and its columns, or returns None if
+        the extension is not installed in the current database.
+        """
         conn: Connection = self.pool.getconn()
         with conn.cursor() as cur:
             cur.execute(
                 """
-                select matviewname
-                from pg_matviews
-                where
-                    schemaname = %s
-                order by matviewname asc
+                select n.nspname, array_agg(a.attname::text)
+                from pg_catalog.pg_extension e
+                join pg_catalog.pg_namespace n on n.oid = e.extnamespace
+                join pg_catalog.pg_class c
+                    on c.relnamespace = n.oid
+                    and c.relname = 'pg_stat_statements'
+                join pg_catalog.pg_attribute a
+                    on a.attrelid = c.oid
+                    and a.attnum > 0
+                    and not a.attisdropped
+                where e.extname = 'pg_stat_statements'
+                group by n.nspname
+                ;"""
+            )
+            result: tuple[str, list[str]] | None = cur.fetchone()
+        self.pool.putconn(conn)
+        if result is None:
+            return None
+        schema, columns = result
+        return StatStatementsSource(schema=schema, columns=frozenset(columns))
+
+    def _get_maintenance_info(self, relation_oid: int) -> tuple[Any, ...] | None:
+        """
+        Returns the last (manual) vacuum, autovacuum, analyze, and autoanalyze
+        times and the live and dead tuple estimates of a relation, and whether
+        it is populated and has a unique index, which REFRESH MATERIALIZED VIEW
+        CONCURRENTLY needs.
+        """
+        conn: Connection = self.pool.getconn()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                select
+                    s.last_vacuum,
+                    s.last_autovacuum,
+                    s.last_analyze,
+                    s.last_autoanalyze,
+                    s.n_live_tup,
+                    s.n_dead_tup,
+                    c.relispopulated,
+                    exists (
+                        select
+                        from pg_catalog.pg_index i
+                        where
+                            i.indrelid = c.oid
+                            and i.indisunique
+                            and i.indisvalid
+                            and i.indpred is null
+                            and i.indexprs is null
+                    )
+                from pg_catalog.pg_class c
+                left join pg_catalog.pg_stat_user_tables s on s.relid = c.oid
+                where c.oid = %s
                 ;""",
-                (schema,),
+                (relation_oid,),
             )
-            results: list[tuple[str]] = cur.fetchall()
+            result = cur.fetchone()
         self.pool.putconn(conn)
-        return results
+        return result
 
-    def _get_columns(
-        self, dbname: str, schema: str, relation: str
-    ) -> list[tuple[str, str]]:
+    def _get_sample_sizes(self, relation_oid: int) -> list[tuple[float, int, int]]:
+        """
+        Returns the reltuples, relpages, and current size in pages of a table,
+        or of each leaf partition of a partitioned table.
+        """
         conn: Connection = self.pool.getconn()
         with conn.cursor() as cur:
             cur.execute(
                 """
-                select column_name, data_type
-                from information_schema.columns
+                select
+                    c.reltuples,
+                    c.relpages,
+                    (
+                        pg_catalog.pg_relation_size(c.oid)
+                        / pg_catalog.current_setting('block_size')::int
+                    )::int
+                from pg_catalog.pg_class c
                 where
-                    table_catalog = %s
-                    and table_schema = %s
-                    and table_name = %s
-                order by ordinal_position asc
+                    c.relkind in ('r', 'm')
+                    and (
+                        c.oid = %(oid)s
+                        or c.oid in (
+                            select relid
+                            from pg_catalog.pg_partition_tree(%(oid)s)
+                            where isleaf
+                        )
+                    )
                 ;""",
-                (dbname, schema, relation),
+                {"oid": relation_oid},
             )
-            results: list[tuple[str, str]] = cur.fetchall()
+            results: list[tuple[float, int, int]] = cur.fetchall()
         self.pool.putconn(conn)
         return results
 
-    def _get_mv_cols(self, schema: str, mv: str) -> list[tuple[str, str]]:
+    def _run_maintenance(
+        self, statement: str, notify: Callable[[str], None] | None = None
+    ) -> None:
+        """
+        Runs a maintenance statement on its own pool connection, which is in
+        autocommit, so it is outside of any transaction on the main connection
+        and does not block the editor. Reports progress to notify.
+        """
+        conn: Connection = self.pool.getconn()
+        # maintenance can take much longer than a catalog query
+        apply_settings(conn, self.profiles[self.profile], reset=set(CATALOG_SETTINGS))
+        monitor_query = progress_query(statement)
+        progress = None
+        if notify is not None and monitor_query is not None:
+            progress = ProgressMonitor(
+                self.pool,
+                pid=conn.info.backend_pid,
+                query=monitor_query,
+                notify=notify,
+                interval=self.progress_interval,
+            )
+            progress.start()
+        try:
+            conn.execute(statement)
+        except Exception as e:
+            raise HarlequinQueryError(
+                msg=str(e),
+                title="Harlequin could not run the maintenance statement.",
+            ) from e
+        finally:
+            if progress is not None:
+                progress.stop()
+            try:
+                apply_settings(
+                    conn,
+                    self._pool_settings(),
+                    reset=set(self.profiles[self.profile]),
+                )
+            except Exception:
+                # the pool discards a broken connection
+                pass
+            self.pool.putconn(conn)
+
+    def _get_extension_schema(self, extname: str) -> str | None:
+        """
+        Returns the schema of an extension, or None if it is not installed in
+        the current database.
+        """
         conn: Connection = self.pool.getconn()
         with conn.cursor() as cur:
             cur.execute(
                 """
-                select 
-                    a.attname,
-                    pg_catalog.format_type(a.atttypid, a.atttypmod)
-                from pg_attribute a
-                join pg_class t on a.attrelid = t.oid
-                join pg_namespace s on t.relnamespace = s.oid
-                where 
-                    a.attnum > 0 
-                    and not a.attisdropped
-                    and s.nspname = %s
-                    and t.relname = %s
-                order by a.attnum;
+                select n.nspname
+                from pg_catalog.pg_extension e
+                join pg_catalog.pg_namespace n on n.oid = e.extnamespace
+                where e.extname = %s
                 ;""",
-                (schema, mv),
+                (extname,),
             )
-            results: list[tuple[str, str]] = cur.fetchall()
+            result: tuple[str] | None = cur.fetchone()
         self.pool.putconn(conn)
-        return results
+        return result[0] if result is not None else None
 
-    @staticmethod
-    def _short_column_type(type_name: str) -> str:
-        MAPPING = {
-            "bigint": "##",
-            "bigserial": "##",
-            "bit": "010",
-            "boolean": "t/f",
-            "box": "□",
-            "bytea": "b",
-            "character": "s",
-            "cidr": "ip",
-            "circle": "○",
-            "date": "d",
-            "double": "#.#",
-            "inet": "ip",
-            "integer": "#",
-            "interval": "|-|",
-            "json": "{}",
-            "jsonb": "b{}",
-            "line": "—",
-            "lseg": "-",
-            "macaddr": "mac",
-            "macaddr8": "mac",
-            "money": "$$",
-            "numeric": "#.#",
-            "path": "╭",
-            "pg_lsn": "lsn",
-            "pg_snapshot": "snp",
-            "point": "•",
-            "polygon": "▽",
-            "real": "#.#",
-            "smallint": "#",
-            "smallserial": "#",
-            "serial": "#",
-            "text": "s",
-            "time": "t",
-            "timestamp": "ts",
-            "tsquery": "tsq",
-            "tsvector": "tsv",
-            "txid_snapshot": "snp",
-            "uuid": "uid",
-            "xml": "xml",
-            "array": "[]",
-        }
-        return MAPPING.get(type_name.split("(")[0].split(" ")[0], "?")
-
-    @staticmethod
-    def _short_column_type_from_oid(oid: int) -> str:
-        MAPPING = {
-            16: "t/f",
-            17: "b",
-            18: "s",
-            19: "s",
-            20: "##",
-            21: "#",
-            22: "[#]",
-            23: "#",
-            25: "s",
-            26: "oid",
-            114: "{}",
-            142: "xml",
-            600: "•",
-            601: "-",
-            602: "╭",
-            603: "□",
-            604: "▽",
-            628: "—",
-            651: "[ip]",
-            700: "#.#",
-            701: "#.#",
-            704: "|-|",
-            718: "○",
-            790: "$$",
-            829: "mac",
-            869: "ip",
-            650: "ip",
-            774: "mac",
-            1000: "[t/f]",
-            1001: "[b]",
-            1002: "[s]",
-            1003: "[s]",
-            1009: "[s]",
-            1013: "[oid]",
-            1014: "[s]",
-            1015: "[s]",
-            1016: "[#]",
-            1021: "[#.#]",
-            1022: "[#.#]",
-            1028: "[oid]",
-            1040: "[mac]",
-            1041: "[ip]",
-            1042: "s",
-            1043: "s",
-            1082: "d",
-            1083: "t",
-            1114: "ts",
-            1115: "[ts]",
-            1182: "[d]",
-            1183: "[t]",
-            1184: "ts",
-            1185: "[ts]",
-            1186: "|-|",
-            1187: "[|-|]",
-            1231: "[#.#]",
-            1266: "t",
-            1270: "[t]",
-            1560: "010",
-            1562: "010",
-            1700: "#.#",
-            2950: "uid",
-            3614: "tsv",
-            3615: "tsq",
-            3802: "b{}",
-        }
-        return MAPPING.get(oid, "?")
+    def _snapshot_statements(
+        self, source: StatStatementsSource, dbname: str
+    ) -> StatementsSnapshot:
+        conn: Connection = self.pool.getconn()
+        try:
+            with conn.cursor() as now_cur, conn.cursor() as stats_cur:
+                with conn.pipeline():
+                    now_cur.execute("select now()")
+                    stats_cur.execute(source.snapshot_query(), (dbname,))
+                now_row = now_cur.fetchone()
+                rows = stats_cur.fetchall()
+        except Exception as e:
+            raise HarlequinQueryError(
+                msg=str(e), title="Harlequin could not read pg_stat_statements."
+            ) from e
+        finally:
+            self.pool.putconn(conn)
+        assert now_row is not None
+        return StatementsSnapshot(
+            dbname=dbname,
+            taken_at=now_row[0],
+            stats={(row[0], row[1]): tuple(row[2:]) for row in rows},
+        )
+
+    def _run_on_monitor_conn(
+        self, query: str, params: Sequence[Any] | None = None
+    ) -> list[tuple[Any, ...]]:
+        with self._monitor_lock:
+            if self._monitor_conn is None or self._monitor_conn.closed:
+                if self._monitor_conn is not None:
+                    self.pool.putconn(self._monitor_conn)
+                self._monitor_conn = self.pool.getconn()
+            try:
+                with self._monitor_conn.cursor() as cur:
+                    cur.execute(query, params)
+                    return cur.fetchall()
+            except Exception as e:
+                raise HarlequinQueryError(
+                    msg=str(e), title="Harlequin could not read the sessions."
+                ) from e
+
+    def _get_type_registry(self, reload: bool = False) -> TypeLabelRegistry:
+        with self._type_registry_lock:
+            if self._type_registry is None or reload:
+                pool = self._catalog_pool()
+                conn: Connection = pool.getconn()
+                self._type_registry = TypeLabelRegistry.load(conn)
+                pool.putconn(conn)
+            return self._type_registry
+
+    def _short_column_type_from_oid(self, oid: int) -> str:
+        registry = self._get_type_registry()
+        if oid not in registry:
+            # the type may have been created after the registry was loaded
+            registry = self._get_type_registry(reload=True)
+        return registry.label(oid)
+
+
+# TCP keepalives detect connections that a NAT or firewall dropped while they
+# were idle, unless the connection string configures them itself
+KEEPALIVE_OPTIONS = {
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+}
+
+# the main connection is checked before it is used after being idle for this
+# many seconds, which costs one round trip
+MAIN_CONN_CHECK_INTERVAL = 10.0
+
+# command tags of statements that change the session's settings
+SETTINGS_COMMANDS = frozenset(("SET", "RESET", "DISCARD"))
+
+# command tags of statements that can't change the relations in the catalog.
+# CREATE TABLE AS and SELECT INTO report a SELECT tag without returning rows,
+# so any other statement (including DO and CALL) is treated as DDL.
+NON_DDL_COMMANDS = frozenset(
+    (
+        "INSERT UPDATE DELETE MERGE COPY TRUNCATE SET RESET SHOW BEGIN START "
+        "COMMIT ROLLBACK SAVEPOINT RELEASE PREPARE DEALLOCATE FETCH MOVE CLOSE "
+        "DECLARE LISTEN UNLISTEN NOTIFY LOCK VACUUM ANALYZE CLUSTER CHECKPOINT "
+        "DISCARD"
+    ).split()
+)
+
+
+def _command_tags(cur: Cursor) -> list[str]:
+    """
+    Returns the command (like INSERT or CREATE) of each statement that cur
+    executed. Moves cur through all of its results.
+    """
+    tags = [(cur.statusmessage or "").split(" ", 1)[0]]
+    while cur.nextset():
+        tags.append((cur.statusmessage or "").split(" ", 1)[0])
+    return tags
+
+
+def _can_pipeline(query: str) -> bool:
+    """
+    Pipeline mode uses the extended query protocol, which can't run several
+    statements from one string, or COPY, so we only pipeline queries that
+    are obviously a single, non-COPY statement.
+    """
+    body = query.strip().rstrip(";")
+    return ";" not in body and body[:4].lower() != "copy"
 
 
 class HarlequinPostgresAdapter(HarlequinAdapter):
@@ -458,9 +1469,83 @@ class HarlequinPostgresAdapter(HarlequinAdapter):
         sslmode: str | None = None,
         sslcert: str | None = None,
         sslkey: str | None = None,
+        disable_prepared_statements: bool | None = None,
+        schema_include: str | Sequence[str] | None = None,
+        schema_exclude: str | Sequence[str] | None = None,
+        replica_hosts: str | Sequence[str] | None = None,
+        idle_transaction_timeout: str | float | None = None,
+        idle_transaction_server_timeout: bool | None = None,
+        profile: str | None = None,
+        profiles: str | Mapping[str, Mapping[str, Any]] | None = None,
+        result_cache_size: str | float | None = None,
+        result_cache_ttl: str | float | None = None,
         **_: Any,
     ) -> None:
         self.conn_str = conn_str
+        self.prepare_statements = not disable_prepared_statements
+        self.schema_filter = SchemaFilter.from_options(
+            include=schema_include, exclude=schema_exclude
+        )
+        self.replica_hosts = parse_replica_hosts(replica_hosts)
+        try:
+            self.idle_transaction_timeout = (
+                float(idle_transaction_timeout)
+                if idle_transaction_timeout is not None
+                else None
+            )
+        except (TypeError, ValueError) as e:
+            raise HarlequinConnectionError(
+                msg=str(e),
+                title=(
+                    "Harlequin could not connect to Postgres. "
+                    "Invalid value for idle_transaction_timeout."
+                ),
+            ) from e
+        if idle_transaction_server_timeout and not self.idle_transaction_timeout:
+            raise HarlequinConnectionError(
+                msg="Set idle_transaction_timeout to use this flag.",
+                title=(
+                    "Harlequin could not connect to Postgres. "
+                    "idle_transaction_server_timeout requires a timeout."
+                ),
+            )
+        self.idle_transaction_server_timeout = bool(idle_transaction_server_timeout)
+        try:
+            self.profiles = parse_profiles(profiles)
+        except ValueError as e:
+            raise HarlequinConnectionError(
+                msg=str(e),
+                title=(
+                    "Harlequin could not connect to Postgres. "
+                    "Invalid value for profiles."
+                ),
+            ) from e
+        self.profile = profile or DEFAULT_PROFILE
+        try:
+            self.result_cache_size = (
+                float(result_cache_size) if result_cache_size is not None else None
+            )
+            self.result_cache_ttl = (
+                float(result_cache_ttl)
+                if result_cache_ttl is not None
+                else RESULT_CACHE_TTL
+            )
+        except (TypeError, ValueError) as e:
+            raise HarlequinConnectionError(
+                msg=str(e),
+                title=(
+                    "Harlequin could not connect to Postgres. "
+                    "Invalid value for result_cache_size or result_cache_ttl."
+                ),
+            ) from e
+        if self.profile not in {**BUILTIN_PROFILES, **self.profiles}:
+            raise HarlequinConnectionError(
+                msg=f"There is no profile named {self.profile}.",
+                title=(
+                    "Harlequin could not connect to Postgres. "
+                    "Invalid value for profile."
+                ),
+            )
         self.options: dict[str, str | int | None] = {
             "host": host,
             "port": port,
@@ -503,5 +1588,17 @@ class HarlequinPostgresAdapter(HarlequinAdapter):
         # before creating the connection, register updated type adapters, so
         # all subsequent connections will use those adapters
         register_inf_loaders()
-        conn = HarlequinPostgresConnection(self.conn_str, options=self.options)
+        conn = HarlequinPostgresConnection(
+            self.conn_str,
+            options=self.options,
+            prepare_statements=self.prepare_statements,
+            schema_filter=self.schema_filter,
+            replica_hosts=self.replica_hosts,
+            idle_transaction_timeout=self.idle_transaction_timeout,
+            idle_transaction_server_timeout=self.idle_transaction_server_timeout,
+            profiles=self.profiles,
+            profile=self.profile,
+            result_cache_size=self.result_cache_size,
+            result_cache_ttl=self.result_cache_ttl,
+        )
         return conn
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+from textwrap import dedent
+
+# both queries return these columns, sorted by wasted bytes
+BLOAT_COLUMNS = """
+            kind as "Type",
+            nspname as "Schema",
+            table_name as "Table",
+            index_name as "Index",
+            pg_catalog.pg_size_pretty(size::bigint) as "Size",
+            pg_catalog.pg_size_pretty(wasted::bigint) as "Wasted",
+            round((100 * wasted / nullif(size, 0))::numeric, 1) as "Wasted %",
+            wasted::bigint as "Wasted Bytes","""
+
+
+def bloat_estimate_sql(target: str, scope: str) -> str:
+    """
+    SQL that estimates the wasted space in tables and btree indexes from the
+    planner's statistics (pg_class and pg_stats), without reading the
+    relations. The tuple-width arithmetic follows the widely used estimates
+    from ioguix/pgsql-bloat-estimation. `scope` is a query that returns the
+    OIDs of the tables to check.
+    """
+    return dedent(
+        f"""
+        -- Estimated bloat in {target}, from the statistics collected by ANALYZE.
+        -- Estimates are only as fresh as the last ANALYZE, and are unreliable
+        -- for relations with a Note.
+        with
+            scope as (
+                {scope}
+            ),
+            constants as (
+                select
+                    pg_catalog.current_setting('block_size')::numeric as bs,
+                    case
+                        when pg_catalog.version() ~ 'mingw32'
+                            or pg_catalog.version() ~ '64-bit|x86_64|ppc64|ia64|amd64'
+                        then 8
+                        else 4
+                    end as ma
+            ),
+            tables as (
+                select
+                    c.oid,
+                    n.nspname,
+                    c.relname,
+                    greatest(c.reltuples, 0) as reltuples,
+                    c.relpages + coalesce(toast.relpages, 0) as pages,
+                    greatest(coalesce(toast.reltuples, 0), 0) as toast_tuples,
+                    coalesce(
+                        substring(
+                            pg_catalog.array_to_string(c.reloptions, ' ')
+                            from 'fillfactor=([0-9]+)'
+                        )::int,
+                        100
+                    ) as fillfactor,
+                    23 + case
+                        when max(coalesce(s.null_frac, 0)) > 0 then (7 + count(*)) / 8
+                        else 0
+                    end as header_width,
+                    sum((1 - coalesce(s.null_frac, 0)) * coalesce(s.avg_width, 0))
+                        as data_width,
+                    count(s.attname) < count(*)
+                        or bool_or(a.atttypid = 'pg_catalog.name'::regtype)
+                        as missing_stats
+                from pg_catalog.pg_class c
+                join pg_catalog.pg_namespace n on n.oid = c.relnamespace
+                join pg_catalog.pg_attribute a
+                    on a.attrelid = c.oid
+                    and a.attnum > 0
+                    and not a.attisdropped
+                left join pg_catalog.pg_stats s
+                    on s.schemaname = n.nspname
+                    and s.tablename = c.relname
+                    and s.attname = a.attname
+                    and not s.inherited
+                left join pg_catalog.pg_class toast on toast.oid = c.reltoastrelid
+                where c.oid in (select oid from scope) and c.relkind in ('r', 'm')
+                group by c.oid, n.nspname, toast.relpages, toast.reltuples
+            ),
+            table_bloat as (
+                select
+                    t.*,
+                    k.bs,
+                    -- the aligned width of a heap tuple, with its line pointer
+                    4 + t.header_width + t.data_width + 2 * k.ma
+                    - case
+                        when t.header_width % k.ma = 0 then k.ma
+                        else t.header_width % k.ma
+                    end
+                    - case
+                        when ceil(t.data_width)::int % k.ma = 0 then k.ma
+                        else ceil(t.data_width)::int % k.ma
+                    end as tuple_width
+                from tables t
+                cross join constants k
+            ),
+            indexes as (
+                select
+                    ic.oid,
+                    n.nspname,
+                    t.relname as table_name,
+                    ic.relname as index_name,
+                    greatest(ic.reltuples, 0) as reltuples,
+                    ic.relpages as pages,
+                    coalesce(
+                        substring(
+                            pg_catalog.array_to_string(ic.reloptions, ' ')
+                            from 'fillfactor=([0-9]+)'
+                        )::int,
+                        90
+                    ) as fillfactor,
+                    -- IndexTupleData, plus the null bitmap if any key can be null
+                    case when max(coalesce(s.null_frac, 0)) = 0 then 8 else 12 end
+                        as header_width,
+                    sum((1 - coalesce(s.null_frac, 0)) * coalesce(s.avg_width, 1024))
+                        as data_width,
+                    count(s.attname) < count(*)
+                        or bool_or(ia.atttypid = 'pg_catalog.name'::regtype)
+                        as missing_stats
+                from pg_catalog.pg_index i
+                join pg_catalog.pg_class ic on ic.oid = i.indexrelid
+                join pg_catalog.pg_class t on t.oid = i.indrelid
+                join pg_catalog.pg_namespace n on n.oid = t.relnamespace
+                join pg_catalog.pg_am am on am.oid = ic.relam and am.amname = 'btree'
+                join pg_catalog.pg_attribute ia
+                    on ia.attrelid = i.indexrelid
+                    and ia.attnum > 0
+                -- expression columns have no table column, and ANALYZE stores
+                -- their statistics under the index's name
+                left join pg_catalog.pg_attribute ta
+                    on ta.attrelid = i.indrelid
+                    and ta.attnum = i.indkey[ia.attnum - 1]
+                left join pg_catalog.pg_stats s
+                    on s.schemaname = n.nspname
+                    and not s.inherited
+                    and (
+                        (s.tablename = t.relname and s.attname = ta.attname)
+                        or (
+                            ta.attname is null
+                            and s.tablename = ic.relname
+                            and s.attname = ia.attname
+                        )
+                    )
+                where i.indrelid in (select oid from scope) and ic.relpages > 0
+                group by ic.oid, n.nspname, t.relname
+            ),
+            index_bloat as (
+                select
+                    x.*,
+                    k.bs,
+                    -- the aligned width of an index tuple, with its line pointer
+                    4 + x.header_width + k.ma
+                    - case
+                        when x.header_width % k.ma = 0 then k.ma
+                        else x.header_width % k.ma
+                    end
+                    + x.data_width + k.ma
+                    - case
+                        when x.data_width = 0 then 0
+                        when ceil(x.data_width)::int % k.ma = 0 then k.ma
+                        else ceil(x.data_width)::int % k.ma
+                    end as tuple_width
+                from indexes x
+                cross join constants k
+            ),
+            bloat as (
+                select
+                    'table' as kind,
+                    nspname,
+                    relname as table_name,
+                    null as index_name,
+                    bs * pages as size,
+                    bs * greatest(
+                        pages
+                        - ceil(
+                            reltuples
+                            / greatest(
+                                floor((bs - 24) * fillfactor / (100 * tuple_width)), 1
+                            )
+                        )
+                        - ceil(toast_tuples / 4),
+                        0
+                    ) as wasted,
+                    missing_stats
+                from table_bloat
+                union all
+                select
+                    'index',
+                    nspname,
+                    table_name,
+                    index_name,
+                    bs * pages,
+                    bs * greatest(
+                        pages
+                        - 1
+                        - ceil(
+                            reltuples
+                            / greatest(
+                                floor(
+                                    (bs - 24 - 16) * fillfactor / (100 * tuple_width)
+                                ),
+                                1
+                            )
+                        ),
+                        0
+                    ),
+                    missing_stats
+                from index_bloat
+            )
+        select{BLOAT_COLUMNS}
+            case
+                when missing_stats then 'Some columns have no statistics; run ANALYZE'
+            end as "Note"
+        from bloat
+        order by wasted desc, size desc;
+        """
+    ).strip("\n")
+
+
+def bloat_exact_sql(target: str, scope: str, pgstattuple_schema: str) -> str:
+    """
+    SQL that measures the wasted space in tables and btree indexes with the
+    pgstattuple extension, which reads every page of each relation.
+    """
+    ext = f'"{pgstattuple_schema}"'
+    return dedent(
+        f"""
+        -- Bloat in {target}, measured by pgstattuple. This reads every page of
+        -- each table and index, so it can take a long time on large relations.
+        -- Space kept free by a fillfactor below 100 is not counted as waste.
+        with
+            scope as (
+                {scope}
+            ),
+            bloat as (
+                select
+                    'table' as kind,
+                    n.nspname,
+                    c.relname as table_name,
+                    null as index_name,
+                    st.table_len as size,
+                    greatest(
+                        st.dead_tuple_len + st.free_space
+                        - st.table_len * (100 - coalesce(
+                            substring(
+                                pg_catalog.array_to_string(c.reloptions, ' ')
+                                from 'fillfactor=([0-9]+)'
+                            )::int,
+                            100
+                        )) / 100,
+                        0
+                    ) as wasted,
+                    st.dead_tuple_count as dead_tuples,
+                    null::float8 as leaf_fragmentation
+                from pg_catalog.pg_class c
+                join pg_catalog.pg_namespace n on n.oid = c.relnamespace
+                cross join lateral {ext}.pgstattuple(c.oid) st
+                where c.oid in (select oid from scope) and c.relkind in ('r', 'm')
+                union all
+                select
+                    'index',
+                    n.nspname,
+                    t.relname,
+                    ic.relname,
+                    si.index_size,
+                    greatest(
+                        si.index_size
+                        - pg_catalog.current_setting('block_size')::numeric * (
+                            1
+                            + si.internal_pages
+                            + ceil(
+                                si.leaf_pages * si.avg_leaf_density / coalesce(
+                                    substring(
+                                        pg_catalog.array_to_string(ic.reloptions, ' ')
+                                        from 'fillfactor=([0-9]+)'
+                                    )::int,
+                                    90
+                                )
+                            )
+                        ),
+                        0
+                    ),
+                    null,
+                    si.leaf_fragmentation
+                from pg_catalog.pg_index i
+                join pg_catalog.pg_class ic on ic.oid = i.indexrelid
+                join pg_catalog.pg_class t on t.oid = i.indrelid
+                join pg_catalog.pg_namespace n on n.oid = t.relnamespace
+                join pg_catalog.pg_am am on am.oid = ic.relam and am.amname = 'btree'
+                cross join lateral {ext}.pgstatindex(i.indexrelid) si
+                where
+                    i.indrelid in (select oid from scope)
+                    and ic.relkind = 'i'
+                    and si.leaf_pages > 0
+            )
+        select{BLOAT_COLUMNS}
+            dead_tuples as "Dead Tuples",
+            leaf_fragmentation as "Leaf Fragmentation %"
+        from bloat
+        order by wasted desc, size desc;
+        """
+    ).strip("\n")
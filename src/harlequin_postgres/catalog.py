@@ -3,31 +3,54 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
-from harlequin.catalog import InteractiveCatalogItem
+from harlequin.catalog import CatalogItem, InteractiveCatalogItem
 
 from harlequin_postgres.interactions import (
+    cancel_top_blocker,
     execute_drop_database_statement,
     execute_drop_foreign_table_statement,
     execute_drop_schema_statement,
     execute_drop_table_statement,
     execute_drop_view_statement,
+    execute_refresh_materialized_view,
+    execute_reindex_concurrently,
     execute_use_statement,
+    execute_vacuum_analyze,
     insert_columns_at_cursor,
+    show_bloat_estimate,
+    show_column_profile,
+    show_column_stats,
+    show_current_transaction,
     show_describe_relation,
     show_describe_table_constraints,
     show_describe_table_indexes,
+    show_exact_bloat,
+    show_index_advisor,
     show_list_indexes,
     show_list_objects,
+    show_sample_data,
     show_select_star,
+    show_sessions_and_locks,
+    show_top_queries,
+    show_top_queries_since_snapshot,
     show_view_definition,
+    snapshot_query_stats,
+    stop_lock_monitor,
+    terminate_top_blocker,
+    toggle_progress_notifications,
 )
 
 if TYPE_CHECKING:
     from harlequin_postgres.adapter import HarlequinPostgresConnection
+    from harlequin_postgres.search import SearchHit
 
 
 @dataclass
 class ColumnCatalogItem(InteractiveCatalogItem["HarlequinPostgresConnection"]):
+    INTERACTIONS = [
+        ("Column Stats", show_column_stats),
+        ("Column Profile (Sampled)", show_column_profile),
+    ]
     parent: "RelationCatalogItem" | None = None
 
     @classmethod
@@ -58,20 +81,23 @@ class RelationCatalogItem(InteractiveCatalogItem["HarlequinPostgresConnection"])
         ("Describe Relation (\\d+)", show_describe_relation),
     ]
     parent: "SchemaCatalogItem" | None = None
+    oid: int | None = None
 
-    def fetch_children(self) -> list[ColumnCatalogItem]:
-        if self.parent is None or self.parent.parent is None or self.connection is None:
+    def fetch_children(self) -> list[CatalogItem]:
+        if self.oid is None or self.connection is None:
             return []
-        result = self.connection._get_columns(
-            self.parent.parent.label, self.parent.label, self.label
-        )
+        relation = self.connection.catalog_store.relation(self.oid)
+        if relation is not None:
+            result = [(column.name, column.type_oid) for column in relation.columns()]
+        else:
+            result = self.connection._get_columns(self.oid)
         return [
             ColumnCatalogItem.from_parent(
                 parent=self,
                 label=column_name,
-                type_label=self.connection._short_column_type(column_type),
+                type_label=self.connection._short_column_type_from_oid(type_oid),
             )
-            for column_name, column_type in result
+            for column_name, type_oid in result
         ]
 
 
@@ -86,6 +112,7 @@ class ViewCatalogItem(RelationCatalogItem):
         cls,
         parent: "SchemaCatalogItem",
         label: str,
+        oid: int,
     ) -> "ViewCatalogItem":
         relation_query_name = f'"{parent.label}"."{label}"'
         relation_qualified_identifier = f'{parent.qualified_identifier}."{label}"'
@@ -96,13 +123,20 @@ class ViewCatalogItem(RelationCatalogItem):
             type_label="v",
             connection=parent.connection,
             parent=parent,
+            oid=oid,
         )
 
 
 class TableCatalogItem(RelationCatalogItem):
     INTERACTIONS = RelationCatalogItem.INTERACTIONS + [
+        ("Sample Data", show_sample_data),
         ("Describe Indexes", show_describe_table_indexes),
+        ("Index Advisor", show_index_advisor),
+        ("Bloat Estimate", show_bloat_estimate),
+        ("Bloat (Exact, pgstattuple)", show_exact_bloat),
         ("Describe Constraints", show_describe_table_constraints),
+        ("Vacuum Analyze", execute_vacuum_analyze),
+        ("Reindex Concurrently", execute_reindex_concurrently),
         ("Drop Table", execute_drop_table_statement),
     ]
 
@@ -111,6 +145,7 @@ class TableCatalogItem(RelationCatalogItem):
         cls,
         parent: "SchemaCatalogItem",
         label: str,
+        oid: int,
     ) -> "TableCatalogItem":
         relation_query_name = f'"{parent.label}"."{label}"'
         relation_qualified_identifier = f'{parent.qualified_identifier}."{label}"'
@@ -121,15 +156,25 @@ class TableCatalogItem(RelationCatalogItem):
             type_label="t",
             connection=parent.connection,
             parent=parent,
+            oid=oid,
         )
 
 
 class TempTableCatalogItem(TableCatalogItem):
+    # maintenance runs on another connection, which can't see this session's
+    # temporary tables
+    INTERACTIONS = [
+        (label, interaction)
+        for label, interaction in TableCatalogItem.INTERACTIONS
+        if interaction not in (execute_vacuum_analyze, execute_reindex_concurrently)
+    ]
+
     @classmethod
     def from_parent(
         cls,
         parent: "SchemaCatalogItem",
         label: str,
+        oid: int,
     ) -> "TempTableCatalogItem":
         relation_query_name = f'"{parent.label}"."{label}"'
         relation_qualified_identifier = f'{parent.qualified_identifier}."{label}"'
@@ -140,7 +185,110 @@ class TempTableCatalogItem(TableCatalogItem):
             type_label="tmp",
             connection=parent.connection,
             parent=parent,
+            oid=oid,
+        )
+
+
+class PartitionedTableCatalogItem(TableCatalogItem):
+    @classmethod
+    def from_parent(
+        cls,
+        parent: "SchemaCatalogItem",
+        label: str,
+        oid: int,
+    ) -> "PartitionedTableCatalogItem":
+        relation_query_name = f'"{parent.label}"."{label}"'
+        relation_qualified_identifier = f'{parent.qualified_identifier}."{label}"'
+        return cls(
+            qualified_identifier=relation_qualified_identifier,
+            query_name=relation_query_name,
+            label=label,
+            type_label="pt",
+            connection=parent.connection,
+            parent=parent,
+            oid=oid,
+        )
+
+    def fetch_children(self) -> list[CatalogItem]:
+        if self.oid is None or self.connection is None:
+            return []
+        columns, (partition_count, total_size) = (
+            self.connection._get_partitioned_table_children(self.oid)
         )
+        children: list[CatalogItem] = [
+            ColumnCatalogItem.from_parent(
+                parent=self,
+                label=column_name,
+                type_label=self.connection._short_column_type_from_oid(type_oid),
+            )
+            for column_name, type_oid in columns
+        ]
+        if partition_count:
+            children.append(
+                PartitionsCatalogItem.from_parent(
+                    parent=self,
+                    partition_count=partition_count,
+                    total_size=total_size,
+                )
+            )
+        return children
+
+
+@dataclass
+class PartitionsCatalogItem(InteractiveCatalogItem["HarlequinPostgresConnection"]):
+    """
+    Groups the partitions of a partitioned table under a single node, so
+    that tables with thousands of partitions only load them on demand.
+    """
+
+    parent: "PartitionedTableCatalogItem" | None = None
+
+    @classmethod
+    def from_parent(
+        cls,
+        parent: "PartitionedTableCatalogItem",
+        partition_count: int,
+        total_size: str,
+    ) -> "PartitionsCatalogItem":
+        return cls(
+            qualified_identifier=f"{parent.qualified_identifier}.partitions",
+            query_name=parent.query_name,
+            label=f"partitions ({partition_count:,}, {total_size})",
+            type_label="prt",
+            connection=parent.connection,
+            parent=parent,
+        )
+
+    def fetch_children(self) -> list[RelationCatalogItem]:
+        if (
+            self.parent is None
+            or self.parent.oid is None
+            or self.parent.parent is None
+            or self.connection is None
+        ):
+            return []
+        table_schema = self.parent.parent
+        children: list[RelationCatalogItem] = []
+        for (
+            partition_oid,
+            schema_oid,
+            schema_label,
+            partition_label,
+            relkind,
+            relpersistence,
+        ) in self.connection._get_partitions(self.parent.oid):
+            # partitions can live in a different schema than their parent
+            schema = table_schema
+            if schema_oid != table_schema.oid and table_schema.parent is not None:
+                schema = SchemaCatalogItem.from_parent(
+                    parent=table_schema.parent, label=schema_label, oid=schema_oid
+                )
+            children.append(
+                schema.relation_from_row(
+                    partition_oid, partition_label, relkind, relpersistence
+                )
+            )
+        return children
 
 
 class ForeignCatalogItem(TableCatalogItem):
@@ -153,6 +301,7 @@ class ForeignCatalogItem(TableCatalogItem):
         cls,
         parent: "SchemaCatalogItem",
         label: str,
+        oid: int,
     ) -> "ForeignCatalogItem":
         relation_query_name = f'"{parent.label}"."{label}"'
         relation_qualified_identifier = f'{parent.qualified_identifier}."{label}"'
@@ -163,15 +312,24 @@ class ForeignCatalogItem(TableCatalogItem):
             type_label="f",
             connection=parent.connection,
             parent=parent,
+            oid=oid,
         )
 
 
 class MaterializedViewCatalogItem(RelationCatalogItem):
+    INTERACTIONS = RelationCatalogItem.INTERACTIONS + [
+        ("Sample Data", show_sample_data),
+        ("Refresh Materialized View", execute_refresh_materialized_view),
+        ("Vacuum Analyze", execute_vacuum_analyze),
+        ("Reindex Concurrently", execute_reindex_concurrently),
+    ]
+
     @classmethod
     def from_parent(
         cls,
         parent: "SchemaCatalogItem",
         label: str,
+        oid: int,
     ) -> "MaterializedViewCatalogItem":
         relation_query_name = f'"{parent.label}"."{label}"'
         relation_qualified_identifier = f'{parent.qualified_identifier}."{label}"'
@@ -182,21 +340,9 @@ class MaterializedViewCatalogItem(RelationCatalogItem):
             type_label="mv",
             connection=parent.connection,
             parent=parent,
+            oid=oid,
         )
 
-    def fetch_children(self) -> list[ColumnCatalogItem]:
-        if self.parent is None or self.parent.parent is None or self.connection is None:
-            return []
-        result = self.connection._get_mv_cols(self.parent.label, self.label)
-        return [
-            ColumnCatalogItem.from_parent(
-                parent=self,
-                label=column_name,
-                type_label=self.connection._short_column_type(column_type),
-            )
-            for column_name, column_type in result
-        ]
-
 
 @dataclass
 class SchemaCatalogItem(InteractiveCatalogItem["HarlequinPostgresConnection"]):
@@ -204,15 +350,20 @@ class SchemaCatalogItem(InteractiveCatalogItem["HarlequinPostgresConnection"]):
         ("Set Search Path", execute_use_statement),
         ("List Relations (\\d+)", show_list_objects),
         ("List Indexes (\\di+)", show_list_indexes),
+        ("Index Advisor", show_index_advisor),
+        ("Bloat Estimate", show_bloat_estimate),
+        ("Bloat (Exact, pgstattuple)", show_exact_bloat),
         ("Drop Schema", execute_drop_schema_statement),
     ]
     parent: "DatabaseCatalogItem" | None = None
+    oid: int | None = None
 
     @classmethod
     def from_parent(
         cls,
         parent: "DatabaseCatalogItem",
         label: str,
+        oid: int,
     ) -> "SchemaCatalogItem":
         schema_identifier = f'"{label}"'
         return cls(
@@ -222,58 +373,60 @@ class SchemaCatalogItem(InteractiveCatalogItem["HarlequinPostgresConnection"]):
             type_label="sch",
             connection=parent.connection,
             parent=parent,
+            oid=oid,
         )
 
     def fetch_children(self) -> list[RelationCatalogItem]:
-        if self.parent is None or self.connection is None:
+        if self.parent is None or self.oid is None or self.connection is None:
             return []
-        children: list[RelationCatalogItem] = []
-        result = self.connection._get_relations(self.parent.label, self.label)
-        for table_label, table_type in result:
-            if table_type == "VIEW":
-                children.append(
-                    ViewCatalogItem.from_parent(
-                        parent=self,
-                        label=table_label,
-                    )
-                )
-            elif table_type == "LOCAL TEMPORARY":
-                children.append(
-                    TempTableCatalogItem.from_parent(
-                        parent=self,
-                        label=table_label,
-                    )
-                )
-            elif table_type == "FOREIGN":
-                children.append(
-                    ForeignCatalogItem.from_parent(
-                        parent=self,
-                        label=table_label,
-                    )
-                )
-            else:
-                children.append(
-                    TableCatalogItem.from_parent(
-                        parent=self,
-                        label=table_label,
-                    )
-                )
-
-        for (mv_label,) in self.connection._get_mvs(self.label):
-            children.append(
-                MaterializedViewCatalogItem.from_parent(
-                    parent=self,
-                    label=mv_label,
-                )
+        store = self.connection._load_catalog_store(self.parent.label, [self.oid])
+        schema_slice = store.schema(self.oid)
+        if schema_slice is None:
+            return []
+        return [
+            self.relation_from_row(
+                relation.oid, relation.name, relation.relkind, relation.persistence
             )
+            for relation in schema_slice.relations()
+        ]
 
-        return children
+    def relation_from_row(
+        self, oid: int, label: str, relkind: str, relpersistence: str
+    ) -> RelationCatalogItem:
+        """
+        Creates the right kind of catalog item for a row from pg_class.
+        """
+        if relkind == "m":
+            return MaterializedViewCatalogItem.from_parent(
+                parent=self, label=label, oid=oid
+            )
+        elif relkind == "v":
+            return ViewCatalogItem.from_parent(parent=self, label=label, oid=oid)
+        elif relkind == "p":
+            return PartitionedTableCatalogItem.from_parent(
+                parent=self, label=label, oid=oid
+            )
+        elif relpersistence == "t":
+            return TempTableCatalogItem.from_parent(parent=self, label=label, oid=oid)
+        elif relkind == "f":
+            return ForeignCatalogItem.from_parent(parent=self, label=label, oid=oid)
+        else:
+            return TableCatalogItem.from_parent(parent=self, label=label, oid=oid)
 
 
 class DatabaseCatalogItem(InteractiveCatalogItem["HarlequinPostgresConnection"]):
     INTERACTIONS = [
         ("List Relations (\\d+)", show_list_objects),
         ("List Indexes (\\di+)", show_list_indexes),
+        ("Top Queries", show_top_queries),
+        ("Snapshot Query Stats", snapshot_query_stats),
+        ("Top Queries Since Snapshot", show_top_queries_since_snapshot),
+        ("Sessions & Locks", show_sessions_and_locks),
+        ("Stop Lock Monitor", stop_lock_monitor),
+        ("Current Transaction (\\txn)", show_current_transaction),
+        ("Cancel Top Blocker", cancel_top_blocker),
+        ("Terminate Top Blocker", terminate_top_blocker),
+        ("Toggle Progress Notifications", toggle_progress_notifications),
         ("Drop Database", execute_drop_database_statement),
     ]
 
@@ -298,6 +451,46 @@ class DatabaseCatalogItem(InteractiveCatalogItem["HarlequinPostgresConnection"])
             SchemaCatalogItem.from_parent(
                 parent=self,
                 label=schema_label,
+                oid=schema_oid,
             )
-            for (schema_label,) in schemas
+            for schema_oid, schema_label in schemas
         ]
+
+    def items_from_search_hits(self, hits: list["SearchHit"]) -> list[CatalogItem]:
+        """
+        Materializes catalog items for search hits in this database, sharing
+        one item per schema and relation between hits.
+        """
+        schemas: dict[int, SchemaCatalogItem] = {}
+        relations: dict[int, RelationCatalogItem] = {}
+        items: list[CatalogItem] = []
+        for hit in hits:
+            schema = schemas.get(hit.schema.oid)
+            if schema is None:
+                schema = schemas[hit.schema.oid] = SchemaCatalogItem.from_parent(
+                    parent=self, label=hit.schema.name, oid=hit.schema.oid
+                )
+            if hit.relation is None:
+                items.append(schema)
+                continue
+            relation = relations.get(hit.relation.oid)
+            if relation is None:
+                relation = relations[hit.relation.oid] = schema.relation_from_row(
+                    hit.relation.oid,
+                    hit.relation.name,
+                    hit.relation.relkind,
+                    hit.relation.persistence,
+                )
+            if hit.column is None:
+                items.append(relation)
+            elif self.connection is not None:
+                items.append(
+                    ColumnCatalogItem.from_parent(
+                        parent=relation,
+                        label=hit.column.name,
+                        type_label=self.connection._short_column_type_from_oid(
+                            hit.column.type_oid
+                        ),
+                    )
+                )
+        return items
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from harlequin.options import (
-    FlagOption,  # noqa
+    FlagOption,
     ListOption,  # noqa
     PathOption,  # noqa
     SelectOption,  # noqa
@@ -140,6 +140,104 @@ sslkey = TextOption(
     ),
 )
 
+disable_prepared_statements = FlagOption(
+    name="disable_prepared_statements",
+    description=(
+        "Do not use server-side prepared statements. Set this flag if you connect "
+        "through a connection pooler that does not support them, like PgBouncer "
+        "in transaction mode (before v1.21)."
+    ),
+)
+
+schema_include = TextOption(
+    name="schema_include",
+    description=(
+        "A comma-separated list of schema name patterns. If set, only schemas "
+        "matching one of these patterns are loaded into the Data Catalog and "
+        "completions. Patterns are globs (e.g., tenant_*), unless they start with "
+        "~, in which case they are POSIX regular expressions (e.g., ~^tenant_\\d+$)."
+    ),
+)
+
+schema_exclude = TextOption(
+    name="schema_exclude",
+    description=(
+        "A comma-separated list of schema name patterns. Schemas matching one of "
+        "these patterns are not loaded into the Data Catalog and completions. "
+        "Uses the same pattern syntax as schema_include."
+    ),
+)
+
+replica_hosts = TextOption(
+    name="replica_hosts",
+    description=(
+        "A comma-separated list of read replicas, as host or host:port (e.g., "
+        "replica1,replica2:5433). Read-only statements in Auto transaction mode, "
+        "and catalog and completion queries, run on the healthy replica with the "
+        "least replication lag. Other connection options are the same as the "
+        "primary's."
+    ),
+)
+
+idle_transaction_timeout = TextOption(
+    name="idle_transaction_timeout",
+    description=(
+        "Roll back the editor's transaction after it has been idle (open, with "
+        "no query running) for this many seconds (e.g., 600), so a forgotten "
+        "Manual-mode transaction does not hold its locks for hours. Your next "
+        "query reports the rollback. Disabled by default."
+    ),
+    validator=_int_validator,
+)
+
+idle_transaction_server_timeout = FlagOption(
+    name="idle_transaction_server_timeout",
+    description=(
+        "Also set idle_in_transaction_session_timeout on the server to 30 seconds "
+        "more than idle_transaction_timeout, so the server ends the session if "
+        "Harlequin can't roll back (e.g., because your computer went to sleep)."
+    ),
+)
+
+profile = TextOption(
+    name="profile",
+    description=(
+        "The resource profile for the editor's queries: default (the server's "
+        "settings), browse (30s statement_timeout, 2s lock_timeout, no JIT), "
+        "analytics (256MB work_mem, up to 4 parallel workers, no timeouts), or "
+        "one defined with profiles. Switch profiles with \\profile <name>."
+    ),
+)
+
+profiles = TextOption(
+    name="profiles",
+    description=(
+        "Your own resource profiles, as name: setting=value, ... separated by "
+        "semicolons (e.g., etl: work_mem=1GB, statement_timeout=0; quick: "
+        "statement_timeout=5s). A profile with a built-in profile's name "
+        "replaces it."
+    ),
+)
+
+result_cache_size = TextOption(
+    name="result_cache_size",
+    description=(
+        "Cache the results of read-only queries, up to this many megabytes "
+        "(e.g., 256), so running the same query again does not hit the server. "
+        "Any other query clears the cache. Disabled by default."
+    ),
+    validator=_int_validator,
+)
+
+result_cache_ttl = TextOption(
+    name="result_cache_ttl",
+    description=(
+        "The number of seconds that a cached result is used for, since writes "
+        "from other sessions can't be detected (default 300)."
+    ),
+    validator=_int_validator,
+)
+
 
 POSTGRES_OPTIONS = [
     host,
@@ -154,4 +252,14 @@ POSTGRES_OPTIONS = [
     sslmode,
     sslcert,
     sslkey,
+    disable_prepared_statements,
+    schema_include,
+    schema_exclude,
+    replica_hosts,
+    idle_transaction_timeout,
+    idle_transaction_server_timeout,
+    profile,
+    profiles,
+    result_cache_size,
+    result_cache_ttl,
 ]
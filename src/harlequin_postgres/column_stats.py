@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from textwrap import dedent
+
+# the default share of a table's pages that the sampled profile reads
+PROFILE_SAMPLE_PERCENT = 1.0
+
+# the number of distinct values listed by the sampled profile
+PROFILE_LIMIT = 100
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def column_stats_sql(schema: str, table: str, column: str) -> str:
+    """
+    SQL that lists the planner's statistics for a column from pg_stats: the
+    null fraction, the number of distinct values, the average width, the
+    correlation with the physical order, the most common values with their
+    frequencies, and the histogram buckets with the share of rows in each.
+    """
+    return dedent(
+        f"""
+        -- Planner statistics for {column} in {schema}.{table}, from pg_stats.
+        -- No rows are scanned: these describe the sample that the last ANALYZE
+        -- read. If this returns no rows, the column has not been analyzed.
+        with
+            stats as (
+                select s.*, greatest(c.reltuples, 0) as reltuples
+                from pg_catalog.pg_stats s
+                join pg_catalog.pg_namespace n on n.nspname = s.schemaname
+                join pg_catalog.pg_class c
+                    on c.relnamespace = n.oid and c.relname = s.tablename
+                where
+                    s.schemaname = {_literal(schema)}
+                    and s.tablename = {_literal(table)}
+                    and s.attname = {_literal(column)}
+                -- inheritance parents have statistics for the whole hierarchy
+                order by s.inherited desc
+                limit 1
+            ),
+            mcv as (
+                select v.value, v.frequency, v.n
+                from
+                    stats,
+                    unnest(most_common_vals::text::text[], most_common_freqs)
+                        with ordinality as v(value, frequency, n)
+            ),
+            histogram as (
+                select
+                    pg_catalog.format(
+                        '%s to %s', lag(h.bound) over (order by h.n), h.bound
+                    ) as bucket,
+                    -- each bucket holds the same share of the rows that are
+                    -- neither null nor one of the most common values
+                    (
+                        1
+                        - s.null_frac
+                        - coalesce((select sum(frequency) from mcv), 0)
+                    ) / greatest(cardinality(s.histogram_bounds::text::text[]) - 1, 1)
+                        as frequency,
+                    h.n
+                from
+                    stats s,
+                    unnest(s.histogram_bounds::text::text[])
+                        with ordinality as h(bound, n)
+            ),
+            rows as (
+                select 1 as section, 0::bigint as n, 'Estimated rows' as statistic,
+                    reltuples::bigint::text as value, null::float4 as frequency
+                from stats
+                union all
+                select 2, 0, 'Null fraction', null, null_frac
+                from stats
+                union all
+                select 3, 0, 'Distinct values',
+                    case
+                        when n_distinct < 0
+                        then pg_catalog.format(
+                            '%s (%s%% of rows)',
+                            round(-n_distinct * reltuples),
+                            round((-100 * n_distinct)::numeric, 1)
+                        )
+                        else n_distinct::bigint::text
+                    end,
+                    null
+                from stats
+                union all
+                select 4, 0, 'Average width (bytes)', avg_width::text, null
+                from stats
+                union all
+                select 5, 0, 'Correlation', round(correlation::numeric, 3)::text, null
+                from stats
+                union all
+                select 6, n, 'Most common value', value, frequency
+                from mcv
+                union all
+                select 7, n, 'Histogram bucket', bucket, frequency
+                from histogram
+                where n > 1
+            )
+        select
+            statistic as "Statistic",
+            value as "Value",
+            round((100 * frequency)::numeric, 2) as "% of Rows"
+        from rows
+        order by section, n;
+        """
+    ).strip("\n")
+
+
+def column_profile_sql(
+    table: str, column: str, percent: float = PROFILE_SAMPLE_PERCENT
+) -> str:
+    """
+    SQL that counts the distinct values of a column, exactly, in a
+    TABLESAMPLE SYSTEM sample of a table's pages, with the number of rows
+    each value would have in the full table.
+    """
+    return dedent(
+        f"""
+        -- Profile of {column} from a {percent:g}% sample of the pages of {table}.
+        -- SYSTEM sampling reads whole pages, so it is fast, but values that are
+        -- clustered on disk can skew it. Change the percentage (up to 100) to
+        -- trade speed for accuracy, or remove repeatable for a new sample.
+        with
+            sample as (
+                select {column} as value
+                from {table} tablesample system ({percent:g}) repeatable (0)
+            )
+        select
+            value::text as "Value",
+            count(*) as "Sampled Rows",
+            round(100.0 * count(*) / sum(count(*)) over (), 2) as "% of Sample",
+            round(count(*) * 100 / {percent:g})::bigint as "Estimated Rows",
+            count(*) over () as "Distinct in Sample"
+        from sample
+        group by value
+        order by count(*) desc, value::text
+        limit {PROFILE_LIMIT};
+        """
+    ).strip("\n")
@@ -1,13 +1,30 @@
 from __future__ import annotations
 
 import csv
+import heapq
+import re
+from bisect import bisect_left
+from itertools import groupby, islice
 from pathlib import Path
+from typing import Iterable
 
 from harlequin import HarlequinCompletion
 from psycopg import Connection
 
+from harlequin_postgres.schema_filter import SchemaFilter
+from harlequin_postgres.store import CatalogStore, SchemaSlice
 
-def _get_completions(conn: Connection) -> list[HarlequinCompletion]:
+# the priority Harlequin gives to completions for catalog items
+CATALOG_PRIORITY = 500
+
+RELATION_TYPE_LABELS = {"r": "t", "p": "pt", "v": "v", "f": "f", "m": "mv"}
+
+SIMPLE_IDENTIFIER = re.compile(r"[a-z_][a-z0-9_$]*")
+
+
+def _get_completions(
+    conn: Connection, schema_filter: SchemaFilter
+) -> list[HarlequinCompletion]:
     completions: list[HarlequinCompletion] = []
 
     # source: https://www.postgresql.org/docs/current/sql-keywords-appendix.html
@@ -29,28 +46,38 @@ def _get_completions(conn: Connection) -> list[HarlequinCompletion]:
                 )
             )
 
-    with conn.cursor() as cur:
-        cur.execute(
-            r"""
-            select distinct
-                routine_name as label,
-                case when routine_type is null then 'agg' else 'fn' end as type_label,
-                case
-                    when routine_schema = 'pg_catalog'  --
-                    then null
-                    else routine_schema
-                end as context
-            from information_schema.routines
-            where
-                length(routine_name) < 37
-                and routine_name not ilike '\_%'
-                and routine_name not ilike 'pg\_%'
-                and routine_name not ilike 'binary\_upgrade\_%'
-
-            ;"""
-        )
-        results = cur.fetchall()
-    for label, type_label, context in results:
+    # these queries are independent, so send them together in pipeline mode
+    with conn.cursor() as routines_cur, conn.cursor() as settings_cur:
+        with conn.pipeline():
+            routines_cur.execute(
+                rf"""
+                select distinct
+                    routine_name as label,
+                    case
+                        when routine_type is null then 'agg' else 'fn'
+                    end as type_label,
+                    case
+                        when routine_schema = 'pg_catalog'  --
+                        then null
+                        else routine_schema
+                    end as context
+                from information_schema.routines
+                where
+                    length(routine_name) < 37
+                    and routine_name not ilike '\_%%'
+                    and routine_name not ilike 'pg\_%%'
+                    and routine_name not ilike 'binary\_upgrade\_%%'
+                    and (
+                        routine_schema = 'pg_catalog'
+                        or {SchemaFilter.clause("routine_schema")}
+                    )
+                ;""",
+                schema_filter.params,
+            )
+            settings_cur.execute("""select distinct name as label from pg_settings""")
+        routine_results = routines_cur.fetchall()
+        setting_results = settings_cur.fetchall()
+    for label, type_label, context in routine_results:
         completions.append(
             HarlequinCompletion(
                 label=label,
@@ -61,10 +88,7 @@ def _get_completions(conn: Connection) -> list[HarlequinCompletion]:
             )
         )
 
-    with conn.cursor() as cur:
-        cur.execute("""select distinct name as label from pg_settings""")
-        results = cur.fetchall()
-    for (label,) in results:
+    for (label,) in setting_results:
         completions.append(
             HarlequinCompletion(
                 label=label, type_label="set", value=label, priority=2000, context=None
@@ -72,3 +96,199 @@ def _get_completions(conn: Connection) -> list[HarlequinCompletion]:
         )
 
     return sorted(completions)
+
+
+def _quote_identifier(name: str) -> str:
+    if SIMPLE_IDENTIFIER.fullmatch(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _Bucket:
+    """
+    Completions that share a context, type label, and priority, sorted by
+    their lower-cased label so that prefix matches are a contiguous range.
+    """
+
+    __slots__ = ("context", "type_label", "priority", "keys", "labels", "values")
+
+    def __init__(
+        self,
+        context: str | None,
+        type_label: str,
+        priority: int,
+        labels: Iterable[str],
+        values: dict[str, str] | None = None,
+    ) -> None:
+        self.context = context
+        self.type_label = type_label
+        self.priority = priority
+        pairs = sorted((label.lower(), label) for label in set(labels))
+        self.keys = [key for key, _ in pairs]
+        self.labels = [label for _, label in pairs]
+        # only the labels whose value differs from the label itself
+        self.values = values or {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def prefix_range(self, prefix: str) -> range:
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\U0010ffff", lo)
+        return range(lo, hi)
+
+    def completion(self, index: int) -> HarlequinCompletion:
+        label = self.labels[index]
+        return HarlequinCompletion(
+            label=label,
+            type_label=self.type_label,
+            value=self.values.get(label, label),
+            priority=self.priority,
+            context=self.context,
+        )
+
+
+class CompletionIndex:
+    """
+    A prefix index over completions, keyed by context and type label. Each
+    bucket is a sorted array that is searched with bisect, so a lookup costs
+    O(log n) plus the number of results, no matter how many completions
+    there are. Buckets can be replaced independently when the catalog changes.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: dict[tuple[str | None, str], list[_Bucket]] = {}
+        self._contexts: dict[str | None, set[str]] = {}
+        # the (context, type label) keys that each schema slice indexed, so a
+        # reload only replaces those, and keeps function buckets in the schema
+        self._slices: dict[int, tuple[SchemaSlice, list[tuple[str, str]]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(b) for buckets in self._buckets.values() for b in buckets)
+
+    def replace(
+        self, context: str | None, type_label: str, buckets: list[_Bucket]
+    ) -> None:
+        key = (context, type_label)
+        if buckets:
+            self._buckets[key] = buckets
+            self._contexts.setdefault(context, set()).add(type_label)
+        else:
+            self._buckets.pop(key, None)
+            self._contexts.get(context, set()).discard(type_label)
+
+    def replace_completions(
+        self, completions: Iterable[HarlequinCompletion], type_labels: Iterable[str]
+    ) -> None:
+        """
+        Replaces every bucket with one of `type_labels`, in every context,
+        with buckets built from `completions`.
+        """
+        replaced = set(type_labels)
+        for key in [key for key in self._buckets if key[1] in replaced]:
+            self.replace(*key, [])
+
+        def group_key(c: HarlequinCompletion) -> tuple[str, str, int]:
+            return (c.context or "", c.type_label, c.priority)
+
+        grouped: dict[tuple[str | None, str], list[_Bucket]] = {}
+        for (context, type_label, priority), group in groupby(
+            sorted(completions, key=group_key), key=group_key
+        ):
+            items = list(group)
+            grouped.setdefault((context or None, type_label), []).append(
+                _Bucket(
+                    context=context or None,
+                    type_label=type_label,
+                    priority=priority,
+                    labels=[c.label for c in items],
+                    values={c.label: c.value for c in items if c.value != c.label},
+                )
+            )
+        for (bucket_context, bucket_type), buckets in grouped.items():
+            self.replace(bucket_context, bucket_type, buckets)
+
+    def sync(self, store: CatalogStore) -> None:
+        """
+        Indexes relation names (in their schema's context) and column names
+        (in their relation's "schema.relation" context) for the schemas that
+        were loaded or reloaded since the last sync.
+        """
+        schemas = {schema.oid: schema for schema in store.schemas()}
+        for schema_oid in self._slices.keys() - schemas.keys():
+            _, keys = self._slices.pop(schema_oid)
+            self._remove_keys(keys)
+        for schema_oid, schema in schemas.items():
+            existing = self._slices.get(schema_oid)
+            if existing is not None and existing[0] is schema:
+                continue
+            if existing is not None:
+                self._remove_keys(existing[1])
+            self._slices[schema_oid] = (schema, self._index_slice(schema))
+
+    def _index_slice(self, schema: SchemaSlice) -> list[tuple[str, str]]:
+        relations_by_type: dict[str, list[str]] = {}
+        keys: list[tuple[str, str]] = []
+        for relation in schema.relations():
+            if relation.persistence == "t":
+                type_label = "tmp"
+            else:
+                type_label = RELATION_TYPE_LABELS.get(relation.relkind, "t")
+            relations_by_type.setdefault(type_label, []).append(relation.name)
+            names = [column.name for column in relation.columns()]
+            if names:
+                context = f"{schema.name}.{relation.name}"
+                keys.append((context, "col"))
+                self.replace(context, "col", [_catalog_bucket(context, "col", names)])
+        for type_label, names in relations_by_type.items():
+            keys.append((schema.name, type_label))
+            self.replace(
+                schema.name,
+                type_label,
+                [_catalog_bucket(schema.name, type_label, names)],
+            )
+        return keys
+
+    def _remove_keys(self, keys: list[tuple[str, str]]) -> None:
+        for context, type_label in keys:
+            self.replace(context, type_label, [])
+
+    def complete(
+        self,
+        prefix: str,
+        context: str | None = None,
+        type_labels: Iterable[str] | None = None,
+        limit: int = 50,
+    ) -> list[HarlequinCompletion]:
+        """
+        Returns up to `limit` completions in `context` whose label starts with
+        `prefix` (case-insensitive), ordered by priority and then label.
+        """
+        prefix = prefix.lower()
+        wanted = set(type_labels) if type_labels is not None else None
+        candidates: list[tuple[int, str, _Bucket, int]] = []
+        for type_label in self._contexts.get(context, ()):
+            if wanted is not None and type_label not in wanted:
+                continue
+            for bucket in self._buckets[(context, type_label)]:
+                # each bucket is sorted, so only its first `limit` matches count
+                for index in islice(bucket.prefix_range(prefix), limit):
+                    candidates.append(
+                        (bucket.priority, bucket.keys[index], bucket, index)
+                    )
+        best = heapq.nsmallest(limit, candidates, key=lambda c: (c[0], c[1]))
+        return [bucket.completion(index) for _, _, bucket, index in best]
+
+
+def _catalog_bucket(context: str, type_label: str, names: list[str]) -> _Bucket:
+    return _Bucket(
+        context=context,
+        type_label=type_label,
+        priority=CATALOG_PRIORITY,
+        labels=names,
+        values={
+            name: quoted
+            for name in names
+            if (quoted := _quote_identifier(name)) != name
+        },
+    )
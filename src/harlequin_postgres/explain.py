@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+
+ANALYZE_COLUMNS = [
+    ("Node", "#"),
+    ("Parent", "#"),
+    ("Operation", "s"),
+    ("Object", "s"),
+    ("Self Time (ms)", "#.#"),
+    ("Self Time %", "#.#"),
+    ("Total Time (ms)", "#.#"),
+    ("Est. Rows", "##"),
+    ("Actual Rows", "##"),
+    ("Loops", "##"),
+    ("Misestimate", "#.#"),
+    ("Shared Hit", "##"),
+    ("Shared Read", "##"),
+    ("Local Hit", "##"),
+    ("Local Read", "##"),
+]
+
+ESTIMATE_COLUMNS = [
+    ("Node", "#"),
+    ("Parent", "#"),
+    ("Operation", "s"),
+    ("Object", "s"),
+    ("Self Cost", "#.#"),
+    ("Self Cost %", "#.#"),
+    ("Total Cost", "#.#"),
+    ("Est. Rows", "##"),
+    ("Width", "#"),
+]
+
+BUFFER_KEYS = (
+    "Shared Hit Blocks",
+    "Shared Read Blocks",
+    "Local Hit Blocks",
+    "Local Read Blocks",
+)
+
+
+@dataclass
+class PlanNode:
+    """
+    One node of an EXPLAIN (FORMAT JSON) plan. Times are in milliseconds and,
+    like buffers, are inclusive of the node's children and summed over loops.
+    """
+
+    id: int
+    parent_id: int | None
+    operation: str
+    object: str | None
+    total_cost: float
+    plan_rows: float
+    plan_width: int
+    total_time: float | None = None
+    actual_rows: float | None = None
+    loops: int | None = None
+    buffers: tuple[int, ...] = (0, 0, 0, 0)
+    children: list["PlanNode"] = field(default_factory=list)
+
+    @property
+    def self_cost(self) -> float:
+        return max(0.0, self.total_cost - sum(c.total_cost for c in self.children))
+
+    @property
+    def self_time(self) -> float:
+        # parallel workers report per-worker times, so a Gather node can end up
+        # with less time than its children; clamp it at zero
+        if self.total_time is None:
+            return 0.0
+        return max(0.0, self.total_time - sum(c.total_time or 0 for c in self.children))
+
+    @property
+    def self_buffers(self) -> tuple[int, ...]:
+        return tuple(
+            max(0, own - sum(c.buffers[i] for c in self.children))
+            for i, own in enumerate(self.buffers)
+        )
+
+    @property
+    def misestimate(self) -> float | None:
+        """
+        How many times more (> 1) or fewer (< 1) rows the node returned per
+        loop than the planner estimated.
+        """
+        if self.actual_rows is None or not self.loops:
+            return None
+        return max(self.actual_rows / self.loops, 1) / max(self.plan_rows, 1)
+
+
+def parse_plan(explain_result: Any) -> list[PlanNode]:
+    """
+    Flattens the JSON output of EXPLAIN into a list of nodes, in plan order.
+    """
+    [root] = explain_result
+    nodes: list[PlanNode] = []
+
+    def visit(plan: dict[str, Any], parent: PlanNode | None) -> PlanNode:
+        loops = plan.get("Actual Loops")
+        node = PlanNode(
+            id=len(nodes) + 1,
+            parent_id=parent.id if parent is not None else None,
+            operation=_operation(plan),
+            object=_object(plan),
+            total_cost=plan["Total Cost"],
+            plan_rows=plan["Plan Rows"],
+            plan_width=plan["Plan Width"],
+            total_time=(
+                plan["Actual Total Time"] * loops
+                if "Actual Total Time" in plan and loops
+                else None
+            ),
+            actual_rows=(plan["Actual Rows"] * loops if loops is not None else None),
+            loops=loops,
+            buffers=tuple(plan.get(key, 0) for key in BUFFER_KEYS),
+        )
+        nodes.append(node)
+        node.children = [visit(child, node) for child in plan.get("Plans", [])]
+        return node
+
+    visit(root["Plan"], None)
+    return nodes
+
+
+def hot_node_rows(
+    nodes: list[PlanNode], analyze: bool
+) -> tuple[list[tuple[str, str]], list[tuple[Any, ...]]]:
+    """
+    Returns the columns and rows of a result set with one row per plan node,
+    sorted by exclusive (self) time, or by exclusive cost if the plan was not
+    analyzed, so that the hot spot is the first row.
+    """
+    if analyze:
+        total = sum(node.self_time for node in nodes) or 1.0
+        ordered = sorted(nodes, key=lambda node: node.self_time, reverse=True)
+        rows = [
+            (
+                node.id,
+                node.parent_id,
+                node.operation,
+                node.object,
+                round(node.self_time, 3),
+                round(node.self_time / total * 100, 1),
+                round(node.total_time or 0.0, 3),
+                round(node.plan_rows),
+                round(node.actual_rows) if node.actual_rows is not None else None,
+                node.loops,
+                round(node.misestimate, 2) if node.misestimate is not None else None,
+                *node.self_buffers,
+            )
+            for node in ordered
+        ]
+        return ANALYZE_COLUMNS, rows
+
+    total = sum(node.self_cost for node in nodes) or 1.0
+    ordered = sorted(nodes, key=lambda node: node.self_cost, reverse=True)
+    rows = [
+        (
+            node.id,
+            node.parent_id,
+            node.operation,
+            node.object,
+            round(node.self_cost, 2),
+            round(node.self_cost / total * 100, 1),
+            round(node.total_cost, 2),
+            round(node.plan_rows),
+            node.plan_width,
+        )
+        for node in ordered
+    ]
+    return ESTIMATE_COLUMNS, rows
+
+
+def _operation(plan: dict[str, Any]) -> str:
+    operation = str(plan["Node Type"])
+    if "Join Type" in plan and operation != "Hash":
+        operation = f"{operation} ({plan['Join Type']})"
+    elif "Strategy" in plan and plan["Strategy"] != "Plain":
+        operation = f"{operation} ({plan['Strategy']})"
+    if plan.get("Parent Relationship") == "SubPlan":
+        operation = f"{operation} [{plan.get('Subplan Name', 'SubPlan')}]"
+    return operation
+
+
+def _object(plan: dict[str, Any]) -> str | None:
+    if "Relation Name" in plan:
+        name = str(plan["Relation Name"])
+        if plan.get("Alias") not in (None, plan["Relation Name"]):
+            name = f"{name} {plan['Alias']}"
+        if "Index Name" in plan:
+            name = f"{name} using {plan['Index Name']}"
+        return name
+    if "Index Name" in plan:
+        return str(plan["Index Name"])
+    if "CTE Name" in plan:
+        return f"CTE {plan['CTE Name']}"
+    if "Function Name" in plan:
+        return str(plan["Function Name"])
+    return None
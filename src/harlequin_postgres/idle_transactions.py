@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from math import ceil
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from harlequin_postgres.adapter import HarlequinPostgresConnection
+
+# seconds between checks of the editor's transaction; a check only reads
+# state kept by the connection, so it never runs a query
+IDLE_CHECK_INTERVAL = 1.0
+
+# an idle transaction is warned about once it has been idle for this share
+# of the timeout
+IDLE_WARNING_FRACTION = 0.75
+
+# the server-side idle_in_transaction_session_timeout is this many seconds
+# longer than the client-side timeout, so the server only ends the session
+# if Harlequin could not roll back (e.g., because it was suspended)
+SERVER_TIMEOUT_MARGIN = 30.0
+
+# the transaction age, idle time, and granted locks of one backend. Row locks
+# are recorded in the rows themselves, so they appear as the transaction's
+# transactionid lock
+TRANSACTION_LOCKS_QUERY = """
+    select
+        now() - a.xact_start,
+        case
+            when a.state like 'idle in transaction%%' then now() - a.state_change
+        end,
+        l.locktype,
+        l.mode,
+        case
+            when l.relation is not null then coalesce(
+                n.nspname || '.' || c.relname, l.relation::text
+            )
+            when l.locktype = 'transactionid' then l.transactionid::text
+            when l.locktype = 'virtualxid' then l.virtualxid
+            else concat_ws(' ', l.classid, l.objid, l.objsubid)
+        end
+    from pg_catalog.pg_stat_activity a
+    join pg_catalog.pg_locks l on l.pid = a.pid and l.granted
+    left join pg_catalog.pg_class c on c.oid = l.relation
+    left join pg_catalog.pg_namespace n on n.oid = c.relnamespace
+    where a.pid = %s and a.xact_start is not null
+    order by l.relation is null, 5, 4
+    ;"""
+
+TRANSACTION_COLUMNS = [
+    ("Transaction Age", "|-|"),
+    ("Idle For", "|-|"),
+    ("Lock Type", "s"),
+    ("Mode", "s"),
+    ("Object", "s"),
+]
+
+
+def format_seconds(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
+
+
+class IdleTransactionGuard(Thread):
+    """
+    Watches the editor's connection, and rolls back its transaction once it
+    has been idle (open, with no statement running) for `timeout` seconds.
+    If a notifier is set, it warns before it rolls back.
+    """
+
+    def __init__(
+        self,
+        connection: "HarlequinPostgresConnection",
+        timeout: float,
+        interval: float = IDLE_CHECK_INTERVAL,
+    ) -> None:
+        super().__init__(name="harlequin-postgres-idle-transactions", daemon=True)
+        self.connection = connection
+        self.timeout = timeout
+        self.interval = interval
+        self.notify: Callable[..., None] | None = None
+        self._stopped = Event()
+        self._warned = False
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                # the next statement on the editor's connection reports any
+                # problem with it
+                continue
+
+    def check(self) -> None:
+        times = self.connection._idle_transaction_times()
+        if times is None:
+            self._warned = False
+            return
+        age, idle = times
+        if idle >= self.timeout:
+            if self.connection._rollback_idle_transaction(self.timeout):
+                self._warned = False
+                self._notify(
+                    f"Rolled back your transaction after it was idle for "
+                    f"{format_seconds(idle)}.",
+                    severity="warning",
+                )
+        elif idle < self.timeout * IDLE_WARNING_FRACTION:
+            # warn again if the transaction is used, and then left idle again
+            self._warned = False
+        elif not self._warned:
+            self._warned = True
+            self._notify(
+                f"Your transaction has been open for {format_seconds(age)}, and "
+                f"idle for {format_seconds(idle)}. Harlequin will roll it back if "
+                f"it is idle for {format_seconds(ceil(self.timeout - idle))} more. "
+                "Commit or roll back now, or run \\txn to see the locks it holds.",
+                severity="warning",
+            )
+
+    def _notify(self, message: str, severity: str) -> None:
+        if self.notify is not None:
+            self.notify(message, severity=severity)
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+from textwrap import dedent
+
+# tables with fewer live rows than this are cheap to scan sequentially
+SEQ_SCAN_MIN_ROWS = 10_000
+
+
+def index_advisor_sql(target: str, scope: str) -> str:
+    """
+    SQL that reports unused indexes, indexes whose keys are a prefix of
+    another index on the same table, and large tables that are read mostly by
+    sequential scans, with a statement that would fix each finding. `scope` is
+    a query that returns the OIDs of the tables to check.
+    """
+    return dedent(
+        f"""
+        -- Index advisor for {target}. Scan counts are cumulative since the
+        -- statistics were last reset, and only include scans on this server, so
+        -- check replicas before dropping an index. CONCURRENTLY statements
+        -- cannot run inside a transaction: use Auto transaction mode.
+        with
+            scope as (
+                {scope}
+            ),
+            indexes as (
+                select
+                    i.indexrelid,
+                    i.indrelid,
+                    n.nspname,
+                    t.relname as table_name,
+                    ic.relname as index_name,
+                    ic.relam,
+                    i.indkey::text as keys,
+                    i.indclass::text as classes,
+                    i.indexprs is not null as has_expressions,
+                    coalesce(pg_catalog.pg_get_expr(i.indpred, i.indrelid), '')
+                        as predicate,
+                    i.indisunique or i.indisexclusion or con.oid is not null
+                        as is_constraint,
+                    coalesce(s.idx_scan, 0) as idx_scan,
+                    pg_catalog.pg_relation_size(i.indexrelid) as size
+                from pg_catalog.pg_index i
+                join pg_catalog.pg_class ic on ic.oid = i.indexrelid
+                join pg_catalog.pg_class t on t.oid = i.indrelid
+                join pg_catalog.pg_namespace n on n.oid = t.relnamespace
+                left join pg_catalog.pg_stat_user_indexes s
+                    on s.indexrelid = i.indexrelid
+                left join pg_catalog.pg_constraint con
+                    on con.conindid = i.indexrelid
+                    and con.contype in ('p', 'u', 'x')
+                where
+                    i.indrelid in (select oid from scope)
+                    and ic.relkind = 'i'
+                    and i.indisvalid
+            ),
+            findings as (
+                select
+                    1 as priority,
+                    'Unused index' as finding,
+                    nspname,
+                    table_name,
+                    index_name,
+                    size,
+                    idx_scan,
+                    'Never used for a scan since the statistics were reset'
+                        as detail,
+                    pg_catalog.format(
+                        'drop index concurrently %I.%I;', nspname, index_name
+                    ) as suggestion
+                from indexes
+                where idx_scan = 0 and not is_constraint
+                union all
+                (
+                    select distinct on (a.indexrelid)
+                        2,
+                        'Duplicate index',
+                        a.nspname,
+                        a.table_name,
+                        a.index_name,
+                        a.size,
+                        a.idx_scan,
+                        pg_catalog.format(
+                            'Its keys are %s of %I',
+                            case when a.keys = b.keys then 'the same as those'
+                            else 'a prefix' end,
+                            b.index_name
+                        ),
+                        pg_catalog.format(
+                            'drop index concurrently %I.%I;', a.nspname, a.index_name
+                        )
+                    from indexes a
+                    join indexes b
+                        on b.indrelid = a.indrelid
+                        and b.indexrelid != a.indexrelid
+                        and b.relam = a.relam
+                        and b.predicate = a.predicate
+                        and not b.has_expressions
+                        and b.keys || ' ' like a.keys || ' %'
+                        and b.classes || ' ' like a.classes || ' %'
+                        -- of two identical indexes, keep the constraint or the older
+                        and (
+                            b.keys != a.keys
+                            or b.is_constraint
+                            or b.indexrelid < a.indexrelid
+                        )
+                    where not a.is_constraint and not a.has_expressions
+                    order by a.indexrelid, b.is_constraint desc, length(b.keys)
+                )
+                union all
+                select
+                    3,
+                    'Sequential scans',
+                    st.schemaname,
+                    st.relname,
+                    null,
+                    pg_catalog.pg_relation_size(st.relid),
+                    coalesce(st.idx_scan, 0),
+                    pg_catalog.format(
+                        '%s sequential scans read %s rows each on average; '
+                        '%s index scans',
+                        st.seq_scan,
+                        st.seq_tup_read / st.seq_scan,
+                        coalesce(st.idx_scan, 0)
+                    ),
+                    pg_catalog.format(
+                        'create index concurrently on %I.%I (%s);',
+                        st.schemaname,
+                        st.relname,
+                        coalesce(
+                            pg_catalog.quote_ident(candidate.attname),
+                            '/* columns used in frequent filters */'
+                        )
+                    )
+                from pg_catalog.pg_stat_user_tables st
+                -- suggest the most selective column that does not already lead
+                -- an index; check it against the queries that scan the table
+                left join lateral (
+                    select ps.attname
+                    from pg_catalog.pg_stats ps
+                    join pg_catalog.pg_attribute a
+                        on a.attrelid = st.relid and a.attname = ps.attname
+                    where
+                        ps.schemaname = st.schemaname
+                        and ps.tablename = st.relname
+                        and not exists (
+                            select
+                            from pg_catalog.pg_index i
+                            where i.indrelid = st.relid and i.indkey[0] = a.attnum
+                        )
+                    order by
+                        case
+                            when ps.n_distinct < 0 then -ps.n_distinct
+                            else ps.n_distinct / greatest(st.n_live_tup, 1)
+                        end desc
+                    limit 1
+                ) candidate on true
+                where
+                    st.relid in (select oid from scope)
+                    and st.seq_scan > coalesce(st.idx_scan, 0)
+                    and st.n_live_tup >= {SEQ_SCAN_MIN_ROWS}
+            )
+        select
+            finding as "Finding",
+            nspname as "Schema",
+            table_name as "Table",
+            index_name as "Index",
+            pg_catalog.pg_size_pretty(size) as "Size",
+            idx_scan as "Index Scans",
+            detail as "Detail",
+            suggestion as "Suggested SQL"
+        from findings
+        order by priority, size desc, 2, 3, 4;
+        """
+    ).strip("\n")
@@ -1,14 +1,22 @@
 from __future__ import annotations
 
+from datetime import datetime
 from textwrap import dedent
-from typing import TYPE_CHECKING, Literal, Sequence
+from typing import TYPE_CHECKING, Literal, Sequence, cast
 
 from harlequin.catalog import CatalogItem
 from harlequin.exception import HarlequinQueryError
 
+from harlequin_postgres.bloat import bloat_estimate_sql, bloat_exact_sql
+from harlequin_postgres.column_stats import column_profile_sql, column_stats_sql
+from harlequin_postgres.index_advisor import index_advisor_sql
+from harlequin_postgres.sampling import sample_data_sql, sample_method
+from harlequin_postgres.sessions import blocking_tree
+
 if TYPE_CHECKING:
     from harlequin.driver import HarlequinDriver
 
+    from harlequin_postgres.adapter import HarlequinPostgresConnection
     from harlequin_postgres.catalog import (
         ColumnCatalogItem,
         DatabaseCatalogItem,
@@ -16,6 +24,7 @@ if TYPE_CHECKING:
         SchemaCatalogItem,
         ViewCatalogItem,
     )
+    from harlequin_postgres.stat_statements import StatStatementsSource
 
 
 def execute_use_statement(
@@ -134,6 +143,24 @@ def show_select_star(
     )
 
 
+def show_sample_data(
+    item: "RelationCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    if item.oid is None:
+        driver.notify(
+            f"Could not sample {item.label} due to missing object identifier.",
+            severity="error",
+        )
+        return
+    method, percent = sample_method(item.connection._get_sample_sizes(item.oid))
+    driver.insert_text_in_new_buffer(
+        sample_data_sql(item.qualified_identifier, method, percent)
+    )
+
+
 def show_list_objects(
     item: "SchemaCatalogItem" | "DatabaseCatalogItem",
     driver: "HarlequinDriver",
@@ -143,11 +170,14 @@ def show_list_objects(
 
     # can't use isinstance due to circular reference
     if type(item).__name__ == "SchemaCatalogItem":
-        where_clause = f"and n.nspname = '{item.label}'"
+        where_clause = f"and c.relnamespace = {cast('SchemaCatalogItem', item).oid}"
     else:
         where_clause = (
             "and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema')"
         )
+        if item.connection is not None and item.connection.schema_filter:
+            schema_clause = item.connection.schema_filter.inline_clause("n.nspname")
+            where_clause += f"\n                and {schema_clause}"
     driver.insert_text_in_new_buffer(
         dedent(
             f"""
@@ -194,11 +224,14 @@ def show_list_indexes(
 
     # can't use isinstance due to circular reference
     if type(item).__name__ == "SchemaCatalogItem":
-        where_clause = f"and n.nspname = '{item.label}'"
+        where_clause = f"and c.relnamespace = {cast('SchemaCatalogItem', item).oid}"
     else:
         where_clause = (
             "and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema')"
         )
+        if item.connection is not None and item.connection.schema_filter:
+            schema_clause = item.connection.schema_filter.inline_clause("n.nspname")
+            where_clause += f"\n                and {schema_clause}"
     driver.insert_text_in_new_buffer(
         dedent(
             f"""
@@ -246,9 +279,9 @@ def show_describe_relation(
 ) -> None:
     # sourced from psql -E \d+ {my rel}
     # see https://stackoverflow.com/questions/60155968/using-results-of-d-command-in-psql
-    if item.parent is None:
+    if item.oid is None:
         driver.notify(
-            f"Could not describe {item.label} due to missing schema reference.",
+            f"Could not describe {item.label} due to missing object identifier.",
             severity="error",
         )
         return
@@ -257,10 +290,10 @@ def show_describe_relation(
             f"""
             with
                 index_columns as (
-                    select i.indexrelid, c.oid as rel_oid, unnest(i.indkey) as attnum
+                    select
+                        i.indexrelid, i.indrelid as rel_oid, unnest(i.indkey) as attnum
                     from pg_catalog.pg_index i
-                    join pg_catalog.pg_class c on c.oid = i.indrelid
-                    where c.relname = '{item.label}'
+                    where i.indrelid = {item.oid}
                 ),
                 index_column_counts as (
                     select rel_oid, attnum, count(*) as cnt 
@@ -268,10 +301,10 @@ def show_describe_relation(
                     group by 1, 2
                 ),
                 constraint_columns as (
-                    select con.oid, c.oid as rel_oid, unnest(con.conkey) as attnum
+                    select
+                        con.oid, con.conrelid as rel_oid, unnest(con.conkey) as attnum
                     from pg_catalog.pg_constraint con
-                    join pg_catalog.pg_class c on con.conrelid = c.oid
-                    where c.relname = '{item.label}'
+                    where con.conrelid = {item.oid}
                 ),
                 constraint_column_counts as (
                     select rel_oid, attnum, count(*) as cnt
@@ -282,12 +315,11 @@ def show_describe_relation(
                     select
                         src.relname as src_name,
                         src.relnamespace::regnamespace as src_schema,
-                        c.oid as rel_oid,
+                        con.confrelid as rel_oid,
                         unnest(con.confkey) as attnum
                     from pg_catalog.pg_constraint con
-                    join pg_catalog.pg_class c on con.confrelid = c.oid
                     join pg_catalog.pg_class src on con.conrelid = src.oid
-                    where c.relname = '{item.label}'
+                    where con.confrelid = {item.oid}
                 ),
                 fkey_references as (
                     select
@@ -340,8 +372,6 @@ def show_describe_relation(
                 fkey_references.sources as "Referenced by",
                 pg_catalog.col_description(a.attrelid, a.attnum) as "Description"
             from pg_catalog.pg_attribute a
-            join pg_catalog.pg_class c on a.attrelid = c.oid
-            left join pg_catalog.pg_namespace n on n.oid = c.relnamespace
             left join pg_catalog.pg_collation coll on coll.oid = a.attcollation
             left join
                 pg_catalog.pg_type t
@@ -362,8 +392,7 @@ def show_describe_relation(
                 on a.attnum = fkey_references.attnum
                 and a.attrelid = fkey_references.rel_oid
             where
-                c.relname = '{item.label}'
-                and n.nspname = '{item.parent.label}'
+                a.attrelid = {item.oid}
                 and a.attnum > 0
                 and not a.attisdropped
             order by a.attnum
@@ -376,9 +405,9 @@ def show_describe_table_indexes(
     item: "RelationCatalogItem",
     driver: "HarlequinDriver",
 ) -> None:
-    if item.parent is None:
+    if item.oid is None:
         driver.notify(
-            f"Could not describe {item.label} due to missing schema reference.",
+            f"Could not describe {item.label} due to missing object identifier.",
             severity="error",
         )
         return
@@ -388,10 +417,9 @@ def show_describe_table_indexes(
             with
                 index_columns as (
                     select
-                        i.indexrelid, c.oid as rel_oid, unnest(i.indkey) as attnum
+                        i.indexrelid, i.indrelid as rel_oid, unnest(i.indkey) as attnum
                     from pg_catalog.pg_index i
-                    join pg_catalog.pg_class c on c.oid = i.indrelid
-                    where c.relname = '{item.label}'
+                    where i.indrelid = {item.oid}
                 ),
                 index_column_names as (
                     select
@@ -416,14 +444,11 @@ def show_describe_table_indexes(
                 i.indisvalid as "Is Valid"
             from pg_catalog.pg_index i
             join pg_catalog.pg_class c on c.oid = i.indrelid
-            left join pg_catalog.pg_namespace n on n.oid = c.relnamespace
             join pg_catalog.pg_class ic on i.indexrelid = ic.oid
             join pg_catalog.pg_am on ic.relam = pg_am.oid
             left join
                 index_column_names on i.indexrelid = index_column_names.indexrelid
-            where
-                c.relname = '{item.label}'
-                and n.nspname = '{item.parent.label}'
+            where i.indrelid = {item.oid}
             """.strip("\n")
         )
     )
@@ -433,9 +458,9 @@ def show_describe_table_constraints(
     item: "RelationCatalogItem",
     driver: "HarlequinDriver",
 ) -> None:
-    if item.parent is None:
+    if item.oid is None:
         driver.notify(
-            f"Could not describe {item.label} due to missing schema reference.",
+            f"Could not describe {item.label} due to missing object identifier.",
             severity="error",
         )
         return
@@ -444,10 +469,10 @@ def show_describe_table_constraints(
             f"""
             with
                 constraint_columns as (
-                    select con.oid, c.oid as rel_oid, unnest(con.conkey) as attnum
+                    select
+                        con.oid, con.conrelid as rel_oid, unnest(con.conkey) as attnum
                     from pg_catalog.pg_constraint con
-                    join pg_catalog.pg_class c on con.conrelid = c.oid
-                    where c.relname = '{item.label}'
+                    where con.conrelid = {item.oid}
                 ),
                 constraint_column_names as (
                     select
@@ -461,10 +486,10 @@ def show_describe_table_constraints(
                     group by 1
                 ),
                 constraint_foreign_columns as (
-                    select con.oid, c.oid as rel_oid, unnest(con.confkey) as attnum
+                    select
+                        con.oid, con.confrelid as rel_oid, unnest(con.confkey) as attnum
                     from pg_catalog.pg_constraint con
-                    join pg_catalog.pg_class c on con.conrelid = c.oid
-                    where c.relname = '{item.label}'
+                    where con.conrelid = {item.oid}
                 ),
                 constraint_foreign_column_names as (
                     select
@@ -500,7 +525,7 @@ def show_describe_table_constraints(
                     else con.contype::text
                 end as "Constraint Type",
                 constraint_column_names.columns as "Columns",
-                c.relnamespace::regnamespace
+                fc.relnamespace::regnamespace
                 || '.'
                 || fc.relname
                 || '('
@@ -548,16 +573,13 @@ def show_describe_table_constraints(
                 end as "FK Match Type"
             from pg_catalog.pg_constraint con
             join pg_catalog.pg_class c on con.conrelid = c.oid
-            join pg_catalog.pg_namespace n on n.oid = c.relnamespace
             left join pg_catalog.pg_class fc on con.confrelid = fc.oid
             left join
                 constraint_column_names on con.oid = constraint_column_names.oid
             left join
                 constraint_foreign_column_names
                 on con.oid = constraint_foreign_column_names.oid
-            where
-                c.relname = '{item.label}'
-                and n.nspname = '{item.parent.label}'
+            where con.conrelid = {item.oid}
             """.strip("\n")
         )
     )
@@ -567,21 +589,11 @@ def show_view_definition(
     item: "ViewCatalogItem",
     driver: "HarlequinDriver",
 ) -> None:
-    if item.connection is None or item.parent is None:
-        return
-    view_def_query = f"""
-        select pg_catalog.pg_get_viewdef(c.oid, true)
-        from pg_catalog.pg_class as c
-        left join pg_catalog.pg_namespace n on n.oid = c.relnamespace
-        where c.relname = '{item.label}' and n.nspname = '{item.parent.label}'
-        """.strip("\n")
-    cur = item.connection.execute(view_def_query)
-    if cur is None:
+    if item.connection is None or item.oid is None:
         return
-    result = cur.fetchall()
-    if result is None:
+    view_def = item.connection._get_view_definition(item.oid)
+    if view_def is None:
         return
-    view_def: str = result[0][0]
     driver.insert_text_in_new_buffer(
         f"-- View definition for {item.query_name}\n" + view_def
     )
@@ -595,4 +607,409 @@ def insert_columns_at_cursor(
         cols: Sequence["CatalogItem" | "ColumnCatalogItem"] = item.children
     else:
         cols = item.fetch_children()
-    driver.insert_text_at_selection(text=",\n".join(c.query_name for c in cols))
+    # partitioned tables also have a partitions node; can't use isinstance due
+    # to circular reference
+    driver.insert_text_at_selection(
+        text=",\n".join(
+            c.query_name for c in cols if type(c).__name__ == "ColumnCatalogItem"
+        )
+    )
+
+
+def _column_table(
+    item: "ColumnCatalogItem", driver: "HarlequinDriver"
+) -> "RelationCatalogItem" | None:
+    """
+    Returns the table that a column belongs to, or None (after notifying the
+    user) if the column belongs to a view, which has no statistics and can't
+    be sampled.
+    """
+    relation = item.parent
+    if relation is None or relation.parent is None:
+        return None
+    # can't use isinstance due to circular reference
+    if type(relation).__name__ == "ViewCatalogItem":
+        driver.notify(
+            f"{relation.label} is a view, so it has no column statistics.",
+            severity="error",
+        )
+        return None
+    return relation
+
+
+def show_column_stats(
+    item: "ColumnCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    relation = _column_table(item, driver)
+    if relation is None or relation.parent is None:
+        return
+    driver.insert_text_in_new_buffer(
+        column_stats_sql(relation.parent.label, relation.label, item.label)
+    )
+
+
+def show_column_profile(
+    item: "ColumnCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    relation = _column_table(item, driver)
+    if relation is None:
+        return
+    driver.insert_text_in_new_buffer(
+        column_profile_sql(relation.qualified_identifier, item.query_name)
+    )
+
+
+def _stat_statements_source(
+    connection: "HarlequinPostgresConnection", driver: "HarlequinDriver"
+) -> "StatStatementsSource" | None:
+    source = connection._get_stat_statements_source()
+    if source is None:
+        driver.notify(
+            "pg_stat_statements is not installed in this database. Add it to "
+            "shared_preload_libraries, restart Postgres, and run "
+            "create extension pg_stat_statements.",
+            severity="error",
+        )
+    return source
+
+
+def show_top_queries(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    source = _stat_statements_source(item.connection, driver)
+    if source is None:
+        return
+    driver.insert_text_in_new_buffer(source.top_queries_sql(item.label))
+
+
+def snapshot_query_stats(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    source = _stat_statements_source(item.connection, driver)
+    if source is None:
+        return
+    try:
+        snapshot = item.connection._snapshot_statements(source, item.label)
+    except HarlequinQueryError as e:
+        driver.notify(e.msg, severity="error")
+        return
+    item.connection.statements_snapshot = snapshot
+    driver.notify(
+        f"Took a snapshot of {len(snapshot.stats):,} statements in {item.label}. "
+        "Use Top Queries Since Snapshot to see the load since now."
+    )
+
+
+def show_top_queries_since_snapshot(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    snapshot = item.connection.statements_snapshot
+    if snapshot is None or snapshot.dbname != item.label:
+        snapshot_query_stats(item, driver)
+        return
+    source = _stat_statements_source(item.connection, driver)
+    if source is None:
+        return
+    try:
+        current = item.connection._snapshot_statements(source, item.label)
+    except HarlequinQueryError as e:
+        driver.notify(e.msg, severity="error")
+        return
+    driver.insert_text_in_new_buffer(source.top_queries_delta_sql(snapshot, current))
+
+
+def show_sessions_and_locks(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    driver.insert_text_in_new_buffer("\\sessions")
+    started = item.connection.start_session_monitor(driver)
+    driver.notify(
+        "Run \\sessions to see the blocking tree, and run it again to refresh it."
+        + (
+            " The lock monitor will notify you when a session is blocked."
+            if started
+            else ""
+        )
+    )
+
+
+def show_current_transaction(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    driver.insert_text_in_new_buffer("\\txn")
+    guard = item.connection.idle_transaction_guard
+    if guard is None:
+        driver.notify(
+            "Run \\txn to see how long the editor's transaction has been open, "
+            "and the locks it holds."
+        )
+        return
+    guard.notify = driver.notify
+    driver.notify(
+        "Run \\txn to see how long the editor's transaction has been open, and "
+        "the locks it holds. Harlequin will warn you before it rolls back a "
+        f"transaction that has been idle for {guard.timeout:g} seconds."
+    )
+
+
+def stop_lock_monitor(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    if item.connection.stop_session_monitor():
+        driver.notify("Stopped the lock monitor.")
+    else:
+        driver.notify("The lock monitor is not running.", severity="warning")
+
+
+def _signal_top_blocker(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+    terminate: bool,
+) -> None:
+    if item.connection is None:
+        return
+    connection = item.connection
+    try:
+        tree = blocking_tree(connection.get_sessions())
+    except HarlequinQueryError as e:
+        driver.notify(e.msg, severity="error")
+        return
+    # the tree puts the session that blocks the most others first
+    blocker = tree[0][0] if tree and tree[0][0].blocks else None
+    if blocker is None:
+        driver.notify("No sessions are blocked.")
+        return
+    verb, done = (
+        ("Terminate", "Terminated")
+        if terminate
+        else ("Cancel the query of", "Canceled the query of")
+    )
+
+    def _signal() -> None:
+        if connection.signal_backend(blocker.pid, terminate=terminate):
+            driver.notify(f"{done} PID {blocker.pid}.")
+        else:
+            driver.notify(
+                f"Could not signal PID {blocker.pid}; it may have finished.",
+                severity="warning",
+            )
+
+    driver.confirm_and_execute(
+        callback=_signal,
+        instructions=(
+            f"{verb} PID {blocker.pid} ({blocker.user}, {blocker.state}), which "
+            f"is blocking {blocker.blocked_count()} session(s)? Its query: "
+            f"{(blocker.query or '')[:200]}"
+        ),
+    )
+
+
+def cancel_top_blocker(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    _signal_top_blocker(item, driver, terminate=False)
+
+
+def terminate_top_blocker(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    _signal_top_blocker(item, driver, terminate=True)
+
+
+def _relation_scope(
+    item: "RelationCatalogItem" | "SchemaCatalogItem",
+    driver: "HarlequinDriver",
+) -> str | None:
+    """
+    Returns a query for the OIDs of the tables in a schema, or of a table and
+    its partitions.
+    """
+    if item.oid is None:
+        driver.notify(
+            f"Could not inspect {item.label} due to missing object identifier.",
+            severity="error",
+        )
+        return None
+    # can't use isinstance due to circular reference
+    if type(item).__name__ == "SchemaCatalogItem":
+        return (
+            "select c.oid from pg_catalog.pg_class c "
+            f"where c.relnamespace = {item.oid} and c.relkind in ('r', 'm')"
+        )
+    # pg_partition_tree adds the partitions of a partitioned table, and
+    # returns nothing for other tables
+    return (
+        f"select {item.oid}::oid as oid union "
+        f"select relid from pg_catalog.pg_partition_tree({item.oid})"
+    )
+
+
+def show_index_advisor(
+    item: "RelationCatalogItem" | "SchemaCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    scope = _relation_scope(item, driver)
+    if scope is None:
+        return
+    driver.insert_text_in_new_buffer(
+        index_advisor_sql(item.qualified_identifier, scope)
+    )
+
+
+def show_bloat_estimate(
+    item: "RelationCatalogItem" | "SchemaCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    scope = _relation_scope(item, driver)
+    if scope is None:
+        return
+    driver.insert_text_in_new_buffer(
+        bloat_estimate_sql(item.qualified_identifier, scope)
+    )
+
+
+def show_exact_bloat(
+    item: "RelationCatalogItem" | "SchemaCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    scope = _relation_scope(item, driver)
+    if scope is None:
+        return
+    schema = item.connection._get_extension_schema("pgstattuple")
+    if schema is None:
+        driver.notify(
+            "pgstattuple is not installed in this database. Run create extension "
+            "pgstattuple, or use Bloat Estimate instead.",
+            severity="error",
+        )
+        return
+    driver.insert_text_in_new_buffer(
+        bloat_exact_sql(item.qualified_identifier, scope, schema)
+    )
+
+
+def toggle_progress_notifications(
+    item: "DatabaseCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None:
+        return
+    if item.connection.progress_notifier is None:
+        item.connection.progress_notifier = driver.notify
+        driver.notify(
+            "Enabled progress notifications for CREATE INDEX, REINDEX, VACUUM, "
+            "ANALYZE, CLUSTER, and COPY."
+        )
+    else:
+        item.connection.progress_notifier = None
+        driver.notify("Disabled progress notifications.")
+
+
+def _when(timestamp: datetime | None) -> str:
+    return f"{timestamp:%Y-%m-%d %H:%M}" if timestamp is not None else "never"
+
+
+def _confirm_maintenance(
+    item: "RelationCatalogItem",
+    driver: "HarlequinDriver",
+    statement: str,
+    prompt: str,
+    done: str,
+) -> None:
+    connection = item.connection
+    if connection is None or item.oid is None:
+        return
+    info = connection._get_maintenance_info(item.oid)
+    if info is not None:
+        vacuum, autovacuum, analyze, autoanalyze, live, dead = info[:6]
+        prompt += (
+            f"\n\nLast vacuum: {_when(vacuum)} (auto: {_when(autovacuum)})"
+            f"\nLast analyze: {_when(analyze)} (auto: {_when(autoanalyze)})"
+            f"\nLive rows: {live or 0:,}, dead rows: {dead or 0:,}"
+        )
+
+    def _run() -> None:
+        # Harlequin shows an error raised here in a modal
+        connection._run_maintenance(statement, notify=driver.notify)
+        driver.notify(done)
+
+    driver.confirm_and_execute(callback=_run, instructions=prompt)
+
+
+def execute_vacuum_analyze(
+    item: "RelationCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    _confirm_maintenance(
+        item,
+        driver,
+        statement=f"vacuum (analyze) {item.qualified_identifier}",
+        prompt=f"Vacuum and analyze {item.label}?",
+        done=f"Vacuumed and analyzed {item.label}",
+    )
+
+
+def execute_reindex_concurrently(
+    item: "RelationCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    _confirm_maintenance(
+        item,
+        driver,
+        statement=f"reindex table concurrently {item.qualified_identifier}",
+        prompt=(
+            f"Rebuild every index on {item.label}, without blocking writes? "
+            "It waits for open transactions, including a Manual mode "
+            "transaction in the editor, to finish."
+        ),
+        done=f"Reindexed {item.label}",
+    )
+
+
+def execute_refresh_materialized_view(
+    item: "RelationCatalogItem",
+    driver: "HarlequinDriver",
+) -> None:
+    if item.connection is None or item.oid is None:
+        return
+    info = item.connection._get_maintenance_info(item.oid)
+    # CONCURRENTLY needs a unique index, and a view that was populated before
+    if info is not None and info[6] and info[7]:
+        statement = (
+            f"refresh materialized view concurrently {item.qualified_identifier}"
+        )
+        prompt = f"Refresh {item.label}, without blocking reads?"
+    else:
+        statement = f"refresh materialized view {item.qualified_identifier}"
+        prompt = (
+            f"Refresh {item.label}? It has no unique index (or is not populated), "
+            "so it can't be refreshed concurrently, and reads will wait for the "
+            "refresh."
+        )
+    _confirm_maintenance(
+        item, driver, statement=statement, prompt=prompt, done=f"Refreshed {item.label}"
+    )
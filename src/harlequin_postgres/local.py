@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, Any, Iterable
+
+import pyarrow as pa  # type: ignore[import-untyped]
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from psycopg import Connection, Cursor
+
+# rows are sent to DuckDB in batches of this many rows, so a large result is
+# never held in memory all at once
+MATERIALIZE_BATCH_ROWS = 10_000
+
+LOCAL_TABLE_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# arrow types for the Postgres types (by typname) that are copied as they are.
+# DuckDB maps each to its own type. numeric without a precision is copied as
+# float8, and every other type is copied as text
+ARROW_TYPES: dict[str, Any] = {
+    "bool": pa.bool_(),
+    "int2": pa.int16(),
+    "int4": pa.int32(),
+    "int8": pa.int64(),
+    "oid": pa.int64(),
+    "float4": pa.float32(),
+    "float8": pa.float64(),
+    "text": pa.string(),
+    "varchar": pa.string(),
+    "bpchar": pa.string(),
+    "name": pa.string(),
+    "bytea": pa.binary(),
+    "date": pa.date32(),
+    "time": pa.time64("us"),
+    "timestamp": pa.timestamp("us"),
+    "timestamptz": pa.timestamp("us", tz="UTC"),
+    "interval": pa.duration("us"),
+}
+
+# short labels for DuckDB's types, like the labels of Postgres types
+DUCKDB_TYPE_LABELS = {
+    "BOOLEAN": "t/f",
+    "TINYINT": "#",
+    "SMALLINT": "#",
+    "INTEGER": "#",
+    "BIGINT": "##",
+    "HUGEINT": "##",
+    "UTINYINT": "#",
+    "USMALLINT": "#",
+    "UINTEGER": "#",
+    "UBIGINT": "##",
+    "FLOAT": "#.#",
+    "DOUBLE": "#.#",
+    "DECIMAL": "#.#",
+    "VARCHAR": "s",
+    "BLOB": "b",
+    "DATE": "d",
+    "TIME": "t",
+    "TIMESTAMP": "ts",
+    "TIMESTAMP WITH TIME ZONE": "ts",
+    "INTERVAL": "|-|",
+    "UUID": "uid",
+    "JSON": "{}",
+}
+
+LOCAL_TABLES_QUERY = """
+    select table_name, estimated_size, column_count
+    from duckdb_tables()
+    where database_name = current_database() and schema_name = 'main'
+    order by table_name
+    """
+
+
+def duckdb_type_label(type_name: str) -> str:
+    return DUCKDB_TYPE_LABELS.get(type_name.split("(")[0], "?")
+
+
+def _unique_names(names: Iterable[str]) -> list[str]:
+    unique: list[str] = []
+    for name in names:
+        candidate, n = name, 1
+        while candidate in unique:
+            n += 1
+            candidate = f"{name}_{n}"
+        unique.append(candidate)
+    return unique
+
+
+class LocalDatabase:
+    """
+    An in-process DuckDB database, which holds query results copied from
+    Postgres, so they can be filtered, sorted, and aggregated again without
+    querying the server.
+    """
+
+    def __init__(self) -> None:
+        if duckdb is None:
+            raise ImportError(
+                "Materializing results requires duckdb. Install it with "
+                "pip install duckdb."
+            )
+        self.conn = duckdb.connect()
+
+    def materialize(self, pg_conn: "Connection", name: str, query: str) -> int:
+        """
+        Streams the result of query from Postgres with a binary COPY into a
+        new (or replaced) DuckDB table called name. Returns the number of rows
+        copied.
+        """
+        with pg_conn.cursor() as cur:
+            cur.execute(f"select * from ({query}) as q limit 0")
+            assert cur.description is not None
+            description = cur.description
+            aliases = [f"c{i}" for i in range(len(description))]
+            exprs: list[str] = []
+            copy_types: list[str | int] = []
+            fields: list[Any] = []
+            for alias, column in zip(aliases, description, strict=True):
+                info = pg_conn.adapters.types.get(column.type_code)
+                # array types are found by their array oid, and copied as text
+                is_array = info is None or info.oid != column.type_code
+                typname = "" if info is None or is_array else info.name
+                if typname == "numeric" and column.precision is not None:
+                    if column.precision <= 38:
+                        exprs.append(alias)
+                        copy_types.append(column.type_code)
+                        arrow_type = pa.decimal128(column.precision, column.scale or 0)
+                    else:
+                        exprs.append(f"{alias}::float8")
+                        copy_types.append("float8")
+                        arrow_type = pa.float64()
+                elif typname == "numeric":
+                    exprs.append(f"{alias}::float8")
+                    copy_types.append("float8")
+                    arrow_type = pa.float64()
+                elif typname in ARROW_TYPES:
+                    exprs.append(alias)
+                    copy_types.append(column.type_code)
+                    arrow_type = ARROW_TYPES[typname]
+                else:
+                    exprs.append(f"{alias}::text")
+                    copy_types.append("text")
+                    arrow_type = pa.string()
+                fields.append(arrow_type)
+            schema = pa.schema(
+                list(
+                    zip(
+                        _unique_names(col.name for col in description),
+                        fields,
+                        strict=True,
+                    )
+                )
+            )
+            table = '"' + name + '"'
+            # the old table is kept if the copy fails
+            self.conn.begin()
+            try:
+                self.conn.execute(f"drop table if exists {table}")
+                count = self._copy(
+                    cur, table, schema, query, exprs, aliases, copy_types
+                )
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+        return count
+
+    def _copy(
+        self,
+        cur: "Cursor",
+        table: str,
+        schema: Any,
+        query: str,
+        exprs: list[str],
+        aliases: list[str],
+        copy_types: list[str | int],
+    ) -> int:
+        created = False
+        count = 0
+        with cur.copy(
+            f"copy (select {', '.join(exprs)} "
+            f"from ({query}) as q({', '.join(aliases)})) "
+            "to stdout (format binary)"
+        ) as copy:
+            copy.set_types(copy_types)
+            batch: list[tuple[Any, ...]] = []
+            for row in copy.rows():
+                batch.append(row)
+                if len(batch) >= MATERIALIZE_BATCH_ROWS:
+                    self._append(table, schema, batch, created)
+                    created, count = True, count + len(batch)
+                    batch = []
+            self._append(table, schema, batch, created)
+            count += len(batch)
+        return count
+
+    def _append(
+        self,
+        table: str,
+        schema: Any,
+        rows: list[tuple[Any, ...]],
+        created: bool,
+    ) -> None:
+        arrays = [
+            pa.array([row[i] for row in rows], type=field.type)
+            for i, field in enumerate(schema)
+        ]
+        self.conn.register(
+            "harlequin_batch", pa.Table.from_arrays(arrays, schema=schema)
+        )
+        try:
+            if created:
+                self.conn.execute(f"insert into {table} select * from harlequin_batch")
+            else:
+                self.conn.execute(f"create table {table} as from harlequin_batch")
+        finally:
+            self.conn.unregister("harlequin_batch")
+
+    def query(self, sql: str) -> tuple[list[tuple[str, str]], list[tuple[Any, ...]]]:
+        """
+        Runs sql in DuckDB, and returns its columns (with type labels) and
+        rows. Statements that return no rows return no columns.
+        """
+        relation = self.conn.sql(sql)
+        if relation is None:
+            return [], []
+        columns = [
+            (name, duckdb_type_label(str(type_)))
+            for name, type_ in zip(relation.columns, relation.types, strict=True)
+        ]
+        return columns, relation.fetchall()
+
+    def tables(self) -> list[tuple[Any, ...]]:
+        return self.conn.execute(LOCAL_TABLES_QUERY).fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
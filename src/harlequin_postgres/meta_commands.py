@@ -0,0 +1,616 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Sequence
+
+from harlequin import HarlequinCursor
+from harlequin.exception import HarlequinQueryError
+from psycopg import Connection
+from textual_fastdatatable.backend import AutoBackendType
+
+from harlequin_postgres.idle_transactions import (
+    TRANSACTION_COLUMNS,
+    TRANSACTION_LOCKS_QUERY,
+)
+from harlequin_postgres.local import LOCAL_TABLE_NAME
+from harlequin_postgres.schema_filter import SchemaFilter, _pattern_to_regex
+from harlequin_postgres.sessions import SESSION_COLUMNS, session_rows
+
+if TYPE_CHECKING:
+    from harlequin_postgres.adapter import HarlequinPostgresConnection
+
+META_COMMAND = re.compile(
+    r"^\s*\\(?P<name>[a-z]+)(?P<verbose>\+)?(?:\s+(?P<pattern>.*?))?\s*;?\s*$",
+    re.DOTALL,
+)
+
+# the catalog store answers meta-commands if it was loaded this recently
+MAX_STORE_AGE = 60.0
+
+RELKIND_NAMES = {
+    "r": "table",
+    "p": "partitioned table",
+    "v": "view",
+    "m": "materialized view",
+    "f": "foreign table",
+}
+
+# the relkinds listed by each meta-command
+LIST_RELKINDS = {
+    "d": ("r", "p", "v", "m", "f"),
+    "dt": ("r", "p"),
+    "dv": ("v",),
+    "dm": ("m",),
+}
+
+SCHEMA_PREDICATES = f"""
+    n.nspname != 'information_schema'
+    and n.nspname not like 'pg\\_%%' escape '\\'
+    and n.nspname ~ %(schema_pattern)s
+    and {SchemaFilter.clause("n.nspname")}
+"""
+
+
+@dataclass
+class MetaCommand:
+    """
+    A psql-style backslash command, like \\dt+ public.*
+    """
+
+    name: str
+    verbose: bool = False
+    pattern: str | None = None
+
+    @classmethod
+    def parse(cls, query: str) -> "MetaCommand" | None:
+        match = META_COMMAND.match(query)
+        if match is None:
+            return None
+        return cls(
+            name=match.group("name"),
+            verbose=match.group("verbose") is not None,
+            pattern=match.group("pattern") or None,
+        )
+
+    @property
+    def patterns(self) -> tuple[str, str]:
+        """
+        Regexes for the schema and the object name in the pattern. Like psql,
+        unquoted patterns are folded to lower case, and a pattern without
+        a dot matches objects in any schema.
+        """
+        if self.pattern is None:
+            return ".*", ".*"
+        parts = re.findall(r'"[^"]*"|[^."]+|\.', self.pattern.strip())
+        schema_parts: list[str] = []
+        name_parts: list[str] = []
+        for part in parts:
+            if part == ".":
+                schema_parts, name_parts = schema_parts + name_parts, []
+            else:
+                name_parts.append(part[1:-1] if part.startswith('"') else part.lower())
+        schema = "".join(schema_parts)
+        name = "".join(name_parts)
+        return (
+            _pattern_to_regex(schema) if schema else ".*",
+            _pattern_to_regex(name) if name else ".*",
+        )
+
+
+class StaticCursor(HarlequinCursor):
+    """
+    A cursor over a result set that is already in memory.
+    """
+
+    def __init__(
+        self, columns: list[tuple[str, str]], rows: Sequence[tuple[Any, ...]]
+    ) -> None:
+        self._columns = columns
+        self._rows = rows
+        self._limit: int | None = None
+
+    def columns(self) -> list[tuple[str, str]]:
+        return self._columns
+
+    def set_limit(self, limit: int) -> StaticCursor:
+        self._limit = limit
+        return self
+
+    def fetchall(self) -> AutoBackendType:
+        rows = list(self._rows)
+        return rows if self._limit is None else rows[: self._limit]
+
+
+def run_meta_command(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    handler = HANDLERS.get(command.name)
+    if command.name == "d" and command.pattern is not None:
+        handler = _describe_relation
+    if handler is None:
+        raise HarlequinQueryError(
+            msg=(
+                f"\\{command.name} is not supported. Harlequin supports these "
+                "meta-commands: \\d, \\d+ <relation>, \\dt, \\dv, \\dm, \\di, "
+                "\\dn, and \\df (with an optional + and pattern), "
+                "\\explain [analyze] <query>, \\sessions, \\txn, "
+                "\\profile [name], \\cache [clear], \\materialize <name> <query>, "
+                "\\local [query], \\cancel <pid>, and \\terminate <pid>."
+            ),
+            title="Harlequin could not run your meta-command.",
+        )
+    return handler(connection, command)
+
+
+def _query(
+    connection: "HarlequinPostgresConnection",
+    query: str,
+    params: dict[str, Any],
+) -> list[tuple[Any, ...]]:
+    pool = connection._catalog_pool()
+    conn: Connection = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            rows: list[tuple[Any, ...]] = cur.fetchall()
+    except Exception as e:
+        raise HarlequinQueryError(
+            msg=str(e), title="Harlequin could not run your meta-command."
+        ) from e
+    finally:
+        pool.putconn(conn)
+    return rows
+
+
+def _query_main(
+    connection: "HarlequinPostgresConnection",
+    query: str,
+    params: dict[str, Any],
+) -> list[tuple[Any, ...]]:
+    """
+    Runs query on the editor's connection, in a savepoint if a transaction is
+    open, so that an error does not abort the transaction.
+    """
+    try:
+        with connection._main_conn.transaction():
+            with connection._main_conn.cursor() as cur:
+                cur.execute(query, params)
+                rows: list[tuple[Any, ...]] = cur.fetchall()
+    except Exception as e:
+        raise HarlequinQueryError(
+            msg=str(e), title="Harlequin could not run your meta-command."
+        ) from e
+    return rows
+
+
+def _params(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> dict[str, Any]:
+    schema_pattern, name_pattern = command.patterns
+    return {
+        "schema_pattern": schema_pattern,
+        "name_pattern": name_pattern,
+        **connection.schema_filter.params,
+    }
+
+
+def _list_relations(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    relkinds = LIST_RELKINDS[command.name]
+    columns = [("Schema", "s"), ("Name", "s"), ("Type", "s")]
+    schema_pattern, name_pattern = command.patterns
+    schemas = connection.catalog_store.fresh_schemas(schema_pattern, MAX_STORE_AGE)
+    if not command.verbose and schemas is not None:
+        rows = sorted(
+            (schema.name, relation.name, RELKIND_NAMES[relation.relkind])
+            for schema in schemas
+            for relation in schema.relations()
+            if relation.relkind in relkinds and re.search(name_pattern, relation.name)
+        )
+        return StaticCursor(columns, rows)
+
+    verbose_columns = (
+        """,
+        pg_catalog.pg_size_pretty(pg_catalog.pg_total_relation_size(c.oid)),
+        pg_catalog.obj_description(c.oid, 'pg_class')"""
+        if command.verbose
+        else ""
+    )
+    rows = _query(
+        connection,
+        f"""
+        select
+            n.nspname,
+            c.relname,
+            case c.relkind
+                when 'r' then 'table'
+                when 'p' then 'partitioned table'
+                when 'v' then 'view'
+                when 'm' then 'materialized view'
+                when 'f' then 'foreign table'
+            end{verbose_columns}
+        from pg_catalog.pg_class c
+        join pg_catalog.pg_namespace n on n.oid = c.relnamespace
+        where
+            c.relkind = any(%(relkinds)s::"char"[])
+            and not c.relispartition
+            and c.relname ~ %(name_pattern)s
+            and {SCHEMA_PREDICATES}
+            and (
+                pg_catalog.pg_has_role(c.relowner, 'usage')
+                or pg_catalog.has_table_privilege(
+                    c.oid,
+                    'select, insert, update, delete, truncate, references, trigger'
+                )
+                or pg_catalog.has_any_column_privilege(
+                    c.oid, 'select, insert, update, references'
+                )
+            )
+        order by n.nspname, c.relname
+        ;""",
+        {"relkinds": list(relkinds), **_params(connection, command)},
+    )
+    if command.verbose:
+        columns += [("Size", "s"), ("Description", "s")]
+    return StaticCursor(columns, rows)
+
+
+def _describe_relation(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    assert command.pattern is not None
+    relation_oid = _find_relation(connection, command)
+    params: dict[str, Any]
+    if relation_oid is not None:
+        relation, params = "%(oid)s", {"oid": relation_oid}
+    else:
+        # cast on the editor's connection, so that the name is resolved with
+        # its search path, and can name one of its temporary tables
+        relation, params = "%(name)s::regclass", {"name": command.pattern}
+    columns = [
+        ("Column", "s"),
+        ("Type", "s"),
+        ("Collation", "s"),
+        ("Nullable", "s"),
+        ("Default", "s"),
+    ]
+    verbose_columns = ""
+    if command.verbose:
+        columns += [("Storage", "s"), ("Description", "s")]
+        verbose_columns = """,
+            case a.attstorage
+                when 'p' then 'plain'
+                when 'e' then 'external'
+                when 'm' then 'main'
+                when 'x' then 'extended'
+            end,
+            pg_catalog.col_description(a.attrelid, a.attnum)"""
+    rows = (_query if relation_oid is not None else _query_main)(
+        connection,
+        f"""
+        select
+            a.attname,
+            pg_catalog.format_type(a.atttypid, a.atttypmod),
+            co.collname,
+            case when a.attnotnull then 'not null' end,
+            pg_catalog.pg_get_expr(d.adbin, d.adrelid){verbose_columns}
+        from pg_catalog.pg_attribute a
+        left join pg_catalog.pg_attrdef d
+            on d.adrelid = a.attrelid and d.adnum = a.attnum
+        left join pg_catalog.pg_collation co
+            on co.oid = a.attcollation
+            and co.collname != 'default'
+        where
+            a.attrelid = {relation}
+            and a.attnum > 0
+            and not a.attisdropped
+        order by a.attnum
+        ;""",
+        params,
+    )
+    return StaticCursor(columns, rows)
+
+
+def _find_relation(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> int | None:
+    """
+    Resolves the pattern of a \\d command to the OID of a single relation from
+    the catalog store, if the pattern is schema-qualified and the store's
+    slices of the schemas it matches are fresh. Returns None if the store
+    can't answer.
+    """
+    if "." not in (command.pattern or ""):
+        return None
+    schema_pattern, name_pattern = command.patterns
+    schemas = connection.catalog_store.fresh_schemas(schema_pattern, MAX_STORE_AGE)
+    if schemas is None:
+        return None
+    oids = [
+        relation.oid
+        for schema in schemas
+        for relation in schema.relations()
+        if re.search(name_pattern, relation.name)
+    ]
+    if len(oids) > 1:
+        raise HarlequinQueryError(
+            msg=f"{command.pattern} matches more than one relation.",
+            title="Harlequin could not run your meta-command.",
+        )
+    return oids[0] if oids else None
+
+
+def _list_indexes(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    columns = [("Schema", "s"), ("Name", "s"), ("Table", "s"), ("Type", "s")]
+    verbose_columns = ""
+    if command.verbose:
+        columns += [("Size", "s"), ("Description", "s")]
+        verbose_columns = """,
+            pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)),
+            pg_catalog.obj_description(c.oid, 'pg_class')"""
+    rows = _query(
+        connection,
+        f"""
+        select
+            n.nspname,
+            c.relname,
+            t.relname,
+            am.amname{verbose_columns}
+        from pg_catalog.pg_index i
+        join pg_catalog.pg_class c on c.oid = i.indexrelid
+        join pg_catalog.pg_class t on t.oid = i.indrelid
+        join pg_catalog.pg_namespace n on n.oid = c.relnamespace
+        join pg_catalog.pg_am am on am.oid = c.relam
+        where
+            c.relname ~ %(name_pattern)s
+            and {SCHEMA_PREDICATES}
+        order by n.nspname, c.relname
+        ;""",
+        _params(connection, command),
+    )
+    return StaticCursor(columns, rows)
+
+
+def _list_schemas(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    columns = [("Name", "s"), ("Owner", "s")]
+    verbose_columns = ""
+    if command.verbose:
+        columns += [("Access privileges", "s"), ("Description", "s")]
+        verbose_columns = """,
+            pg_catalog.array_to_string(n.nspacl, e'\\n'),
+            pg_catalog.obj_description(n.oid, 'pg_namespace')"""
+    params = _params(connection, command)
+    if command.pattern is not None and "." not in command.pattern:
+        # \dn takes a schema name pattern, without a dot
+        params["schema_pattern"] = _pattern_to_regex(command.pattern.lower())
+    rows = _query(
+        connection,
+        f"""
+        select
+            n.nspname,
+            pg_catalog.pg_get_userbyid(n.nspowner){verbose_columns}
+        from pg_catalog.pg_namespace n
+        where {SCHEMA_PREDICATES}
+        order by n.nspname
+        ;""",
+        params,
+    )
+    return StaticCursor(columns, rows)
+
+
+def _list_functions(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    columns = [
+        ("Schema", "s"),
+        ("Name", "s"),
+        ("Result data type", "s"),
+        ("Argument data types", "s"),
+        ("Type", "s"),
+    ]
+    verbose_columns = ""
+    if command.verbose:
+        columns += [("Volatility", "s"), ("Language", "s"), ("Description", "s")]
+        verbose_columns = """,
+            case p.provolatile
+                when 'i' then 'immutable'
+                when 's' then 'stable'
+                when 'v' then 'volatile'
+            end,
+            l.lanname,
+            pg_catalog.obj_description(p.oid, 'pg_proc')"""
+    rows = _query(
+        connection,
+        f"""
+        select
+            n.nspname,
+            p.proname,
+            pg_catalog.pg_get_function_result(p.oid),
+            pg_catalog.pg_get_function_arguments(p.oid),
+            case p.prokind
+                when 'a' then 'agg'
+                when 'w' then 'window'
+                when 'p' then 'proc'
+                else 'func'
+            end{verbose_columns}
+        from pg_catalog.pg_proc p
+        join pg_catalog.pg_namespace n on n.oid = p.pronamespace
+        join pg_catalog.pg_language l on l.oid = p.prolang
+        where
+            p.proname ~ %(name_pattern)s
+            and {SCHEMA_PREDICATES}
+        order by n.nspname, p.proname, 4
+        ;""",
+        _params(connection, command),
+    )
+    return StaticCursor(columns, rows)
+
+
+def _explain(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    query = command.pattern or ""
+    first_word, _, rest = query.partition(" ")
+    analyze = first_word.lower() == "analyze"
+    if analyze:
+        query = rest.strip()
+    if not query:
+        raise HarlequinQueryError(
+            msg="Usage: \\explain [analyze] <query>",
+            title="Harlequin could not run your meta-command.",
+        )
+    return connection.explain(query, analyze=analyze)
+
+
+def _sessions(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    return StaticCursor(SESSION_COLUMNS, session_rows(connection.get_sessions()))
+
+
+def _signal_backend(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    pattern = (command.pattern or "").strip()
+    if not pattern.isdigit():
+        raise HarlequinQueryError(
+            msg=f"Usage: \\{command.name} <pid>",
+            title="Harlequin could not run your meta-command.",
+        )
+    pid = int(pattern)
+    terminated = command.name == "terminate"
+    if not connection.signal_backend(pid, terminate=terminated):
+        raise HarlequinQueryError(
+            msg=f"There is no session with PID {pid}, or you may not signal it.",
+            title="Harlequin could not run your meta-command.",
+        )
+    action = "Terminated session" if terminated else "Canceled the query of"
+    return StaticCursor([("Result", "s")], [(f"{action} PID {pid}.",)])
+
+
+def _transaction(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    rows = connection._run_on_monitor_conn(
+        TRANSACTION_LOCKS_QUERY, (connection._main_conn.info.backend_pid,)
+    )
+    if not rows:
+        return StaticCursor([("Result", "s")], [("No transaction is open.",)])
+    return StaticCursor(TRANSACTION_COLUMNS, rows)
+
+
+def _profile(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    if command.pattern is not None:
+        connection.set_profile(command.pattern.strip())
+    rows = [
+        (
+            name,
+            "yes" if name == connection.profile else "",
+            ", ".join(f"{key}={value}" for key, value in settings.items())
+            or "(server defaults)",
+        )
+        for name, settings in connection.profiles.items()
+    ]
+    return StaticCursor([("Profile", "s"), ("Active", "s"), ("Settings", "s")], rows)
+
+
+def _cache(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    cache = connection.result_cache
+    if cache is None:
+        return StaticCursor(
+            [("Result", "s")],
+            [("The result cache is off. Set result_cache_size to turn it on.",)],
+        )
+    if command.pattern is not None:
+        if command.pattern.strip().lower() != "clear":
+            raise HarlequinQueryError(
+                msg="Usage: \\cache [clear]",
+                title="Harlequin could not run your meta-command.",
+            )
+        cache.clear()
+    lookups = cache.hits + cache.misses
+    rows = [
+        ("Hits", str(cache.hits)),
+        ("Misses", str(cache.misses)),
+        ("Hit rate", f"{100 * cache.hits / lookups:.1f}%" if lookups else ""),
+        ("Results", str(len(cache))),
+        ("Size", f"{cache.size / 1024 / 1024:.1f} MB"),
+        ("Max size", f"{cache.max_bytes / 1024 / 1024:.1f} MB"),
+        ("Expires after", f"{cache.ttl:g}s"),
+    ]
+    return StaticCursor([("Statistic", "s"), ("Value", "s")], rows)
+
+
+def _materialize(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    name, query = (re.split(r"\s+", command.pattern or "", maxsplit=1) + [""])[:2]
+    if LOCAL_TABLE_NAME.fullmatch(name) is None or not query.strip():
+        raise HarlequinQueryError(
+            msg=(
+                "Usage: \\materialize <name> <query>, where name is a table name "
+                "made of letters, digits, and underscores."
+            ),
+            title="Harlequin could not run your meta-command.",
+        )
+    count = connection.materialize(name, query.strip())
+    return StaticCursor(
+        [("Result", "s")],
+        [
+            (
+                f"Copied {count} rows into the local table {name}. Query it with "
+                f"\\local select * from {name}.",
+            )
+        ],
+    )
+
+
+def _local(
+    connection: "HarlequinPostgresConnection", command: MetaCommand
+) -> StaticCursor:
+    try:
+        local = connection.local_database
+        if command.pattern is None:
+            return StaticCursor(
+                [("Table", "s"), ("Rows", "##"), ("Columns", "#")], local.tables()
+            )
+        columns, rows = local.query(command.pattern)
+    except Exception as e:
+        raise HarlequinQueryError(
+            msg=str(e), title="Harlequin could not run your local query."
+        ) from e
+    if not columns:
+        return StaticCursor([("Result", "s")], [("Done.",)])
+    return StaticCursor(columns, rows)
+
+
+HANDLERS: dict[
+    str, Callable[["HarlequinPostgresConnection", MetaCommand], StaticCursor]
+] = {
+    "d": _list_relations,
+    "dt": _list_relations,
+    "dv": _list_relations,
+    "dm": _list_relations,
+    "di": _list_indexes,
+    "dn": _list_schemas,
+    "df": _list_functions,
+    "explain": _explain,
+    "sessions": _sessions,
+    "txn": _transaction,
+    "profile": _profile,
+    "cache": _cache,
+    "materialize": _materialize,
+    "local": _local,
+    "cancel": _signal_backend,
+    "terminate": _signal_backend,
+}
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from typing import Any, Mapping
+
+from psycopg import Connection
+
+# catalog, completion, and monitoring queries run on pool connections with
+# these settings, so a lock on a catalog table makes them fail quickly,
+# instead of hanging the Data Catalog
+CATALOG_SETTINGS = {"statement_timeout": "10s", "lock_timeout": "2s"}
+
+# an empty profile uses the server's (and the role's) defaults
+BUILTIN_PROFILES: dict[str, dict[str, str]] = {
+    "default": {},
+    "browse": {
+        "statement_timeout": "30s",
+        "lock_timeout": "2s",
+        "jit": "off",
+    },
+    "analytics": {
+        "work_mem": "256MB",
+        "hash_mem_multiplier": "4",
+        "max_parallel_workers_per_gather": "4",
+        "jit": "on",
+        "statement_timeout": "0",
+        "lock_timeout": "0",
+    },
+}
+
+DEFAULT_PROFILE = "default"
+
+# sets each setting to its value, or, if its value is null, to the value that
+# RESET would restore, in one round trip. Values set this way are session
+# settings, so they are also applied to statements routed to a replica
+APPLY_PROFILE_QUERY = """
+    select pg_catalog.set_config(p.name, coalesce(p.value, s.reset_val), false)
+    from unnest(%s::text[], %s::text[]) as p(name, value)
+    left join pg_catalog.pg_settings s on s.name = p.name
+    ;"""
+
+
+def parse_profiles(
+    value: str | Mapping[str, Mapping[str, Any]] | None,
+) -> dict[str, dict[str, str]]:
+    """
+    Parses user-defined profiles, written like
+    "etl: work_mem=1GB, statement_timeout=0; quick: statement_timeout=5s",
+    or given as a table of tables in Harlequin's config file.
+    """
+    if value is None:
+        return {}
+    if not isinstance(value, str):
+        return {
+            name.strip(): {k.strip(): str(v) for k, v in settings.items()}
+            for name, settings in value.items()
+        }
+    profiles: dict[str, dict[str, str]] = {}
+    for entry in value.split(";"):
+        if not entry.strip():
+            continue
+        name, sep, body = entry.partition(":")
+        if not sep or not name.strip():
+            raise ValueError(f"Expected name: setting=value, ..., got {entry!r}")
+        settings: dict[str, str] = {}
+        for pair in body.split(","):
+            if not pair.strip():
+                continue
+            key, sep, setting = pair.partition("=")
+            if not sep or not key.strip():
+                raise ValueError(f"Expected setting=value, got {pair.strip()!r}")
+            settings[key.strip()] = setting.strip()
+        profiles[name.strip()] = settings
+    return profiles
+
+
+def apply_settings(
+    conn: Connection,
+    settings: Mapping[str, str],
+    reset: frozenset[str] | set[str] = frozenset(),
+) -> None:
+    """
+    Sets each of settings on conn, and resets each setting in reset that is
+    not in settings, for the rest of the session.
+    """
+    names = list(settings) + sorted(set(reset) - set(settings))
+    values: list[str | None] = [settings.get(name) for name in names]
+    if names:
+        conn.execute(APPLY_PROFILE_QUERY, (names, values))
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import re
+from threading import Event, Thread
+from typing import Callable
+
+from psycopg_pool import ConnectionPool
+
+# seconds between polls of a pg_stat_progress view
+PROGRESS_INTERVAL = 5.0
+
+LEADING_COMMENTS = re.compile(r"^(?:\s+|--[^\n]*|/\*.*?\*/)*", re.DOTALL)
+
+MAINTENANCE_STATEMENT = re.compile(
+    r"(?P<keyword>create\s+(?:unique\s+)?index|reindex|vacuum|analy[sz]e|cluster|copy)\b",
+    re.IGNORECASE,
+)
+
+# each query returns (command, phase, done, total) for the backend with pid,
+# or no rows once the command has finished
+CREATE_INDEX_PROGRESS = """
+    select
+        command,
+        phase,
+        case when blocks_total > 0 then blocks_done else tuples_done end,
+        case when blocks_total > 0 then blocks_total else tuples_total end
+    from pg_catalog.pg_stat_progress_create_index
+    where pid = %(pid)s
+    ;"""
+
+# VACUUM FULL reports in pg_stat_progress_cluster, and VACUUM (ANALYZE) moves
+# on to pg_stat_progress_analyze after the vacuum
+VACUUM_PROGRESS = """
+    select
+        'VACUUM',
+        phase,
+        case
+            when phase = 'vacuuming heap' then heap_blks_vacuumed
+            else heap_blks_scanned
+        end,
+        heap_blks_total
+    from pg_catalog.pg_stat_progress_vacuum
+    where pid = %(pid)s
+    union all
+    select 'ANALYZE', phase, sample_blks_scanned, sample_blks_total
+    from pg_catalog.pg_stat_progress_analyze
+    where pid = %(pid)s
+    union all
+    select command, phase, heap_blks_scanned, heap_blks_total
+    from pg_catalog.pg_stat_progress_cluster
+    where pid = %(pid)s
+    ;"""
+
+ANALYZE_PROGRESS = """
+    select 'ANALYZE', phase, sample_blks_scanned, sample_blks_total
+    from pg_catalog.pg_stat_progress_analyze
+    where pid = %(pid)s
+    ;"""
+
+CLUSTER_PROGRESS = """
+    select command, phase, heap_blks_scanned, heap_blks_total
+    from pg_catalog.pg_stat_progress_cluster
+    where pid = %(pid)s
+    ;"""
+
+# COPY FROM STDIN does not know its total size, so the phase counts tuples
+COPY_PROGRESS = """
+    select
+        command,
+        pg_catalog.format('%%s tuples processed', tuples_processed),
+        bytes_processed,
+        bytes_total
+    from pg_catalog.pg_stat_progress_copy
+    where pid = %(pid)s
+    ;"""
+
+PROGRESS_QUERIES = {
+    "create index": CREATE_INDEX_PROGRESS,
+    "reindex": CREATE_INDEX_PROGRESS,
+    "vacuum": VACUUM_PROGRESS,
+    "analyze": ANALYZE_PROGRESS,
+    "analyse": ANALYZE_PROGRESS,
+    "cluster": CLUSTER_PROGRESS,
+    "copy": COPY_PROGRESS,
+}
+
+
+def progress_query(query: str) -> str | None:
+    """
+    Returns the query that reports the progress of a maintenance statement,
+    or None if Postgres does not report progress for the statement.
+    """
+    statement = LEADING_COMMENTS.sub("", query, count=1)
+    match = MAINTENANCE_STATEMENT.match(statement)
+    if match is None:
+        return None
+    keyword = " ".join(match.group("keyword").lower().split())
+    return PROGRESS_QUERIES["create index" if "index" in keyword else keyword]
+
+
+def format_progress(
+    command: str, phase: str, done: int | None, total: int | None
+) -> str:
+    message = f"{command}: {phase}"
+    if done is not None and total:
+        message += f" ({100 * done / total:.0f}%)"
+    return message
+
+
+class ProgressMonitor(Thread):
+    """
+    Polls a pg_stat_progress view for another backend from its own pool
+    connection, and passes a message to `notify` whenever the phase or
+    percent complete changes.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        pid: int,
+        query: str,
+        notify: Callable[[str], None],
+        interval: float = PROGRESS_INTERVAL,
+    ) -> None:
+        super().__init__(name="harlequin-postgres-progress", daemon=True)
+        self.pool = pool
+        self.pid = pid
+        self.query = query
+        self.notify = notify
+        self.interval = interval
+        self._stopped = Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        # statements that finish within one interval don't need a connection
+        if self._stopped.wait(self.interval):
+            return
+        last_message = None
+        try:
+            with self.pool.connection() as conn:
+                while not self._stopped.is_set():
+                    row = conn.execute(self.query, {"pid": self.pid}).fetchone()
+                    if row is not None:
+                        message = format_progress(*row)
+                        if message != last_message and not self._stopped.is_set():
+                            self.notify(message)
+                        last_message = message
+                    if self._stopped.wait(self.interval):
+                        return
+        except Exception:
+            # progress is best-effort; never surface an error for it
+            return
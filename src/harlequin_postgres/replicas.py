@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import re
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Sequence
+
+from psycopg import Connection
+from psycopg_pool import ConnectionPool
+
+# seconds between checks of a replica's health and replication lag
+REPLICA_CHECK_INTERVAL = 5.0
+
+# replicas that are further behind the primary than this (in seconds) are
+# not used
+REPLICA_MAX_LAG = 30.0
+
+# seconds to wait for a connection to a replica before treating it as down
+REPLICA_TIMEOUT = 2.0
+
+# a replica that is down is checked less often, since each check of it
+# waits for the timeout, up to once per this many seconds
+REPLICA_MAX_BACKOFF = 60.0
+
+# a replica that has replayed everything it received is not behind, even if
+# the primary has not committed anything for a while
+LAG_QUERY = """
+    select
+        pg_catalog.pg_is_in_recovery(),
+        case
+            when pg_catalog.pg_last_wal_receive_lsn()
+                = pg_catalog.pg_last_wal_replay_lsn()
+            then 0
+            else extract(
+                epoch from now() - pg_catalog.pg_last_xact_replay_timestamp()
+            )
+        end
+    ;"""
+
+# the settings changed with SET on the main connection, which are replayed
+# (locally) before each statement that is routed to a replica
+SESSION_SETTINGS_QUERY = """
+    select name, setting
+    from pg_catalog.pg_settings
+    where source = 'session'
+    ;"""
+
+APPLY_SETTINGS_QUERY = """
+    select pg_catalog.set_config(name, setting, true)
+    from unnest(%s::text[], %s::text[]) as s(name, setting)
+    ;"""
+
+# comments, string literals, and quoted identifiers, which can contain any
+# word, and are removed before a statement is classified
+NOT_CODE = re.compile(
+    r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$(\w*)\$.*?\$\1\$",
+    re.DOTALL,
+)
+
+READ_STATEMENT = re.compile(r"\s*(?:select|with|table|values)\b", re.IGNORECASE)
+
+EXPLAIN_PREFIX = re.compile(
+    r"\s*explain\b\s*(?:\([^)]*\)|(?:analy[sz]e|verbose)\b\s*)*", re.IGNORECASE
+)
+
+# words that make a read statement write, lock rows, or create a table
+WRITE_WORDS = re.compile(
+    r"\b(?:insert|update|delete|merge|into|for\s+(?:no\s+key\s+)?update"
+    r"|for\s+(?:key\s+)?share|nextval|setval|lock)\b",
+    re.IGNORECASE,
+)
+
+
+def is_read_only(query: str) -> bool:
+    """
+    Returns True if query is a single SELECT, WITH, TABLE, or VALUES statement
+    (or an EXPLAIN of one) that does not write, lock rows, or use sequences.
+    Statements that call functions which write are only detected when the
+    replica rejects them.
+    """
+    code = NOT_CODE.sub(" ", query).strip().rstrip(";")
+    if ";" in code:
+        return False
+    explained = EXPLAIN_PREFIX.match(code)
+    if explained is not None:
+        code = code[explained.end() :]
+    return READ_STATEMENT.match(code) is not None and not WRITE_WORDS.search(code)
+
+
+def parse_replica_hosts(
+    value: str | Sequence[str] | None,
+) -> list[tuple[str, str | None]]:
+    """
+    Parses a comma-separated list of host[:port] entries. IPv6 addresses
+    with a port must be written in brackets, like [::1]:5433.
+    """
+    if value is None:
+        return []
+    entries = [value] if isinstance(value, str) else list(value)
+    hosts: list[tuple[str, str | None]] = []
+    for entry in (e.strip() for v in entries for e in v.split(",")):
+        if not entry:
+            continue
+        bracketed = re.fullmatch(r"\[([^\]]+)\](?::(\d+))?", entry)
+        if bracketed is not None:
+            hosts.append((bracketed.group(1), bracketed.group(2)))
+        elif entry.count(":") == 1:
+            host, port = entry.split(":")
+            hosts.append((host, port or None))
+        else:
+            hosts.append((entry, None))
+    return hosts
+
+
+class Replica:
+    """
+    A pool of connections to one replica, with the replication lag and health
+    from its last check.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: str | None,
+        conninfo: str,
+        options: dict[str, Any],
+        configure: Callable[[Connection], None],
+    ) -> None:
+        self.pool = ConnectionPool(
+            conninfo=conninfo,
+            min_size=1,
+            max_size=5,
+            kwargs={**options, "host": host, "port": port or options.get("port")},
+            configure=configure,
+            check=ConnectionPool.check_connection,
+            open=True,
+            timeout=REPLICA_TIMEOUT,
+        )
+        self.healthy = False
+        self.lag: float | None = None
+        self.checked_at: float | None = None
+        self.failures = 0
+
+    def needs_check(self, interval: float) -> bool:
+        if self.checked_at is None:
+            return True
+        if self.failures:
+            interval = min(interval * 2**self.failures, REPLICA_MAX_BACKOFF)
+        return monotonic() - self.checked_at >= interval
+
+    def check(self) -> None:
+        self.checked_at = monotonic()
+        try:
+            with self.pool.connection(timeout=REPLICA_TIMEOUT) as conn:
+                row = conn.execute(LAG_QUERY).fetchone()
+        except Exception:
+            self.mark_down()
+            return
+        assert row is not None
+        in_recovery, lag = row
+        # a replica that was promoted no longer follows the primary
+        self.healthy = bool(in_recovery) and lag is not None
+        self.lag = float(lag) if lag is not None else None
+        self.failures = 0
+
+    def mark_down(self) -> None:
+        self.healthy, self.lag = False, None
+        self.checked_at = monotonic()
+        self.failures += 1
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class ReplicaRouter:
+    """
+    Picks the healthy replica with the least replication lag, checking each
+    replica at most once per `interval`.
+    """
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        max_lag: float = REPLICA_MAX_LAG,
+        interval: float = REPLICA_CHECK_INTERVAL,
+    ) -> None:
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.interval = interval
+        self._lock = Lock()
+
+    def pick(self) -> Replica | None:
+        with self._lock:
+            for replica in self.replicas:
+                if replica.needs_check(self.interval):
+                    replica.check()
+            candidates = [
+                r
+                for r in self.replicas
+                if r.healthy and r.lag is not None and r.lag <= self.max_lag
+            ]
+        return min(candidates, key=lambda r: r.lag or 0.0, default=None)
+
+    def close(self) -> None:
+        for replica in self.replicas:
+            replica.close()
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import re
+import sys
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Hashable, Sequence
+
+# results are kept for this many seconds by default, since writes from other
+# sessions can't be detected
+RESULT_CACHE_TTL = 300.0
+
+# a result that is not cached yet is fetched in batches of this many rows, so
+# fetching stops being sized once it is too large to cache
+CACHE_FETCH_ROWS = 1000
+
+# comments, which are dropped, and literals and quoted identifiers, which are
+# kept as they are, while the rest of a query is normalized
+NOT_NORMALIZED = re.compile(
+    r"(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$(\w*)\$.*?\$\2\$",
+    re.DOTALL,
+)
+
+WHITESPACE = re.compile(r"\s+")
+
+# comments and string literals, which can contain any word, and are removed
+# before the functions a query calls are found
+NOT_CODE_OR_NAME = re.compile(
+    r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\$(\w*)\$.*?\$\1\$",
+    re.DOTALL,
+)
+
+# a (quoted or unquoted) name followed by a parenthesis. Most are function
+# calls, and the rest (keywords, type modifiers, and column lists) don't name
+# functions, or only match functions with the same name
+FUNCTION_CALL = re.compile(r"(?:\"((?:[^\"]|\"\")+)\"|(\w+))\s*\(")
+
+# true if any function with one of the names may write, or return a different
+# result each time it is called. Overloads in every schema are checked, so a
+# query is not cached if any function it may call is volatile
+VOLATILE_FUNCTIONS_QUERY = """
+    select exists (
+        select from pg_catalog.pg_proc
+        where proname = any(%s::text[]) and provolatile = 'v'
+    )
+    ;"""
+
+# statements that change or show settings don't write, and the settings are
+# part of the cache's key, so they don't clear the cache
+SETTINGS_STATEMENT = re.compile(r"\s*(?:set|reset|show)\b", re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query for the cache's key, so queries that differ only in
+    comments, whitespace, the case of keywords and unquoted identifiers, or a
+    trailing semicolon share a result.
+    """
+    parts: list[str] = []
+    position = 0
+    for match in NOT_NORMALIZED.finditer(query):
+        parts.append(WHITESPACE.sub(" ", query[position : match.start()].lower()))
+        # a comment separates tokens, like whitespace
+        parts.append(" " if match.group("comment") is not None else match.group())
+        position = match.end()
+    parts.append(WHITESPACE.sub(" ", query[position:].lower()))
+    return "".join(parts).strip().rstrip("; ")
+
+
+def called_functions(query: str) -> frozenset[str]:
+    """
+    Returns the names of the functions that query may call directly. Functions
+    called by views, operators, or defaults are not found.
+    """
+    code = NOT_CODE_OR_NAME.sub(" ", query)
+    return frozenset(
+        quoted.replace('""', '"') if quoted else name.lower()
+        for quoted, name in FUNCTION_CALL.findall(code)
+    )
+
+
+def result_size(rows: Sequence[tuple[Any, ...]]) -> int:
+    """
+    Estimates the memory used by rows, in bytes.
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class ResultCache:
+    """
+    A least-recently-used cache of query results, bounded by the estimated
+    size of the results it holds. Entries expire `ttl` seconds after they were
+    stored.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = RESULT_CACHE_TTL) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries: OrderedDict[
+            Hashable,
+            tuple[list[tuple[str, str]], Sequence[tuple[Any, ...]], int, float],
+        ] = OrderedDict()
+        # whether each set of function names includes a volatile function.
+        # Creating or replacing a function clears the cache, and this with it
+        self.volatile: dict[frozenset[str], bool] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, key: Hashable
+    ) -> tuple[list[tuple[str, str]], Sequence[tuple[Any, ...]]] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and monotonic() - entry[3] >= self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(
+        self,
+        key: Hashable,
+        columns: list[tuple[str, str]],
+        rows: Sequence[tuple[Any, ...]],
+        size: int | None = None,
+    ) -> bool:
+        """
+        Stores a result, evicting the least recently used results to make room
+        for it. Returns False if the result is too large to cache. If the
+        result's size is not given, it is estimated.
+        """
+        if size is None:
+            size = result_size(rows)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self.size + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = (columns, rows, size, monotonic())
+            self.size += size
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.volatile.clear()
+            self.size = 0
+
+    def _remove(self, key: Hashable) -> None:
+        self.size -= self._entries.pop(key)[2]
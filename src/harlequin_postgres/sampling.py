@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from textwrap import dedent
+
+# the number of rows returned by the Sample Data interaction
+SAMPLE_ROWS = 100
+
+# row estimates can be stale and SYSTEM sampling returns whole pages, so
+# sample a few times as many rows as we need
+OVERSAMPLE = 3
+
+# tables with at most this many pages are cheap to read in full, so they are
+# sampled row by row, which spreads the sample over every page
+BERNOULLI_MAX_PAGES = 128
+
+# SYSTEM picks each page independently, so a sample of one or two pages is
+# often empty; always expect to read at least this many pages
+MIN_SAMPLE_PAGES = 10
+
+# the rows per page assumed for a table that has never been vacuumed or
+# analyzed, which has no row estimate
+DEFAULT_ROWS_PER_PAGE = 50
+
+
+def estimate_rows(reltuples: float, relpages: int, pages: int) -> float:
+    """
+    Estimates the rows in a table that now has `pages` pages, from the row
+    density when it was last vacuumed or analyzed, like the planner does.
+    """
+    if reltuples < 0 or relpages <= 0:
+        return pages * DEFAULT_ROWS_PER_PAGE
+    return reltuples / relpages * pages
+
+
+def sample_method(
+    leaves: list[tuple[float, int, int]], target: int = SAMPLE_ROWS
+) -> tuple[str, float]:
+    """
+    Returns the TABLESAMPLE method and percentage that should return at least
+    `target` rows from a table, given the (reltuples, relpages, current pages)
+    of each of its leaf partitions (or of the table itself). Only BERNOULLI
+    reads every page, so it is only used for small tables.
+    """
+    rows = sum(estimate_rows(*leaf) for leaf in leaves)
+    pages = sum(leaf[2] for leaf in leaves)
+    if rows <= 0 or pages <= BERNOULLI_MAX_PAGES:
+        method = "bernoulli"
+        percent = 100 * target * OVERSAMPLE / rows if rows > 0 else 100.0
+    else:
+        method = "system"
+        percent = 100 * max(target * OVERSAMPLE / rows, MIN_SAMPLE_PAGES / pages)
+    return method, min(100.0, percent)
+
+
+def sample_data_sql(
+    table: str, method: str, percent: float, target: int = SAMPLE_ROWS
+) -> str:
+    """
+    SQL that returns `target` random rows from a sample of a table. Only the
+    sampled rows are shuffled, so ordering by random() never sorts the table.
+    """
+    how = (
+        "reads every row, since the table is small"
+        if method == "bernoulli"
+        else "reads randomly chosen pages, so it never scans the whole table"
+    )
+    return dedent(
+        f"""
+        -- A random sample of {target} rows from {table}. Sampling
+        -- {percent:.4g}% with {method.upper()} {how}.
+        -- Run it again for a new sample.
+        select *
+        from {table} tablesample {method} ({percent:.4g})
+        order by random()
+        limit {target}
+        """
+    ).strip("\n")
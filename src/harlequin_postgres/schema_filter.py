@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Sequence
+
+
+def _pattern_to_regex(pattern: str) -> str:
+    """
+    Converts a glob (e.g., tenant_*) to an anchored POSIX regex. Patterns
+    that start with ~ are already regexes, and are used as-is.
+    """
+    if pattern.startswith("~"):
+        return pattern[1:]
+    parts = []
+    for char in pattern:
+        if char == "*":
+            parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return f"^{''.join(parts)}$"
+
+
+def _split_patterns(raw: str | Sequence[str] | None) -> list[str]:
+    if raw is None:
+        return []
+    items = [raw] if isinstance(raw, str) else raw
+    return [
+        pattern.strip()
+        for item in items
+        for pattern in item.split(",")
+        if pattern.strip()
+    ]
+
+
+def _array_literal(values: list[str]) -> str:
+    quoted = ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+    return f"array[{quoted}]::text[]"
+
+
+@dataclass
+class SchemaFilter:
+    """
+    Include and exclude patterns for schema names, stored as POSIX regexes so
+    they can be pushed down into introspection queries with the ~ operator.
+    """
+
+    include: list[str] = field(default_factory=list)
+    exclude: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_options(
+        cls,
+        include: str | Sequence[str] | None,
+        exclude: str | Sequence[str] | None,
+    ) -> "SchemaFilter":
+        return cls(
+            include=[_pattern_to_regex(p) for p in _split_patterns(include)],
+            exclude=[_pattern_to_regex(p) for p in _split_patterns(exclude)],
+        )
+
+    @property
+    def params(self) -> dict[str, list[str]]:
+        """
+        Query parameters for the clause returned by `clause()`.
+        """
+        return {"schema_include": self.include, "schema_exclude": self.exclude}
+
+    @staticmethod
+    def clause(column: str) -> str:
+        """
+        A parameterized SQL predicate that filters `column` (a schema name).
+        It always has the same text, so it can be used in prepared statements.
+        """
+        return (
+            f"((cardinality(%(schema_include)s::text[]) = 0 "
+            f"or {column} ~ any(%(schema_include)s::text[])) "
+            f"and not ({column} ~ any(%(schema_exclude)s::text[])))"
+        )
+
+    def inline_clause(self, column: str) -> str:
+        """
+        Like `clause()`, but with the patterns inlined as literals, for SQL
+        that is inserted into the editor.
+        """
+        predicates = []
+        if self.include:
+            predicates.append(f"{column} ~ any({_array_literal(self.include)})")
+        if self.exclude:
+            predicates.append(f"not ({column} ~ any({_array_literal(self.exclude)}))")
+        return " and ".join(predicates)
+
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude)
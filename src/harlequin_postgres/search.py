@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterator
+
+from harlequin_postgres.store import CatalogStore, ColumnView, RelationView, SchemaSlice
+
+
+def trigrams(name: str) -> set[str]:
+    """
+    The trigrams of a lower-cased name, padded like pg_trgm's, so that
+    matching prefixes score higher than matches elsewhere in the name.
+    """
+    padded = f"  {name.lower()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """
+    A matching schema, relation, or column. Exactly one of relation and column
+    is set for relation and column hits; neither is set for schema hits.
+    """
+
+    score: float
+    schema: SchemaSlice
+    relation: RelationView | None = None
+    column: ColumnView | None = None
+
+    @property
+    def name(self) -> str:
+        if self.column is not None:
+            return self.column.name
+        if self.relation is not None:
+            return self.relation.name
+        return self.schema.name
+
+
+class SliceIndex:
+    """
+    A trigram index over the names in one SchemaSlice. Names are indexed once
+    each, no matter how many relations or columns share them.
+    """
+
+    __slots__ = ("schema", "names", "name_relations", "name_columns", "postings")
+
+    def __init__(self, schema: SchemaSlice) -> None:
+        self.schema = schema
+        self.names: list[str] = []
+        self.name_relations: list[array] = []
+        self.name_columns: list[array] = []
+        self.postings: dict[str, array] = {}
+        name_ids: dict[str, int] = {}
+
+        def name_id(name: str) -> int:
+            existing = name_ids.get(name)
+            if existing is not None:
+                return existing
+            new_id = name_ids[name] = len(self.names)
+            self.names.append(name)
+            self.name_relations.append(array("I"))
+            self.name_columns.append(array("I"))
+            for trigram in trigrams(name):
+                self.postings.setdefault(trigram, array("I")).append(new_id)
+            return new_id
+
+        for index, name in enumerate(schema.relation_names):
+            self.name_relations[name_id(name)].append(index)
+        for index, name in enumerate(schema.column_names):
+            self.name_columns[name_id(name)].append(index)
+
+    def match(self, query_trigrams: set[str]) -> Counter[int]:
+        """
+        Counts the query trigrams that appear in each indexed name.
+        """
+        counts: Counter[int] = Counter()
+        for trigram in query_trigrams:
+            postings = self.postings.get(trigram)
+            if postings is not None:
+                counts.update(postings)
+        return counts
+
+
+class CatalogSearchIndex:
+    """
+    A fuzzy, trigram-based search index over the schemas, relations, and
+    columns in a CatalogStore. Each schema has its own SliceIndex, so when a
+    schema is reloaded only that schema is re-indexed.
+    """
+
+    def __init__(self, threshold: float = 0.5) -> None:
+        self.threshold = threshold
+        self._indexes: dict[int, SliceIndex] = {}
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def sync(self, store: CatalogStore) -> None:
+        """
+        Re-indexes the schemas that were loaded or reloaded since the last
+        sync, and drops the ones that were removed from the store.
+        """
+        schemas = {schema.oid: schema for schema in store.schemas()}
+        for schema_oid in self._indexes.keys() - schemas.keys():
+            del self._indexes[schema_oid]
+        for schema_oid, schema in schemas.items():
+            existing = self._indexes.get(schema_oid)
+            if existing is None or existing.schema is not schema:
+                self._indexes[schema_oid] = SliceIndex(schema)
+
+    def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        query = query.strip().lower()
+        if not query:
+            return []
+        query_trigrams = trigrams(query)
+        min_count = max(1, math.ceil(len(query_trigrams) * self.threshold))
+        hits: list[SearchHit] = []
+        # names are scored first, so that only the best-scoring names are
+        # expanded into (possibly thousands of) relation and column hits
+        candidates: list[tuple[float, str, int, SliceIndex]] = []
+        for index in self._indexes.values():
+            schema_name = index.schema.name
+            count = len(trigrams(schema_name) & query_trigrams)
+            if count >= min_count:
+                score = _score(query, len(query_trigrams), schema_name, count)
+                hits.append(SearchHit(score=score, schema=index.schema))
+            for name_id, count in index.match(query_trigrams).items():
+                if count >= min_count:
+                    name = index.names[name_id]
+                    score = _score(query, len(query_trigrams), name, count)
+                    candidates.append((-score, schema_name, name_id, index))
+        candidates.sort(key=lambda candidate: candidate[:2])
+        # a min-heap of the best `limit` scores so far; once it is full and its
+        # lowest score beats the next candidate, no later candidate can place
+        top_scores = heapq.nlargest(limit, (hit.score for hit in hits))
+        heapq.heapify(top_scores)
+        for neg_score, _, name_id, index in candidates:
+            if len(top_scores) >= limit and top_scores[0] > -neg_score:
+                break
+            for hit in itertools.islice(
+                _hits_for_name(index, name_id, -neg_score), limit
+            ):
+                hits.append(hit)
+                if len(top_scores) < limit:
+                    heapq.heappush(top_scores, hit.score)
+                else:
+                    heapq.heappushpop(top_scores, hit.score)
+        return heapq.nsmallest(limit, hits, key=_sort_key)
+
+
+def _score(query: str, query_trigrams: int, name: str, shared: int) -> float:
+    """
+    Exact matches beat prefix matches, which beat substring matches, which
+    beat fuzzy matches. Within each group, names are ranked by their trigram
+    similarity to the query, which favors shorter names.
+    """
+    lowered = name.lower()
+    if lowered == query:
+        bonus = 3.0
+    elif lowered.startswith(query):
+        bonus = 2.0
+    elif query in lowered:
+        bonus = 1.0
+    else:
+        bonus = 0.0
+    # a padded name of length n has at most n + 1 distinct trigrams
+    return bonus + shared / (query_trigrams + len(lowered) + 1 - shared)
+
+
+def _hits_for_name(
+    index: SliceIndex, name_id: int, score: float
+) -> Iterator[SearchHit]:
+    schema = index.schema
+    for relation_index in index.name_relations[name_id]:
+        yield SearchHit(
+            score=score, schema=schema, relation=RelationView(schema, relation_index)
+        )
+    offsets = schema.column_offsets
+    for column_index in index.name_columns[name_id]:
+        # the relation that owns the column
+        relation_index = bisect_right(offsets, column_index) - 1
+        relation = RelationView(schema, relation_index)
+        yield SearchHit(
+            score=score,
+            schema=schema,
+            relation=relation,
+            column=ColumnView(relation, column_index),
+        )
+
+
+def _sort_key(hit: SearchHit) -> tuple[float, int, str, str]:
+    # schemas, then relations, then columns, for names with the same score
+    kind = 2 if hit.column is not None else 1 if hit.relation is not None else 0
+    relation_name = hit.relation.name if hit.relation is not None else ""
+    return (-hit.score, kind, hit.schema.name, relation_name)
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import timedelta
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from harlequin.driver import HarlequinDriver
+
+    from harlequin_postgres.adapter import HarlequinPostgresConnection
+
+SESSIONS_QUERY = """
+    select
+        a.pid,
+        a.datname,
+        a.usename,
+        a.application_name,
+        a.state,
+        a.wait_event_type || ': ' || a.wait_event,
+        w.waiting_for,
+        pg_catalog.pg_blocking_pids(a.pid),
+        now() - a.xact_start,
+        now() - a.state_change,
+        a.query
+    from pg_catalog.pg_stat_activity a
+    left join lateral (
+        -- a session waiting on a row lock waits for the transaction that holds
+        -- it, so find the relation from the tuple lock the session holds
+        select
+            l.mode || ' on ' || case
+                when l.relation is not null then n.nspname || '.' || c.relname
+                when t.relation is not null
+                    then 'row of ' || tn.nspname || '.' || tc.relname
+                else l.locktype
+            end as waiting_for
+        from pg_catalog.pg_locks l
+        left join pg_catalog.pg_class c on c.oid = l.relation
+        left join pg_catalog.pg_namespace n on n.oid = c.relnamespace
+        left join lateral (
+            select tl.relation
+            from pg_catalog.pg_locks tl
+            where tl.pid = l.pid and tl.locktype = 'tuple'
+            limit 1
+        ) t on true
+        left join pg_catalog.pg_class tc on tc.oid = t.relation
+        left join pg_catalog.pg_namespace tn on tn.oid = tc.relnamespace
+        where l.pid = a.pid and not l.granted
+        limit 1
+    ) w on true
+    where
+        a.backend_type = 'client backend'
+        and a.pid != pg_catalog.pg_backend_pid()
+    order by a.pid
+    ;"""
+
+SESSION_COLUMNS = [
+    ("Tree", "s"),
+    ("PID", "#"),
+    ("Blocked By", "#"),
+    ("Blocking", "#"),
+    ("Database", "s"),
+    ("User", "s"),
+    ("Application", "s"),
+    ("State", "s"),
+    ("Wait Event", "s"),
+    ("Waiting For", "s"),
+    ("Transaction Age", "|-|"),
+    ("State Age", "|-|"),
+    ("Query", "s"),
+]
+
+# the order of sessions that are not part of a blocking tree
+STATE_ORDER = {
+    "active": 0,
+    "idle in transaction": 1,
+    "idle in transaction (aborted)": 2,
+    "fastpath function call": 3,
+    "disabled": 4,
+    "idle": 5,
+}
+
+
+@dataclass
+class Session:
+    pid: int
+    database: str | None
+    user: str | None
+    application: str | None
+    state: str | None
+    wait_event: str | None
+    waiting_for: str | None
+    blocked_by: list[int]
+    transaction_age: timedelta | None
+    state_age: timedelta | None
+    query: str | None
+    blocks: list["Session"] = field(default_factory=list)
+
+    @classmethod
+    def from_row(cls, row: tuple[Any, ...]) -> "Session":
+        pid, database, user, application, state, wait_event, waiting_for = row[:7]
+        blocked_by, transaction_age, state_age, query = row[7:]
+        return cls(
+            pid=pid,
+            database=database,
+            user=user,
+            application=application,
+            state=state,
+            wait_event=wait_event,
+            waiting_for=waiting_for,
+            blocked_by=list(blocked_by or []),
+            transaction_age=transaction_age,
+            state_age=state_age,
+            query=query,
+        )
+
+    def blocked_count(self) -> int:
+        """
+        The number of sessions this session blocks, directly or indirectly.
+        """
+        seen: set[int] = set()
+        stack = list(self.blocks)
+        while stack:
+            session = stack.pop()
+            if session.pid not in seen:
+                seen.add(session.pid)
+                stack.extend(session.blocks)
+        return len(seen)
+
+
+def blocking_tree(
+    sessions: list[Session],
+) -> list[tuple[Session, int, int | None]]:
+    """
+    Orders sessions as a forest of blocking trees, each rooted at a session
+    that blocks others but is not blocked itself, with the worst blockers
+    first. Returns (session, depth, blocking pid) for each session; sessions
+    that neither block nor are blocked follow, busiest first.
+    """
+    by_pid = {session.pid: session for session in sessions}
+    for session in sessions:
+        session.blocks = []
+    for session in sessions:
+        for blocker_pid in session.blocked_by:
+            blocker = by_pid.get(blocker_pid)
+            if blocker is not None:
+                blocker.blocks.append(session)
+
+    roots = [s for s in sessions if s.blocks and not s.blocked_by]
+    roots.sort(key=lambda s: s.blocked_count(), reverse=True)
+    ordered: list[tuple[Session, int, int | None]] = []
+    placed: set[int] = set()
+
+    def visit(session: Session, depth: int, parent: int | None) -> None:
+        if session.pid in placed:
+            return
+        placed.add(session.pid)
+        ordered.append((session, depth, parent))
+        for child in session.blocks:
+            visit(child, depth + 1, session.pid)
+
+    for root in roots:
+        visit(root, 0, None)
+    # blocked sessions whose blockers are not visible (or that are in a cycle)
+    for session in sessions:
+        if session.blocked_by and session.pid not in placed:
+            visit(session, 0, session.blocked_by[0])
+    rest = [s for s in sessions if s.pid not in placed]
+    rest.sort(
+        key=lambda s: (
+            STATE_ORDER.get(s.state or "", len(STATE_ORDER)),
+            -(s.state_age or timedelta()).total_seconds(),
+        )
+    )
+    ordered.extend((session, 0, None) for session in rest)
+    return ordered
+
+
+def session_rows(sessions: list[Session]) -> list[tuple[Any, ...]]:
+    return [
+        (
+            f"{'  ' * depth}{'└ ' if depth else ''}{session.pid}",
+            session.pid,
+            parent,
+            session.blocked_count(),
+            session.database,
+            session.user,
+            session.application,
+            session.state,
+            session.wait_event,
+            session.waiting_for,
+            session.transaction_age,
+            session.state_age,
+            session.query,
+        )
+        for session, depth, parent in blocking_tree(sessions)
+    ]
+
+
+class SessionMonitor(Thread):
+    """
+    Polls pg_stat_activity on the connection's dedicated monitor connection,
+    and shows a notification when a session has been blocked for longer than
+    `threshold`.
+    """
+
+    def __init__(
+        self,
+        connection: "HarlequinPostgresConnection",
+        driver: "HarlequinDriver",
+        interval: float = 5.0,
+        threshold: timedelta = timedelta(seconds=5),
+    ) -> None:
+        super().__init__(name="harlequin-postgres-session-monitor", daemon=True)
+        self.connection = connection
+        self.driver = driver
+        self.interval = interval
+        self.threshold = threshold
+        self._stopped = Event()
+        self._reported: set[tuple[int, int]] = set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                sessions = self.connection.get_sessions()
+            except Exception as e:
+                self.driver.notify(
+                    f"Stopped the lock monitor after an error: {e}", severity="error"
+                )
+                return
+            self.check(sessions)
+
+    def check(self, sessions: list[Session]) -> None:
+        blocked: set[tuple[int, int]] = set()
+        for session, _, parent in blocking_tree(sessions):
+            if parent is None or session.state_age is None:
+                continue
+            if session.state_age < self.threshold:
+                continue
+            blocked.add((session.pid, parent))
+            if (session.pid, parent) in self._reported:
+                continue
+            waiting_for = (
+                f" waiting for {session.waiting_for}" if session.waiting_for else ""
+            )
+            self.driver.notify(
+                f"PID {session.pid} has been blocked by PID {parent} for "
+                f"{int(session.state_age.total_seconds())}s{waiting_for}. "
+                f"Run \\cancel {parent} or \\terminate {parent} to unblock it.",
+                severity="warning",
+            )
+        # report a session again if it is unblocked and then blocked again
+        self._reported = blocked
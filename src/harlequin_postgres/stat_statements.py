@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from textwrap import dedent
+
+# the number of queries shown by the Top Queries interactions
+TOP_QUERIES_LIMIT = 50
+
+# (calls, total time, rows, shared blocks hit, shared blocks read)
+StatementStats = tuple[int, float, int, int, int]
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+@dataclass(frozen=True)
+class StatStatementsSource:
+    """
+    Where the pg_stat_statements view lives, and which of its version-specific
+    columns are available. pg_stat_statements 1.8 (Postgres 13) renamed
+    total_time and mean_time to total_exec_time and mean_exec_time.
+    """
+
+    schema: str
+    columns: frozenset[str]
+
+    @property
+    def view(self) -> str:
+        return f'"{self.schema}".pg_stat_statements'
+
+    @property
+    def total_time(self) -> str:
+        return "total_exec_time" if "total_exec_time" in self.columns else "total_time"
+
+    @property
+    def mean_time(self) -> str:
+        return "mean_exec_time" if "mean_exec_time" in self.columns else "mean_time"
+
+    def snapshot_query(self) -> str:
+        return f"""
+            select
+                s.queryid,
+                s.userid,
+                s.calls,
+                s.{self.total_time},
+                s.rows,
+                s.shared_blks_hit,
+                s.shared_blks_read
+            from {self.view} s
+            join pg_catalog.pg_database d on d.oid = s.dbid
+            where d.datname = %s and s.queryid is not null
+            ;"""
+
+    def top_queries_sql(self, dbname: str, limit: int = TOP_QUERIES_LIMIT) -> str:
+        total = f"s.{self.total_time}"
+        return dedent(
+            f"""
+            -- Top queries in {dbname} by total execution time since the
+            -- statistics were last reset, from pg_stat_statements.
+            select
+                s.queryid as "Query ID",
+                pg_catalog.pg_get_userbyid(s.userid) as "User",
+                s.calls as "Calls",
+                round({total}::numeric, 2) as "Total Time (ms)",
+                round(s.{self.mean_time}::numeric, 2) as "Mean Time (ms)",
+                round((100 * {total} / nullif(sum({total}) over (), 0))::numeric, 1)
+                    as "% of Total Time",
+                s.rows as "Rows",
+                round(
+                    100.0 * s.shared_blks_hit
+                    / nullif(s.shared_blks_hit + s.shared_blks_read, 0),
+                    1
+                ) as "Shared Hit %",
+                s.query as "Query"
+            from {self.view} s
+            join pg_catalog.pg_database d on d.oid = s.dbid
+            where d.datname = {_literal(dbname)}
+            order by {total} desc
+            limit {limit};
+            """
+        ).strip("\n")
+
+    def top_queries_delta_sql(
+        self,
+        snapshot: StatementsSnapshot,
+        current: StatementsSnapshot,
+        limit: int = TOP_QUERIES_LIMIT,
+    ) -> str:
+        """
+        SQL that compares the live statistics to the snapshot, for the `limit`
+        queries that used the most time between the snapshot and `current`.
+        The snapshot is inlined as a VALUES list.
+        """
+        deltas = sorted(
+            current.stats,
+            key=lambda key: (
+                current.stats[key][1] - snapshot.stats.get(key, (0, 0.0, 0, 0, 0))[1]
+            ),
+            reverse=True,
+        )[:limit]
+        values = (",\n" + " " * 24).join(
+            "({}::bigint, {}::oid, {}::bigint, {!r}::float8, {}::bigint, "
+            "{}::bigint, {}::bigint)".format(
+                *key, *snapshot.stats.get(key, (0, 0.0, 0, 0, 0))
+            )
+            for key in deltas
+        )
+        if not values:
+            values = "(null::bigint, null::oid, 0, 0, 0, 0, 0)"
+        taken_at = _literal(snapshot.taken_at.isoformat())
+        elapsed = f"extract(epoch from now() - {taken_at}::timestamptz)"
+        total = f"(s.{self.total_time} - snap.total_time)"
+        return dedent(
+            f"""
+            -- Top queries in {snapshot.dbname} by execution time since the snapshot
+            -- taken at {snapshot.taken_at:%Y-%m-%d %H:%M:%S}. Run this again to see
+            -- the change from the snapshot up to now.
+            with
+                snapshot (
+                    queryid,
+                    userid,
+                    calls,
+                    total_time,
+                    rows,
+                    shared_blks_hit,
+                    shared_blks_read
+                ) as (
+                    values
+                        {values}
+                )
+            select
+                s.queryid as "Query ID",
+                pg_catalog.pg_get_userbyid(s.userid) as "User",
+                s.calls - snap.calls as "Calls",
+                round(
+                    ((s.calls - snap.calls) / nullif({elapsed}, 0))::numeric, 2
+                ) as "Calls/s",
+                round({total}::numeric, 2) as "Total Time (ms)",
+                round(
+                    ({total} / nullif(s.calls - snap.calls, 0))::numeric, 2
+                ) as "Mean Time (ms)",
+                round((100 * {total} / nullif(sum({total}) over (), 0))::numeric, 1)
+                    as "% of Total Time",
+                s.rows - snap.rows as "Rows",
+                round(
+                    100.0 * (s.shared_blks_hit - snap.shared_blks_hit) / nullif(
+                        s.shared_blks_hit - snap.shared_blks_hit
+                        + s.shared_blks_read - snap.shared_blks_read,
+                        0
+                    ),
+                    1
+                ) as "Shared Hit %",
+                s.query as "Query"
+            from {self.view} s
+            join snapshot snap using (queryid, userid)
+            join pg_catalog.pg_database d on d.oid = s.dbid
+            where
+                d.datname = {_literal(snapshot.dbname)}
+                -- skip statements that have not run since the snapshot, or
+                -- whose statistics were reset
+                and s.calls > snap.calls
+            order by {total} desc;
+            """
+        ).strip("\n")
+
+
+@dataclass
+class StatementsSnapshot:
+    """
+    The cumulative statistics of every statement in a database at a point in
+    time, keyed by (queryid, userid).
+    """
+
+    dbname: str
+    taken_at: datetime
+    stats: dict[tuple[int, int], StatementStats] = field(default_factory=dict)
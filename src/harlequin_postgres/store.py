@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import re
+import sys
+from array import array
+from time import monotonic
+from typing import Any, Iterable, Iterator
+
+
+class SchemaSlice:
+    """
+    The relations and columns of a single schema, stored column-wise in flat
+    arrays. Relation i owns the columns in the half-open range
+    column_offsets[i]:column_offsets[i + 1]. Names are interned, since the
+    same column names (id, created_at, ...) repeat across thousands of tables.
+    """
+
+    __slots__ = (
+        "oid",
+        "name",
+        "loaded_at",
+        "relation_oids",
+        "relation_names",
+        "relation_kinds",
+        "relation_persistences",
+        "column_offsets",
+        "column_names",
+        "column_type_oids",
+    )
+
+    def __init__(self, oid: int, name: str) -> None:
+        self.oid = oid
+        self.name = sys.intern(name)
+        self.loaded_at = monotonic()
+        self.relation_oids = array("I")
+        self.relation_names: list[str] = []
+        # relkind and relpersistence are single ascii characters
+        self.relation_kinds = bytearray()
+        self.relation_persistences = bytearray()
+        self.column_offsets = array("I", [0])
+        self.column_names: list[str] = []
+        self.column_type_oids = array("I")
+
+    def __len__(self) -> int:
+        return len(self.relation_oids)
+
+    def add_relation(self, oid: int, name: str, relkind: str, persistence: str) -> None:
+        self.relation_oids.append(oid)
+        self.relation_names.append(sys.intern(name))
+        self.relation_kinds.append(ord(relkind))
+        self.relation_persistences.append(ord(persistence))
+        self.column_offsets.append(self.column_offsets[-1])
+
+    def add_column(self, name: str, type_oid: int) -> None:
+        """
+        Adds a column to the relation that was added last.
+        """
+        self.column_names.append(sys.intern(name))
+        self.column_type_oids.append(type_oid)
+        self.column_offsets[-1] += 1
+
+    def relations(self) -> Iterator[RelationView]:
+        for index in range(len(self)):
+            yield RelationView(self, index)
+
+
+def slices_from_rows(rows: Iterable[tuple[Any, ...]]) -> list[SchemaSlice]:
+    """
+    Builds schema slices from (schema oid, schema name, relation oid, relname,
+    relkind, relpersistence, attname, atttypid) rows, ordered by schema,
+    relation, and column. Schemas without relations have null relation fields.
+    """
+    slices: list[SchemaSlice] = []
+    schema_slice: SchemaSlice | None = None
+    relation_oid: int | None = None
+    for (
+        schema_oid,
+        schema_name,
+        rel_oid,
+        relname,
+        relkind,
+        relpersistence,
+        attname,
+        atttypid,
+    ) in rows:
+        if schema_slice is None or schema_slice.oid != schema_oid:
+            schema_slice = SchemaSlice(schema_oid, schema_name)
+            slices.append(schema_slice)
+            relation_oid = None
+        if rel_oid is None:
+            continue
+        if rel_oid != relation_oid:
+            schema_slice.add_relation(rel_oid, relname, relkind, relpersistence)
+            relation_oid = rel_oid
+        if attname is not None:
+            schema_slice.add_column(attname, atttypid)
+    return slices
+
+
+class RelationView:
+    """
+    A lightweight, read-only view of one relation in a SchemaSlice.
+    """
+
+    __slots__ = ("_slice", "_index")
+
+    def __init__(self, schema_slice: SchemaSlice, index: int) -> None:
+        self._slice = schema_slice
+        self._index = index
+
+    @property
+    def schema(self) -> SchemaSlice:
+        return self._slice
+
+    @property
+    def oid(self) -> int:
+        return self._slice.relation_oids[self._index]
+
+    @property
+    def name(self) -> str:
+        return self._slice.relation_names[self._index]
+
+    @property
+    def relkind(self) -> str:
+        return chr(self._slice.relation_kinds[self._index])
+
+    @property
+    def persistence(self) -> str:
+        return chr(self._slice.relation_persistences[self._index])
+
+    @property
+    def qualified_identifier(self) -> str:
+        return f'"{self._slice.name}"."{self.name}"'
+
+    def columns(self) -> Iterator[ColumnView]:
+        offsets = self._slice.column_offsets
+        for index in range(offsets[self._index], offsets[self._index + 1]):
+            yield ColumnView(self, index)
+
+
+class ColumnView:
+    """
+    A lightweight, read-only view of one column in a SchemaSlice.
+    """
+
+    __slots__ = ("relation", "_index")
+
+    def __init__(self, relation: RelationView, index: int) -> None:
+        self.relation = relation
+        self._index = index
+
+    @property
+    def name(self) -> str:
+        return self.relation.schema.column_names[self._index]
+
+    @property
+    def type_oid(self) -> int:
+        return self.relation.schema.column_type_oids[self._index]
+
+    @property
+    def qualified_identifier(self) -> str:
+        return f'{self.relation.qualified_identifier}."{self.name}"'
+
+
+class CatalogStore:
+    """
+    A compact, in-memory copy of the relations and columns of many schemas,
+    loaded in bulk. Catalog items are materialized from it on demand, and
+    each schema can be replaced independently when it is refreshed.
+    """
+
+    def __init__(self) -> None:
+        self._slices: dict[int, SchemaSlice] = {}
+        self._relations: dict[int, RelationView] = {}
+        # True once every visible schema has been loaded in a single pass
+        self.complete = False
+        # the oid and name of every visible schema, once they are listed
+        self.schema_names: dict[int, str] | None = None
+        self.schemas_listed_at = 0.0
+        # DDL may have changed any schema, so nothing listed or loaded before
+        # this time is fresh
+        self.invalidated_at = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self._slices)
+
+    def __contains__(self, schema_oid: int) -> bool:
+        return schema_oid in self._slices
+
+    def is_fresh(self, max_age: float) -> bool:
+        """
+        True if every visible schema was loaded less than max_age seconds ago.
+        """
+        return self.fresh_schemas(".*", max_age) is not None
+
+    def fresh_schemas(self, pattern: str, max_age: float) -> list[SchemaSlice] | None:
+        """
+        Returns the slices of the visible schemas whose names match the
+        pattern (a regex), if the schemas were listed, and each of them was
+        loaded, less than max_age seconds ago and since the store was
+        invalidated. Otherwise, returns None.
+        """
+        now = monotonic()
+
+        def fresh(loaded_at: float) -> bool:
+            return loaded_at > self.invalidated_at and now - loaded_at < max_age
+
+        if self.schema_names is None or not fresh(self.schemas_listed_at):
+            return None
+        slices: list[SchemaSlice] = []
+        for oid, name in self.schema_names.items():
+            if re.search(pattern, name):
+                schema_slice = self._slices.get(oid)
+                if schema_slice is None or not fresh(schema_slice.loaded_at):
+                    return None
+                slices.append(schema_slice)
+        return slices
+
+    def list_schemas(self, schemas: Iterable[tuple[int, str]]) -> None:
+        self.schema_names = dict(schemas)
+        self.schemas_listed_at = monotonic()
+
+    def invalidate(self) -> None:
+        """
+        Marks every schema as stale, after DDL. The slices are kept, so
+        catalog items can still be materialized from them until a refresh.
+        """
+        self.complete = False
+        self.invalidated_at = monotonic()
+
+    def schemas(self) -> Iterator[SchemaSlice]:
+        yield from self._slices.values()
+
+    def schema(self, schema_oid: int) -> SchemaSlice | None:
+        return self._slices.get(schema_oid)
+
+    def relation(self, relation_oid: int) -> RelationView | None:
+        return self._relations.get(relation_oid)
+
+    def replace(self, slices: Iterable[SchemaSlice]) -> None:
+        for schema_slice in slices:
+            self.remove(schema_slice.oid)
+            self._slices[schema_slice.oid] = schema_slice
+            for relation in schema_slice.relations():
+                self._relations[relation.oid] = relation
+
+    def remove(self, schema_oid: int) -> None:
+        old = self._slices.pop(schema_oid, None)
+        if old is not None:
+            for relation_oid in old.relation_oids:
+                self._relations.pop(relation_oid, None)
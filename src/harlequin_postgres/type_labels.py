@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from psycopg import Connection
+
+# short labels for built-in and common extension types, keyed by pg_type.typname
+TYPE_NAME_LABELS = {
+    "bit": "010",
+    "bool": "t/f",
+    "box": "□",
+    "bpchar": "s",
+    "bytea": "b",
+    "char": "s",
+    "cidr": "ip",
+    "circle": "○",
+    "citext": "s",
+    "date": "d",
+    "float4": "#.#",
+    "float8": "#.#",
+    "geography": "geo",
+    "geometry": "geo",
+    "halfvec": "vec",
+    "hstore": "{}",
+    "inet": "ip",
+    "int2": "#",
+    "int4": "#",
+    "int8": "##",
+    "interval": "|-|",
+    "json": "{}",
+    "jsonb": "b{}",
+    "line": "—",
+    "lseg": "-",
+    "macaddr": "mac",
+    "macaddr8": "mac",
+    "money": "$$",
+    "name": "s",
+    "numeric": "#.#",
+    "oid": "oid",
+    "path": "╭",
+    "pg_lsn": "lsn",
+    "pg_snapshot": "snp",
+    "point": "•",
+    "polygon": "▽",
+    "sparsevec": "vec",
+    "text": "s",
+    "time": "t",
+    "timestamp": "ts",
+    "timestamptz": "ts",
+    "timetz": "t",
+    "tsquery": "tsq",
+    "tsvector": "tsv",
+    "txid_snapshot": "snp",
+    "uuid": "uid",
+    "varbit": "010",
+    "varchar": "s",
+    "vector": "vec",
+    "xml": "xml",
+}
+
+# fallback labels for types not listed above, keyed by pg_type.typcategory
+TYPE_CATEGORY_LABELS = {
+    "B": "t/f",
+    "C": "()",
+    "D": "ts",
+    "E": "enm",
+    "G": "•",
+    "I": "ip",
+    "N": "#",
+    "R": "rng",
+    "S": "s",
+    "T": "|-|",
+    "V": "010",
+}
+
+
+class TypeLabelRegistry:
+    """
+    Maps type OIDs to the short labels shown in the results viewer and the
+    data catalog. Domains resolve to the label of their base type and arrays
+    to the label of their element type (e.g., "[#]"), so that enums, domains,
+    and extension types get a useful label instead of "?".
+    """
+
+    def __init__(self, labels: dict[int, str]) -> None:
+        self._labels = labels
+
+    def __contains__(self, oid: int) -> bool:
+        return oid in self._labels
+
+    def label(self, oid: int) -> str:
+        return self._labels.setdefault(oid, "?")
+
+    @classmethod
+    def load(cls, conn: Connection) -> "TypeLabelRegistry":
+        """
+        Load every type from pg_type in a single query, except the row types
+        that Postgres creates for each table, view, etc.
+        """
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                select
+                    t.oid,
+                    t.typname,
+                    t.typtype,
+                    t.typcategory,
+                    t.typelem,
+                    t.typbasetype
+                from pg_catalog.pg_type t
+                left join pg_catalog.pg_class c on c.oid = t.typrelid
+                where c.oid is null or c.relkind = 'c'
+                ;"""
+            )
+            rows: list[tuple[int, str, str, str, int, int]] = cur.fetchall()
+        types = {row[0]: row[1:] for row in rows}
+        labels: dict[int, str] = {}
+
+        def resolve(oid: int) -> str:
+            if oid in labels:
+                return labels[oid]
+            try:
+                typname, typtype, typcategory, typelem, typbasetype = types[oid]
+            except KeyError:
+                return "?"
+            # guard against cycles while resolving domains and arrays
+            labels[oid] = "?"
+            if typtype == "d" and typbasetype:
+                label = resolve(typbasetype)
+            elif typname in TYPE_NAME_LABELS:
+                label = TYPE_NAME_LABELS[typname]
+            elif typcategory == "A" and typelem:
+                label = f"[{resolve(typelem)}]"
+            else:
+                label = TYPE_CATEGORY_LABELS.get(typcategory, "?")
+            labels[oid] = label
+            return label
+
+        for oid in types:
+            resolve(oid)
+        return cls(labels)
@@ -1,18 +1,38 @@
 from __future__ import annotations
 
 import sys
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+from threading import Thread
+from time import sleep
 
 import pytest
 from harlequin.adapter import HarlequinAdapter, HarlequinConnection, HarlequinCursor
 from harlequin.catalog import Catalog, CatalogItem
 from harlequin.exception import HarlequinConnectionError, HarlequinQueryError
+from psycopg.errors import QueryCanceled
+from psycopg.pq import TransactionStatus
 from textual_fastdatatable.backend import create_backend
 
 from harlequin_postgres.adapter import (
+    CachingCursor,
     HarlequinPostgresAdapter,
     HarlequinPostgresConnection,
 )
+from harlequin_postgres.bloat import bloat_estimate_sql, bloat_exact_sql
+from harlequin_postgres.column_stats import column_profile_sql, column_stats_sql
+from harlequin_postgres.idle_transactions import IdleTransactionGuard
+from harlequin_postgres.index_advisor import index_advisor_sql
+from harlequin_postgres.meta_commands import StaticCursor
+from harlequin_postgres.profiles import parse_profiles
+from harlequin_postgres.progress import progress_query
+from harlequin_postgres.replicas import is_read_only, parse_replica_hosts
+from harlequin_postgres.result_cache import (
+    ResultCache,
+    called_functions,
+    normalize_query,
+)
+from harlequin_postgres.sampling import sample_data_sql, sample_method
+from harlequin_postgres.sessions import SessionMonitor
 
 if sys.version_info < (3, 10):
     from importlib_metadata import entry_points
@@ -55,6 +75,19 @@ def test_connect_raises_connection_error(conn_str: tuple[str]) -> None:
         _ = HarlequinPostgresAdapter(conn_str=conn_str, connect_timeout=0.1).connect()
 
 
+def test_disable_prepared_statements() -> None:
+    conn = HarlequinPostgresAdapter(
+        conn_str=(TEST_DB_CONN,), disable_prepared_statements=True
+    ).connect()
+    assert conn._main_conn.prepare_threshold is None
+    for _ in range(10):
+        conn.execute("select 1")
+    cur = conn.execute("select count(*) from pg_prepared_statements")
+    assert cur is not None
+    assert cur.fetchall() == [(0,)]
+    conn.close()
+
+
 @pytest.mark.parametrize(
     "conn_str,options,expected",
     [
@@ -89,7 +122,44 @@ def test_get_schemas_includes_user_schema_named_pgmq(
 ) -> None:
     connection.execute("create schema pgmq")
     schemas = connection._get_schemas("test")
-    assert ("pgmq",) in schemas
+    assert "pgmq" in [schema_label for _, schema_label in schemas]
+
+
+@pytest.mark.parametrize(
+    "include,exclude,expected",
+    [
+        (None, None, ["public", "tenant_1", "tenant_10", "tenant_2", "tenantx"]),
+        ("tenant_*", None, ["tenant_1", "tenant_10", "tenant_2"]),
+        ("tenant_?, public", None, ["public", "tenant_1", "tenant_2"]),
+        (None, "tenant*", ["public"]),
+        ("~^tenant_\\d+$", "tenant_1*", ["tenant_2"]),
+    ],
+)
+def test_get_schemas_with_schema_filter(
+    connection: HarlequinPostgresConnection,
+    include: str | None,
+    exclude: str | None,
+    expected: list[str],
+) -> None:
+    for schema in ["tenant_1", "tenant_2", "tenant_10", "tenantx"]:
+        connection.execute(f"create schema {schema}")
+        connection.execute(
+            f"create function {schema}.fn_{schema}() returns int as 'select 1' "
+            "language sql"
+        )
+    filtered = HarlequinPostgresAdapter(
+        conn_str=(TEST_DB_CONN,),
+        dbname="test",
+        schema_include=include,
+        schema_exclude=exclude,
+    ).connect()
+    schemas = filtered._get_schemas("test")
+    assert [schema_label for _, schema_label in schemas] == expected
+    function_contexts = {
+        c.context for c in filtered.get_completions() if c.label.startswith("fn_tenant")
+    }
+    assert function_contexts == set(expected) - {"public"}
+    filtered.close()
 
 
 def test_get_completions(connection: HarlequinPostgresConnection) -> None:
@@ -126,6 +196,30 @@ def test_execute_select_dupe_cols(connection: HarlequinPostgresConnection) -> No
     assert backend.row_count == 1
 
 
+def test_column_type_labels(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create type mood as enum ('happy', 'sad')")
+    connection.execute("create domain posint as integer check (value > 0)")
+    cur = connection.execute(
+        """select
+            'happy'::mood as a,
+            array['sad'::mood] as b,
+            1::posint as c,
+            array[1::bigint] as d,
+            '{}'::jsonb as e,
+            now() as f
+        """
+    )
+    assert isinstance(cur, HarlequinCursor)
+    assert cur.columns() == [
+        ("a", "enm"),
+        ("b", "[enm]"),
+        ("c", "#"),
+        ("d", "[##]"),
+        ("e", "b{}"),
+        ("f", "ts"),
+    ]
+
+
 def test_set_limit(connection: HarlequinPostgresConnection) -> None:
     cur = connection.execute("select 1 as a union all select 2 union all select 3")
     assert isinstance(cur, HarlequinCursor)
@@ -142,6 +236,35 @@ def test_execute_raises_query_error(connection: HarlequinPostgresConnection) ->
         _ = connection.execute("sel;")
 
 
+def _transaction_status(connection: HarlequinPostgresConnection) -> TransactionStatus:
+    return connection._main_conn.info.transaction_status
+
+
+def test_manual_transaction_mode(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create table foo (a int)")
+    mode = connection.toggle_transaction_mode()
+    assert mode is not None and mode.label == "Manual"
+
+    connection.execute("insert into foo values (1)")
+    assert _transaction_status(connection) == TransactionStatus.INTRANS
+    connection.rollback()
+
+    # multiple statements can't be pipelined, but must still run in a transaction
+    connection.execute("insert into foo values (2); insert into foo values (3)")
+    assert _transaction_status(connection) == TransactionStatus.INTRANS
+    connection.commit()
+
+    with pytest.raises(HarlequinQueryError):
+        connection.execute("insert into foo values ('not an int')")
+    assert _transaction_status(connection) == TransactionStatus.IDLE
+
+    mode = connection.toggle_transaction_mode()
+    assert mode is not None and mode.label == "Auto"
+    cur = connection.execute("select a from foo order by a")
+    assert cur is not None
+    assert cur.fetchall() == [(2,), (3,)]
+
+
 def test_inf_timestamps(connection: HarlequinPostgresConnection) -> None:
     cur = connection.execute(
         """select
@@ -167,10 +290,1014 @@ def test_inf_timestamps(connection: HarlequinPostgresConnection) -> None:
     ]
 
 
-def test_closed_conn_raises_right_error(
+def test_closed_conn_is_replaced(connection: HarlequinPostgresConnection) -> None:
+    old_conn = connection._main_conn
+    old_conn.close()
+    cur = connection.execute("select 1")
+    assert cur is not None
+    assert cur.fetchall() == [(1,)]
+    assert connection._main_conn is not old_conn
+    assert isinstance(connection.pool.kwargs, dict)
+    assert connection.pool.kwargs["keepalives_idle"] == 30
+
+
+def _terminate_main_conn(connection: HarlequinPostgresConnection) -> None:
+    with connection.pool.connection() as conn:
+        conn.execute(
+            "select pg_terminate_backend(%s)", (connection._main_conn.info.backend_pid,)
+        )
+
+
+def test_dropped_conn_is_replaced(connection: HarlequinPostgresConnection) -> None:
+    # reads are retried on the new connection
+    _terminate_main_conn(connection)
+    cur = connection.execute("select 1")
+    assert cur is not None
+    assert cur.fetchall() == [(1,)]
+
+    # writes may have run, so they are not retried
+    connection.execute("create table orders (id int)")
+    _terminate_main_conn(connection)
+    with pytest.raises(HarlequinQueryError, match="may or may not have run"):
+        connection.execute("insert into orders values (1)")
+    connection.execute("insert into orders values (2)")
+
+    # a lost transaction is reported, and the next statement runs
+    connection.toggle_transaction_mode()
+    connection.execute("insert into orders values (3)")
+    _terminate_main_conn(connection)
+    with pytest.raises(HarlequinQueryError, match="transaction was rolled back"):
+        connection.execute("select * from orders")
+    cur = connection.execute("select id from orders order by id")
+    assert cur is not None
+    assert cur.fetchall() == [(2,)]
+    connection.rollback()
+
+    # a connection that was dropped while idle is checked before it is used
+    connection.toggle_transaction_mode()
+    _terminate_main_conn(connection)
+    connection._main_conn_used_at -= 60
+    cur = connection.execute("insert into orders values (4) returning id")
+    assert cur is not None
+    assert cur.fetchall() == [(4,)]
+
+
+def test_complete(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create schema sales")
+    connection.execute('create table sales.orders (id int, "Order Date" date)')
+    connection.execute("create table sales.order_items (order_id int)")
+    connection.execute("create view sales.big_orders as select 1 as id")
+
+    # the index is built by the first call to complete(), not by a refresh
+    completions = connection.get_completions()
+    assert len(connection._completion_index) == 0
+    assert [c.label for c in connection.complete("selec")] == ["select", "selective"]
+    assert len(connection._completion_index) == len(completions)
+    assert [c.label for c in connection.complete("autovacuum_n")] == [
+        "autovacuum_naptime"
+    ]
+    assert connection.complete("autovacuum", type_labels=["kw", "fn"]) == []
+    assert connection.complete("autovacuum", type_labels=["set"])
+
+    # relations and columns are indexed once their schema is loaded
+    assert connection.complete("ord", context="sales") == []
+    [sales_oid] = [
+        oid for oid, label in connection._get_schemas("test") if label == "sales"
+    ]
+    connection._load_catalog_store("test", [sales_oid])
+    assert [(c.label, c.type_label) for c in connection.complete("ORD", "sales")] == [
+        ("order_items", "t"),
+        ("orders", "t"),
+    ]
+    [order_date] = connection.complete("order", context="sales.orders")
+    assert order_date.value == '"Order Date"'
+    assert order_date.type_label == "col"
+
+    connection.execute("drop table sales.order_items")
+    connection._load_catalog_store("test", [sales_oid])
+    assert [c.label for c in connection.complete("ord", context="sales")] == ["orders"]
+    assert connection.complete("", context="sales.order_items") == []
+
+    # reloading a schema keeps the functions that get_completions indexed in it
+    connection.execute(
+        "create function sales.order_total() returns int language sql as 'select 1'"
+    )
+    connection.get_completions()
+    assert [c.type_label for c in connection.complete("order_t", "sales")] == ["fn"]
+    connection.execute("create table sales.order_notes (note text)")
+    connection._load_catalog_store("test", [sales_oid])
+    assert [c.label for c in connection.complete("order_", context="sales")] == [
+        "order_notes",
+        "order_total",
+    ]
+
+
+def test_meta_commands(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create schema sales")
+    connection.execute(
+        "create table sales.orders (id int not null default 1, note text)"
+    )
+    connection.execute("create index orders_id_idx on sales.orders (id)")
+    connection.execute("create view sales.big_orders as select id from sales.orders")
+    connection.execute(
+        "create function sales.double(x int) returns int as 'select x * 2' language sql"
+    )
+
+    cur = connection.execute("\\dt sales.*")
+    assert cur is not None
+    assert [name for name, _ in cur.columns()] == ["Schema", "Name", "Type"]
+    assert cur.fetchall() == [("sales", "orders", "table")]
+
+    cur = connection.execute("\\d sales.orders;")
+    assert cur is not None
+    assert cur.fetchall() == [
+        ("id", "integer", None, "not null", "1"),
+        ("note", "text", None, None, None),
+    ]
+
+    cur = connection.execute("\\dv+ big_*")
+    assert cur is not None
+    assert [row[:3] for row in cur.fetchall() or []] == [
+        ("sales", "big_orders", "view")
+    ]
+
+    cur = connection.execute("\\di sales.*")
+    assert cur is not None
+    assert cur.fetchall() == [("sales", "orders_id_idx", "orders", "btree")]
+
+    cur = connection.execute("\\dn sal*")
+    assert cur is not None
+    assert [row[0] for row in cur.fetchall() or []] == ["sales"]
+
+    cur = connection.execute("\\df sales.*")
+    assert cur is not None
+    assert cur.fetchall() == [("sales", "double", "integer", "x integer", "func")]
+
+    with pytest.raises(HarlequinQueryError):
+        connection.execute("\\dx")
+    with pytest.raises(HarlequinQueryError):
+        connection.execute("\\d sales.missing")
+
+    # unqualified names resolve with the editor's search path and temp tables
+    connection.execute("set search_path = sales")
+    cur = connection.execute("\\d orders")
+    assert cur is not None
+    assert [row[0] for row in cur.fetchall() or []] == ["id", "note"]
+    connection.toggle_transaction_mode()
+    connection.execute("create temp table scratch (a int)")
+    cur = connection.execute("\\d scratch")
+    assert cur is not None
+    assert cur.fetchall() == [("a", "integer", None, None, None)]
+    with pytest.raises(HarlequinQueryError):
+        connection.execute("\\d missing")
+    # the failed lookup did not abort the open transaction
+    cur = connection.execute("select count(*) from scratch")
+    assert cur is not None
+    assert cur.fetchall() == [(0,)]
+
+
+def test_meta_commands_use_fresh_catalog_store(
     connection: HarlequinPostgresConnection,
 ) -> None:
-    connection._main_conn.close()
+    connection.execute("create schema sales")
+    connection.execute("create table sales.orders (id int)")
+    connection._load_catalog_store("test")
+    assert connection.catalog_store.is_fresh(60)
+
+    # rows come from the store, which has not seen the new table yet
+    with connection.pool.connection() as conn:
+        conn.execute("create table sales.refunds (id int)")
+    cur = connection.execute("\\dt sales.*")
+    assert cur is not None
+    assert cur.fetchall() == [("sales", "orders", "table")]
+
+    # DDL in the editor marks the store as stale
+    connection.execute("create table sales.returns (id int)")
+    assert not connection.catalog_store.is_fresh(60)
+    cur = connection.execute("\\dt sales.*")
+    assert cur is not None
+    assert [row[1] for row in cur.fetchall() or []] == [
+        "orders",
+        "refunds",
+        "returns",
+    ]
+
+    # statements that can't change relations keep the store fresh
+    connection._load_catalog_store("test")
+    connection.execute("insert into sales.orders values (1); set work_mem = '8MB'")
+    connection.execute("update sales.orders set id = 2")
+    assert connection.catalog_store.is_fresh(60)
+    connection.execute("create table sales.copies as select * from sales.orders")
+    assert not connection.catalog_store.is_fresh(60)
+
+    # the store can reload before uncommitted DDL is visible to the pool
+    connection.toggle_transaction_mode()
+    connection.execute("create table sales.drafts (id int)")
+    connection._load_catalog_store("test")
+    assert connection.catalog_store.is_fresh(60)
+    connection.execute("commit")
+    assert not connection.catalog_store.is_fresh(60)
+
+
+def test_explain(connection: HarlequinPostgresConnection) -> None:
+    connection.execute(
+        "create table orders as select i as id from generate_series(1, 1000) i"
+    )
+    connection.execute("analyze orders")
+    query = "select count(*) from orders o join orders p using (id) where o.id < 100"
+
+    plan = connection.explain(query)
+    columns = [name for name, _ in plan.columns()]
+    assert columns[:5] == ["Node", "Parent", "Operation", "Object", "Self Cost"]
+    rows = plan.fetchall()
+    assert rows is not None
+    self_costs = [row[4] for row in rows]
+    assert self_costs == sorted(self_costs, reverse=True)
+    assert {row[3] for row in rows} >= {"orders o", "orders p"}
+    [root] = [row for row in rows if row[1] is None]
+    assert root[2] == "Aggregate"
+
+    cur = connection.execute(f"\\explain analyze {query};")
+    assert cur is not None
+    columns = [name for name, _ in cur.columns()]
+    assert "Self Time (ms)" in columns and "Shared Hit" in columns
+    rows = cur.fetchall()
+    assert rows is not None
+    self_times = [row[columns.index("Self Time (ms)")] for row in rows]
+    assert self_times == sorted(self_times, reverse=True)
+    [o_scan] = [row for row in rows if row[3] == "orders o"]
+    assert o_scan[columns.index("Actual Rows")] == 99
+
+    # analyze runs data-modifying statements in a transaction that is rolled back
+    connection.explain("delete from orders", analyze=True)
+    cur = connection.execute("select count(*) from orders")
+    assert cur is not None
+    assert cur.fetchall() == [(1000,)]
+
+    with pytest.raises(HarlequinQueryError):
+        connection.execute("\\explain")
+
+
+def test_stat_statements(connection: HarlequinPostgresConnection) -> None:
+    assert connection._get_stat_statements_source() is None
+    try:
+        connection.execute("create extension pg_stat_statements")
+    except HarlequinQueryError:
+        pytest.skip("pg_stat_statements is not available")
+    source = connection._get_stat_statements_source()
+    assert source is not None
+    assert source.total_time in ("total_exec_time", "total_time")
+    try:
+        before = connection._snapshot_statements(source, "test")
+    except HarlequinQueryError:
+        pytest.skip("pg_stat_statements is not in shared_preload_libraries")
+
+    connection.execute("select 1")
+    after = connection._snapshot_statements(source, "test")
+    assert after.taken_at >= before.taken_at
+    for sql in (
+        source.top_queries_sql("test"),
+        source.top_queries_delta_sql(before, after),
+    ):
+        cur = connection.execute(sql)
+        assert cur is not None
+        assert cur.columns()[0][0] == "Query ID"
+
+
+def test_sessions(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create table accounts (id int primary key, balance int)")
+    connection.execute("insert into accounts values (1, 100)")
+    connection.toggle_transaction_mode()
+    connection.execute("update accounts set balance = 0 where id = 1")
+    blocker_pid = connection._main_conn.info.backend_pid
+
+    conn = connection.pool.getconn()
+    blocked_pid = conn.info.backend_pid
+    errors: list[Exception] = []
+
+    def _update() -> None:
+        try:
+            conn.execute("update accounts set balance = 1 where id = 1")
+        except Exception as e:
+            errors.append(e)
+
+    thread = Thread(target=_update)
+    thread.start()
+    try:
+        for _ in range(50):
+            sessions = {s.pid: s for s in connection.get_sessions()}
+            if sessions[blocked_pid].blocked_by:
+                break
+            sleep(0.1)
+        cur = connection.execute("\\sessions")
+        assert cur is not None
+        assert cur.columns()[1] == ("PID", "#")
+        rows = cur.fetchall()
+        assert isinstance(rows, list)
+        # the blocker heads the tree, and the blocked session is nested under it
+        assert rows[0][:4] == (str(blocker_pid), blocker_pid, None, 1)
+        assert rows[1][:4] == (f"  └ {blocked_pid}", blocked_pid, blocker_pid, 0)
+        assert rows[1][9].endswith("on transactionid") or "accounts" in rows[1][9]
+
+        messages: list[str] = []
+
+        class RecordingDriver:
+            def notify(self, message: str, severity: str = "information") -> None:
+                messages.append(message)
+
+        monitor = SessionMonitor(
+            connection,
+            RecordingDriver(),  # type: ignore[arg-type]
+            threshold=timedelta(0),
+        )
+        monitor.check(connection.get_sessions())
+        monitor.check(connection.get_sessions())
+        assert len(messages) == 1
+        assert f"blocked by PID {blocker_pid}" in messages[0]
+
+        cur = connection.execute(f"\\cancel {blocked_pid}")
+        assert cur is not None
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert errors and isinstance(errors[0], QueryCanceled)
+    finally:
+        connection.rollback()
+        thread.join(timeout=5)
+        connection.pool.putconn(conn)
+
+    with pytest.raises(HarlequinQueryError):
+        connection.execute("\\cancel not-a-pid")
+
+
+def test_idle_transaction_guard(connection: HarlequinPostgresConnection) -> None:
+    cur = connection.execute("\\txn")
+    assert cur is not None
+    assert cur.fetchall() == [("No transaction is open.",)]
+
+    connection.execute("create table accounts (id int primary key, balance int)")
+    connection.toggle_transaction_mode()
+    connection.execute("insert into accounts values (1, 100)")
+    cur = connection.execute("\\txn")
+    assert cur is not None
+    assert cur.columns()[0] == ("Transaction Age", "|-|")
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    assert ("relation", "RowExclusiveLock", "public.accounts") in [
+        row[2:] for row in rows
+    ]
+
+    messages: list[str] = []
+    guard = IdleTransactionGuard(connection, timeout=60)
+    guard.notify = lambda message, severity="information": messages.append(message)
+    guard.check()
+    assert not messages
+
+    assert connection._transaction_started_at is not None
+    connection._transaction_started_at -= 120
+    connection._main_conn_used_at -= 50
+    guard.check()
+    guard.check()
+    assert len(messages) == 1
+    assert "open for 2m00s, and idle for 50s" in messages[0]
+    assert "if it is idle for 10s more" in messages[0]
+    assert connection._in_transaction()
+
+    connection._main_conn_used_at -= 10
+    guard.check()
+    assert len(messages) == 2
+    assert not connection._in_transaction()
+    with pytest.raises(HarlequinQueryError, match="idle for 60 seconds"):
+        connection.execute("commit")
+    connection.execute("commit")
+    cur = connection.execute("select count(*) from accounts")
+    assert cur is not None
+    assert cur.fetchall() == [(0,)]
+
+    # the Commit button reports the rollback, instead of committing nothing
+    connection.execute("insert into accounts values (2, 200)")
+    assert connection._transaction_started_at is not None
+    connection._main_conn_used_at -= 60
+    guard.check()
+    assert len(messages) == 3
+    with pytest.raises(HarlequinQueryError, match="Nothing was committed"):
+        connection.commit()
+    connection.commit()
+
+    # and rolling back acknowledges it
+    connection.execute("insert into accounts values (3, 300)")
+    connection._main_conn_used_at -= 60
+    guard.check()
+    assert len(messages) == 4
+    connection.rollback()
+    cur = connection.execute("select count(*) from accounts")
+    assert cur is not None
+    assert cur.fetchall() == [(0,)]
+    connection.rollback()
+
+
+def test_idle_transaction_server_timeout() -> None:
+    with pytest.raises(HarlequinConnectionError):
+        HarlequinPostgresAdapter(
+            conn_str=(TEST_DB_CONN,), idle_transaction_server_timeout=True
+        )
+    conn = HarlequinPostgresAdapter(
+        conn_str=(TEST_DB_CONN,),
+        idle_transaction_timeout="600",
+        idle_transaction_server_timeout=True,
+    ).connect()
+    try:
+        assert conn.idle_transaction_guard is not None
+        assert conn.idle_transaction_guard.is_alive()
+        cur = conn.execute("show idle_in_transaction_session_timeout")
+        assert cur is not None
+        assert cur.fetchall() == [("630s",)]
+    finally:
+        conn.close()
+
+
+def _show(connection: HarlequinPostgresConnection, setting: str) -> str:
+    cur = connection.execute(f"show {setting}")
+    assert cur is not None
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    return str(rows[0][0])
+
+
+def test_profiles(connection: HarlequinPostgresConnection) -> None:
+    # catalog queries have short timeouts, but the editor does not
+    with connection.pool.connection() as conn:
+        row = conn.execute("show lock_timeout").fetchone()
+        assert row == ("2s",)
+    assert _show(connection, "lock_timeout") == "0"
+    default_work_mem = _show(connection, "work_mem")
+
+    cur = connection.execute("\\profile browse")
+    assert cur is not None
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    assert ("browse", "yes") in [row[:2] for row in rows]
+    assert ("default", "", "(server defaults)") in rows
+    assert _show(connection, "statement_timeout") == "30s"
+    assert _show(connection, "jit") == "off"
+
+    connection.execute("\\profile analytics")
+    assert _show(connection, "work_mem") == "256MB"
+    assert _show(connection, "statement_timeout") == "0"
+    assert _show(connection, "jit") == "on"
+
+    # the old profile's settings are reset
+    connection.execute("\\profile default")
+    assert connection.profile == "default"
+    assert _show(connection, "work_mem") == default_work_mem
+    assert _show(connection, "max_parallel_workers_per_gather") == "2"
+
+    with pytest.raises(HarlequinQueryError, match="no profile named nope"):
+        connection.execute("\\profile nope")
+    connection.execute("begin")
+    with pytest.raises(HarlequinQueryError, match="Commit or roll back"):
+        connection.execute("\\profile browse")
+    connection.execute("rollback")
+    assert connection.profile == "default"
+
+
+def test_parse_profiles() -> None:
+    assert parse_profiles(None) == {}
+    assert parse_profiles("etl: work_mem=1GB, statement_timeout=0; quick:") == {
+        "etl": {"work_mem": "1GB", "statement_timeout": "0"},
+        "quick": {},
+    }
+    assert parse_profiles({"etl": {"max_parallel_workers_per_gather": 8}}) == {
+        "etl": {"max_parallel_workers_per_gather": "8"}
+    }
+    with pytest.raises(ValueError):
+        parse_profiles("work_mem=1GB")
+    with pytest.raises(HarlequinConnectionError):
+        HarlequinPostgresAdapter(conn_str=(TEST_DB_CONN,), profile="nope")
+
+    conn = HarlequinPostgresAdapter(
+        conn_str=(TEST_DB_CONN,),
+        profiles="etl: work_mem=1GB",
+        profile="etl",
+    ).connect()
+    try:
+        assert _show(conn, "work_mem") == "1GB"
+    finally:
+        conn.close()
+
+
+def test_normalize_query() -> None:
+    assert (
+        normalize_query("SELECT  *\n FROM Orders -- all\n;") == "select * from orders"
+    )
+    assert (
+        normalize_query("select 'A  B', \"Mixed  Case\" /* c */ from t")
+        == "select 'A  B', \"Mixed  Case\"   from t"
+    )
+    assert normalize_query("select $x$ A $x$") == "select $x$ A $x$"
+
 
+def test_called_functions() -> None:
+    assert called_functions("select count(*) from orders") == {"count"}
+    assert called_functions(
+        'select Public.My_Fn(1), "Odd""Fn" (2), \'f(3)\' -- g(4)'
+    ) == {"my_fn", 'Odd"Fn'}
+    assert not called_functions("select * from orders")
+
+
+def test_result_cache_eviction() -> None:
+    rows = [(i, "x" * 100) for i in range(10)]
+    cache = ResultCache(max_bytes=6000)
+    assert cache.put("a", [], rows)
+    assert cache.put("b", [], rows)
+    assert cache.get("a") is not None
+    # b is the least recently used, so it makes room for c
+    assert cache.put("c", [], rows)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert 0 < cache.size <= cache.max_bytes
+    assert not cache.put("d", [], rows * 10)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    expired = ResultCache(max_bytes=6000, ttl=0)
+    expired.put("a", [], rows)
+    assert expired.get("a") is None
+    assert expired.size == 0
+
+
+def test_result_cache(connection: HarlequinPostgresConnection) -> None:
+    connection.result_cache = ResultCache(max_bytes=1024 * 1024)
+    connection.execute("create table orders (id int)")
+    connection.execute("insert into orders values (1), (2)")
+
+    cur = connection.execute("select count(*) from orders")
+    assert cur is not None
+    assert cur.fetchall() == [(2,)]
+    cur = connection.execute("SELECT count(*)\nFROM orders;")
+    assert isinstance(cur, StaticCursor)
+    assert cur.columns() == [("count", "##")]
+    assert cur.fetchall() == [(2,)]
+    assert (connection.result_cache.hits, connection.result_cache.misses) == (1, 1)
+
+    # writes clear the cache
+    connection.execute("insert into orders values (3)")
+    assert len(connection.result_cache) == 0
+    cur = connection.execute("select count(*) from orders")
+    assert cur is not None
+    assert cur.fetchall() == [(3,)]
+
+    # the search_path is part of the key
+    connection.execute("create schema other")
+    connection.execute("create table other.orders (id int)")
+    cur = connection.execute("select count(*) from orders")
+    assert cur is not None
+    # a result is cached once it is fetched
+    assert cur.fetchall() == [(3,)]
+    connection.execute("set search_path to other")
+    cur = connection.execute("select count(*) from orders")
+    assert cur is not None
+    assert cur.fetchall() == [(0,)]
+
+    cur = connection.execute("\\cache")
+    assert cur is not None
+    stats = dict(cur.fetchall())  # type: ignore[arg-type]
+    assert stats["Hits"] == "1"
+    assert stats["Results"] == "2"
+    cur = connection.execute("\\cache clear")
+    assert cur is not None
+    assert dict(cur.fetchall())["Results"] == "0"  # type: ignore[arg-type]
+
+    # queries that call volatile functions are never cached
+    connection.execute("reset search_path")
+    connection.execute(
+        "create function add_order() returns int language sql "
+        "as $$ insert into orders values (10) returning id $$"
+    )
+    for query in [
+        "select pg_terminate_backend(0)",
+        "select pg_advisory_lock(1)",
+        "select set_config('application_name', 'x', false)",
+        "select random()",
+        "select add_order()",
+    ]:
+        cur = connection.execute(query)
+        assert cur is not None
+        cur.fetchall()
+        cur = connection.execute(query)
+        assert not isinstance(cur, StaticCursor), query
+        assert cur is not None
+        cur.fetchall()
+    assert len(connection.result_cache) == 0
+    cur = connection.execute("select count(*) from orders where id = 10")
+    assert cur is not None
+    assert cur.fetchall() == [(2,)]
+    connection.execute("select pg_advisory_unlock_all()")
+    # but immutable and stable functions are
+    cur = connection.execute("select count(*), now() from orders")
+    assert cur is not None
+    cur.fetchall()
+    cur = connection.execute("select count(*), now() from orders")
+    assert isinstance(cur, StaticCursor)
+
+
+def test_result_cache_fetch_budget(connection: HarlequinPostgresConnection) -> None:
+    connection.result_cache = ResultCache(max_bytes=64 * 1024)
+    query = "select i, 'row ' || i from generate_series(1, 5000) as s(i)"
+
+    # too large to cache, but every row is still returned
+    cur = connection.execute(query)
+    assert isinstance(cur, CachingCursor)
+    rows = cur.fetchall()
+    assert len(rows) == 5000 and rows[-1] == (5000, "row 5000")
+    assert len(connection.result_cache) == 0
+
+    # more rows than the limit aren't cached, since the rest isn't fetched
+    cur = connection.execute(query)
+    assert cur is not None
+    rows = cur.set_limit(10).fetchall()
+    assert isinstance(rows, list) and len(rows) == 10
+    assert len(connection.result_cache) == 0
+
+    # a result smaller than the limit and the cache is
+    cur = connection.execute("select 1")
+    assert cur is not None
+    assert cur.set_limit(10).fetchall() == [(1,)]
+    assert len(connection.result_cache) == 1
+
+
+def test_materialize(connection: HarlequinPostgresConnection) -> None:
+    pytest.importorskip("duckdb")
+    connection.execute(
+        """
+        create table orders (
+            id int primary key,
+            amount numeric(10, 2),
+            ratio numeric,
+            placed_at timestamptz,
+            region text,
+            tags text[],
+            details jsonb
+        )
+        """
+    )
+    connection.execute(
+        """
+        insert into orders
+        select
+            g,
+            g * 1.5,
+            g / 3.0,
+            '2024-01-01'::timestamptz + g * interval '1 hour',
+            case when g % 2 = 0 then 'east' else 'west' end,
+            array['a', 'b'],
+            jsonb_build_object('n', g)
+        from generate_series(1, 25000) g
+        """
+    )
+
+    cur = connection.execute(
+        "\\materialize local_orders\nselect *, id as id from orders where id > 10"
+    )
+    assert cur is not None
+    assert "Copied 24990 rows into the local table local_orders" in str(cur.fetchall())
+
+    cur = connection.execute(
+        "\\local select region, count(*), sum(amount) from local_orders "
+        "group by region order by region"
+    )
+    assert cur is not None
+    assert cur.columns() == [
+        ("region", "s"),
+        ("count_star()", "##"),
+        ("sum(amount)", "#.#"),
+    ]
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    assert [row[:2] for row in rows] == [("east", 12495), ("west", 12495)]
+
+    cur = connection.execute(
+        "\\local select column_name, data_type from information_schema.columns "
+        "where table_name = 'local_orders' order by ordinal_position"
+    )
+    assert cur is not None
+    assert cur.fetchall() == [
+        ("id", "INTEGER"),
+        ("amount", "DECIMAL(10,2)"),
+        ("ratio", "DOUBLE"),
+        ("placed_at", "TIMESTAMP WITH TIME ZONE"),
+        ("region", "VARCHAR"),
+        ("tags", "VARCHAR"),
+        ("details", "VARCHAR"),
+        ("id_2", "INTEGER"),
+    ]
+
+    cur = connection.execute("\\local")
+    assert cur is not None
+    assert cur.fetchall() == [("local_orders", 24990, 8)]
+
+    # a failed copy keeps the old table
+    with pytest.raises(HarlequinQueryError):
+        connection.execute("\\materialize local_orders select 1 / 0")
+    cur = connection.execute("\\local select count(*) from local_orders")
+    assert cur is not None
+    assert cur.fetchall() == [(24990,)]
+
+    with pytest.raises(HarlequinQueryError, match="Usage"):
+        connection.execute("\\materialize bad-name select 1")
+
+
+def test_index_advisor(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create table orders (id int primary key, a int, b int)")
+    connection.execute("create index orders_a on orders (a)")
+    connection.execute("create index orders_a_b on orders (a, b)")
+    connection.execute("create index orders_a_copy on orders (a)")
+    cur = connection.execute(
+        index_advisor_sql(
+            '"public"."orders"',
+            "select 'orders'::regclass::oid as oid",
+        )
+    )
+    assert cur is not None
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    findings = {(row[0], row[3]): (row[6], row[7]) for row in rows}
+    # the primary key enforces a constraint, so it is never reported
+    assert {index for _, index in findings} == {
+        "orders_a",
+        "orders_a_b",
+        "orders_a_copy",
+    }
+    assert ("Unused index", "orders_a_b") in findings
+    detail, suggestion = findings[("Duplicate index", "orders_a")]
+    assert detail == "Its keys are a prefix of orders_a_b"
+    assert suggestion == "drop index concurrently public.orders_a;"
+    assert ("Duplicate index", "orders_a_copy") in findings
+    assert ("Duplicate index", "orders_a_b") not in findings
+
+
+def test_column_stats(connection: HarlequinPostgresConnection) -> None:
+    connection.execute(
+        "create table events as select i % 4 as kind, "
+        "case when i % 10 != 0 then i end as id from generate_series(1, 10000) i"
+    )
+    cur = connection.execute(column_stats_sql("public", "events", "kind"))
+    assert cur is not None
+    assert cur.fetchall() == []
+
+    connection.execute("analyze events")
+    cur = connection.execute(column_stats_sql("public", "events", "kind"))
+    assert cur is not None
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    assert rows[0] == ("Estimated rows", "10000", None)
+    assert ("Distinct values", "4", None) in rows
+    assert sorted(row[1] for row in rows if row[0] == "Most common value") == [
+        "0",
+        "1",
+        "2",
+        "3",
+    ]
+    cur = connection.execute(column_stats_sql("public", "events", "id"))
+    assert cur is not None
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    assert ("Null fraction", None, 10) in rows
+    buckets = [row for row in rows if row[0] == "Histogram bucket"]
+    assert buckets and buckets[0][1].startswith("1 to ")
+
+    cur = connection.execute(column_profile_sql('"public"."events"', '"kind"', 100))
+    assert cur is not None
+    assert sorted(cur.fetchall() or []) == [
+        (str(kind), 2500, 25, 2500, 4) for kind in range(4)
+    ]
+
+
+def test_sample_data(connection: HarlequinPostgresConnection) -> None:
+    connection.execute(
+        "create table events as select i as id from generate_series(1, 200000) i"
+    )
+    cur = connection.execute("select 'events'::regclass::oid")
+    assert cur is not None
+    [(oid,)] = cur.fetchall() or []
+    # never vacuumed or analyzed, so the density is assumed
+    [(reltuples, relpages, pages)] = connection._get_sample_sizes(oid)
+    assert (reltuples, relpages) == (-1, 0) and pages > 128
+    connection.execute("analyze events")
+    sizes = connection._get_sample_sizes(oid)
+    method, percent = sample_method(sizes)
+    assert method == "system"
+    # enough for 300 rows, but at least 10 of the table's pages
+    assert percent == pytest.approx(100 * 10 / sizes[0][2])
+    cur = connection.execute(sample_data_sql('"public"."events"', method, percent))
+    assert cur is not None
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    assert 0 < len(rows) <= 100
+    assert len({row[0] for row in rows}) == len(rows)
+
+    plan = connection.explain(sample_data_sql('"public"."events"', method, percent))
+    assert any("Sample Scan" in row for row in plan.fetchall() or [])
+
+    # small tables are sampled row by row, and empty ones read in full
+    assert sample_method([(1000, 5, 5)]) == ("bernoulli", 30)
+    assert sample_method([(0, 0, 0)]) == ("bernoulli", 100)
+    assert sample_method([(-1, 0, 1000), (20_000, 1000, 1000)]) == ("system", 0.5)
+    method, percent = sample_method([(100_000, 10_000, 10_000)])
+    assert method == "system"
+    assert percent == pytest.approx(0.3)
+
+
+def test_bloat(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create table events (id int primary key, payload text)")
+    connection.execute(
+        "insert into events select i, repeat('x', 50) from generate_series(1, 20000) i"
+    )
+    connection.execute("delete from events where id % 4 != 0")
+    connection.execute("vacuum analyze events")
+    scope = "select 'events'::regclass::oid as oid"
+    cur = connection.execute(bloat_estimate_sql('"public"."events"', scope))
+    assert cur is not None
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    assert {(row[0], row[3]) for row in rows} == {
+        ("table", None),
+        ("index", "events_pkey"),
+    }
+    # three quarters of the rows were deleted, so most of each is wasted
+    assert all(row[6] > 50 for row in rows)
+    wasted = [row[7] for row in rows]
+    assert wasted == sorted(wasted, reverse=True)
+
+    assert connection._get_extension_schema("pgstattuple") is None
+    try:
+        connection.execute("create extension pgstattuple")
+    except HarlequinQueryError:
+        pytest.skip("pgstattuple is not available")
+    cur = connection.execute(bloat_exact_sql('"public"."events"', scope, "public"))
+    assert cur is not None
+    rows = cur.fetchall()
+    assert isinstance(rows, list)
+    assert len(rows) == 2
+
+
+def test_progress_notifications(connection: HarlequinPostgresConnection) -> None:
+    assert progress_query("select 1") is None
+    assert progress_query("-- build it\nCREATE UNIQUE INDEX i on t (a)") is not None
+    assert progress_query("vacuum (analyze) t") is not None
+
+    messages: list[str] = []
+    connection.progress_notifier = messages.append
+    connection.progress_interval = 0.05
+    connection.execute("create table jobs (id int)")
+    # an open transaction that wrote to the table makes CREATE INDEX
+    # CONCURRENTLY wait in a known phase until it commits
+    writer = connection.pool.getconn()
+    writer.execute("begin")
+    writer.execute("insert into jobs values (1)")
+    thread = Thread(
+        target=connection.execute,
+        args=("create index concurrently jobs_id on jobs (id)",),
+    )
+    thread.start()
+    try:
+        for _ in range(50):
+            if messages:
+                break
+            sleep(0.1)
+    finally:
+        writer.execute("commit")
+        connection.pool.putconn(writer)
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert messages[0].startswith(
+        "CREATE INDEX CONCURRENTLY: waiting for writers before build"
+    )
+
+
+def test_maintenance(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create table items (id int primary key)")
+    connection.execute("insert into items select generate_series(1, 100)")
+    connection.execute("create materialized view item_ids as select id from items")
+    cur = connection.execute("select 'items'::regclass::oid, 'item_ids'::regclass::oid")
+    assert cur is not None
+    [(table_oid, view_oid)] = cur.fetchall()  # type: ignore[misc]
+
+    info = connection._get_maintenance_info(table_oid)
+    assert info is not None
+    assert info[0] is None  # never vacuumed
+    assert info[6:] == (True, True)
+    view_info = connection._get_maintenance_info(view_oid)
+    assert view_info is not None and view_info[6:] == (True, False)
+
+    # maintenance runs outside of the main connection's open transaction
+    connection.toggle_transaction_mode()
+    connection.execute("select 1")
+    assert _transaction_status(connection) == TransactionStatus.INTRANS
+    messages: list[str] = []
+    connection._run_maintenance('vacuum (analyze) "public"."items"', messages.append)
     with pytest.raises(HarlequinQueryError):
-        connection.execute("select 1")
+        connection._run_maintenance(
+            'refresh materialized view concurrently "public"."item_ids"'
+        )
+    # REINDEX CONCURRENTLY waits for open transactions, like the one above
+    connection.rollback()
+    connection._run_maintenance('reindex table concurrently "public"."items"')
+
+    info = connection._get_maintenance_info(table_oid)
+    assert info is not None
+    assert info[0] is not None and info[2] is not None
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("select 1", True),
+        ("  -- comment\n/* block */ WITH a as (select 1) select * from a;", True),
+        ("table orders", True),
+        ("explain (analyze, buffers) select * from orders", True),
+        ("select 'insert into t' as note, \"update\" from t", True),
+        ("select $$delete$$", True),
+        ("explain analyze delete from orders", False),
+        ("with d as (delete from t returning *) select * from d", False),
+        ("select * into new_table from orders", False),
+        ("select * from orders for update", False),
+        ("select * from orders for no key update skip locked", False),
+        ("select nextval('orders_id_seq')", False),
+        ("select 1; select 2", False),
+        ("insert into orders values (1)", False),
+        ("set work_mem = '1GB'", False),
+    ],
+)
+def test_is_read_only(query: str, expected: bool) -> None:
+    assert is_read_only(query) is expected
+
+
+def test_parse_replica_hosts() -> None:
+    assert parse_replica_hosts(None) == []
+    assert parse_replica_hosts("r1, r2:5433,,[::1]:5434, ::1") == [
+        ("r1", None),
+        ("r2", "5433"),
+        ("::1", "5434"),
+        ("::1", None),
+    ]
+    assert parse_replica_hosts(["r1", "r2:5433"]) == [("r1", None), ("r2", "5433")]
+
+
+# run a streaming replica of the test server on this port to test routing, e.g.
+# pg_basebackup -h localhost -U postgres -D replica -R && postgres -D replica -p 5433
+TEST_REPLICA_HOST = "localhost:5433"
+
+
+def test_replica_routing(connection: HarlequinPostgresConnection) -> None:
+    conn = HarlequinPostgresAdapter(
+        conn_str=(TEST_DB_CONN,), dbname="test", replica_hosts=TEST_REPLICA_HOST
+    ).connect()
+    try:
+        assert conn.replicas is not None
+        if conn.replicas.pick() is None:
+            pytest.skip(f"No replica is running at {TEST_REPLICA_HOST}")
+        in_recovery = "select pg_catalog.pg_is_in_recovery()"
+
+        def run(query: str) -> list[tuple]:
+            cur = conn.execute(query)
+            assert cur is not None
+            return list(cur.fetchall() or [])
+
+        assert run(in_recovery) == [(True,)]
+        # writes, and locking reads, stay on the primary
+        assert run(f"{in_recovery} for update") == [(False,)]
+        conn.execute("create table orders (id int)")
+        assert run("insert into orders values (1) returning false") == [(False,)]
+        # session settings are replayed on the replica
+        conn.execute("set work_mem = '7MB'")
+        assert run(f"{in_recovery}, current_setting('work_mem')") == [(True, "7MB")]
+        conn.execute("reset work_mem")
+        assert run(f"{in_recovery}, current_setting('work_mem')") == [(True, "4MB")]
+        # functions that write fail on the replica, so they run on the primary
+        conn.execute(
+            "create function add_order() returns bool language sql as "
+            "'insert into orders values (2); select pg_is_in_recovery()'"
+        )
+        assert run("select add_order()") == [(False,)]
+        # everything in Manual mode runs on the primary
+        conn.toggle_transaction_mode()
+        assert run(in_recovery) == [(False,)]
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def test_unavailable_replica_falls_back_to_primary(
+    connection: HarlequinPostgresConnection,
+) -> None:
+    conn = HarlequinPostgresAdapter(
+        conn_str=(TEST_DB_CONN,), dbname="test", replica_hosts="localhost:1"
+    ).connect()
+    try:
+        assert conn.replicas is not None
+        assert conn.replicas.pick() is None
+        assert conn._catalog_pool() is conn.pool
+        cur = conn.execute("select pg_catalog.pg_is_in_recovery()")
+        assert cur is not None
+        assert cur.fetchall() == [(False,)]
+    finally:
+        conn.close()
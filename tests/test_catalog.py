@@ -5,12 +5,17 @@ from harlequin_postgres.adapter import HarlequinPostgresConnection
 from harlequin_postgres.catalog import (
     ColumnCatalogItem,
     DatabaseCatalogItem,
+    ForeignCatalogItem,
     MaterializedViewCatalogItem,
+    PartitionedTableCatalogItem,
+    PartitionsCatalogItem,
     RelationCatalogItem,
     SchemaCatalogItem,
     TableCatalogItem,
+    TempTableCatalogItem,
     ViewCatalogItem,
 )
+from harlequin_postgres.meta_commands import MetaCommand, _find_relation
 
 
 @pytest.fixture
@@ -84,6 +89,7 @@ def test_catalog(connection_with_objects: HarlequinPostgresConnection) -> None:
     ]
 
     # ensure calling fetch_children on cols doesn't raise
+    assert isinstance(foo_column_items[0], ColumnCatalogItem)
     children_items = foo_column_items[0].fetch_children()
     assert not children_items
 
@@ -111,3 +117,253 @@ def test_catalog(connection_with_objects: HarlequinPostgresConnection) -> None:
     foo_mv_cols = foo_mv_item.fetch_children()
     assert foo_mv_cols
     assert all(isinstance(item, ColumnCatalogItem) for item in foo_mv_cols)
+
+
+def test_catalog_items_are_addressed_by_oid(
+    connection: HarlequinPostgresConnection,
+) -> None:
+    connection.execute("create schema one")
+    connection.execute("create schema two")
+    connection.execute("create table one.foo as select 1 as a, '2' as b")
+    connection.execute("create domain two.posint as integer check (value > 0)")
+    connection.execute("create table two.foo (c two.posint)")
+
+    catalog = connection.get_catalog()
+    [test_db_item] = filter(lambda item: item.label == "test", catalog.items)
+    assert isinstance(test_db_item, DatabaseCatalogItem)
+    schema_items = test_db_item.fetch_children()
+    assert all(item.oid is not None for item in schema_items)
+
+    column_labels: dict[str, list[tuple[str, str]]] = {}
+    for schema_item in filter(lambda item: item.label in ("one", "two"), schema_items):
+        [foo_item] = schema_item.fetch_children()
+        assert isinstance(foo_item, TableCatalogItem)
+        assert foo_item.oid is not None
+        assert foo_item.parent is schema_item
+        column_labels[schema_item.label] = [
+            (item.label, item.type_label) for item in foo_item.fetch_children()
+        ]
+
+    assert column_labels == {"one": [("a", "#"), ("b", "s")], "two": [("c", "#")]}
+
+
+def test_partitioned_tables_collapse_partitions(
+    connection: HarlequinPostgresConnection,
+) -> None:
+    connection.execute("create schema events")
+    connection.execute("create schema archive")
+    connection.execute(
+        "create table events.clicks (id int, day date) partition by range (day)"
+    )
+    for i in range(1, 4):
+        connection.execute(
+            f"create table events.clicks_{i} partition of events.clicks "
+            f"for values from ('2026-01-0{i}') to ('2026-01-0{i + 1}')"
+        )
+    connection.execute(
+        "create table archive.clicks_old partition of events.clicks "
+        "for values from ('2025-01-01') to ('2026-01-01')"
+    )
+
+    catalog = connection.get_catalog()
+    [test_db_item] = filter(lambda item: item.label == "test", catalog.items)
+    assert isinstance(test_db_item, DatabaseCatalogItem)
+    schema_items = test_db_item.fetch_children()
+    [events_item] = filter(lambda item: item.label == "events", schema_items)
+    [archive_item] = filter(lambda item: item.label == "archive", schema_items)
+
+    # leaf partitions are not listed as siblings of their parent
+    assert not archive_item.fetch_children()
+    [clicks_item] = events_item.fetch_children()
+    assert isinstance(clicks_item, PartitionedTableCatalogItem)
+
+    *column_items, partitions_item = clicks_item.fetch_children()
+    assert [item.label for item in column_items] == ["id", "day"]
+    assert isinstance(partitions_item, PartitionsCatalogItem)
+    assert partitions_item.label.startswith("partitions (4, ")
+
+    partition_items = partitions_item.fetch_children()
+    assert all(isinstance(item, TableCatalogItem) for item in partition_items)
+    assert [item.qualified_identifier for item in partition_items] == [
+        '"events"."clicks_1"',
+        '"events"."clicks_2"',
+        '"events"."clicks_3"',
+        '"archive"."clicks_old"',
+    ]
+
+
+def test_relations_are_materialized_from_catalog_store(
+    connection: HarlequinPostgresConnection,
+) -> None:
+    connection.execute("create schema one")
+    connection.execute("create schema empty")
+    connection.execute("create table one.foo (id int, created_at timestamptz)")
+    connection.execute("create table one.bar (id int)")
+    connection.execute("create view one.baz as select 1 as a")
+
+    catalog = connection.get_catalog()
+    [test_db_item] = filter(lambda item: item.label == "test", catalog.items)
+    assert isinstance(test_db_item, DatabaseCatalogItem)
+    schema_items = test_db_item.fetch_children()
+    [one_item] = filter(lambda item: item.label == "one", schema_items)
+    [empty_item] = filter(lambda item: item.label == "empty", schema_items)
+    assert one_item.oid is not None and empty_item.oid is not None
+
+    assert not empty_item.fetch_children()
+    assert empty_item.oid in connection.catalog_store
+    relation_items = one_item.fetch_children()
+    assert [item.label for item in relation_items] == ["bar", "baz", "foo"]
+    schema_slice = connection.catalog_store.schema(one_item.oid)
+    assert schema_slice is not None
+    assert len(schema_slice) == 3
+    # both tables share a single interned "id" string
+    assert schema_slice.column_names[0] is schema_slice.column_names[2]
+
+    # columns come from the store, so they are unchanged until a refresh
+    connection.execute("alter table one.foo add column extra text")
+    [foo_item] = filter(lambda item: item.label == "foo", relation_items)
+    column_items = foo_item.fetch_children()
+    assert [(item.label, item.type_label) for item in column_items] == [
+        ("id", "#"),
+        ("created_at", "ts"),
+    ]
+    assert column_items[1].qualified_identifier == '"one"."foo"."created_at"'
+
+    connection.get_catalog()
+    assert len(connection.catalog_store) == 0
+    assert [item.label for item in foo_item.fetch_children()] == [
+        "id",
+        "created_at",
+        "extra",
+    ]
+
+
+def test_meta_commands_use_expanded_schemas(
+    connection: HarlequinPostgresConnection,
+) -> None:
+    connection.execute("create schema one")
+    connection.execute("create schema two")
+    connection.execute("create table one.foo (id int)")
+    connection.execute("create table two.bar (id int)")
+    find_foo = MetaCommand.parse("\\d one.foo")
+    assert find_foo is not None
+    assert _find_relation(connection, find_foo) is None
+
+    catalog = connection.get_catalog()
+    [test_db_item] = filter(lambda item: item.label == "test", catalog.items)
+    assert isinstance(test_db_item, DatabaseCatalogItem)
+    schema_items = test_db_item.fetch_children()
+    [one_item] = filter(lambda item: item.label == "one", schema_items)
+    [foo_item] = one_item.fetch_children()
+    assert _find_relation(connection, find_foo) == foo_item.oid
+
+    # rows for the expanded schema come from the store, which has not seen
+    # a table created by another session yet
+    with connection.pool.connection() as conn:
+        conn.execute("create table one.baz (id int)")
+        conn.execute("create table two.qux (id int)")
+    cur = connection.execute("\\dt one.*")
+    assert cur is not None
+    assert cur.fetchall() == [("one", "foo", "table")]
+    # but two was not expanded, so a pattern that matches it runs a query
+    cur = connection.execute("\\dt")
+    assert cur is not None
+    assert [row[1] for row in cur.fetchall() or []] == ["baz", "foo", "bar", "qux"]
+
+    # DDL in the editor marks the expanded schemas as stale
+    connection.execute("create table one.quux (id int)")
+    assert _find_relation(connection, find_foo) is None
+    cur = connection.execute("\\dt one.*")
+    assert cur is not None
+    assert [row[1] for row in cur.fetchall() or []] == ["baz", "foo", "quux"]
+
+
+def test_search_catalog(connection: HarlequinPostgresConnection) -> None:
+    connection.execute("create schema sales")
+    connection.execute("create schema hr")
+    connection.execute("create table sales.orders (id int, customer_id int)")
+    connection.execute("create table sales.order_items (order_id int, sku text)")
+    connection.execute("create table hr.customers (id int, name text)")
+
+    items = connection.search_catalog("order")
+    assert [item.qualified_identifier for item in items[:3]] == [
+        '"sales"."orders"',
+        '"sales"."order_items"."order_id"',
+        '"sales"."order_items"',
+    ]
+    [customers_item] = connection.search_catalog("custmers", limit=1)
+    assert isinstance(customers_item, TableCatalogItem)
+    assert customers_item.label == "customers"
+    assert [col.label for col in customers_item.fetch_children()] == ["id", "name"]
+    [column_item] = connection.search_catalog("customer_id", limit=1)
+    assert isinstance(column_item, ColumnCatalogItem)
+    assert column_item.type_label == "#"
+    assert column_item.parent is not None
+    assert column_item.parent.label == "orders"
+
+    # reloading one schema re-indexes it on the next search
+    with connection.pool.connection() as conn:
+        conn.execute("create table hr.payroll (id int)")
+    assert not connection.search_catalog("payroll")
+    [test_db_item] = filter(
+        lambda item: item.label == "test", connection.get_catalog().items
+    )
+    assert isinstance(test_db_item, DatabaseCatalogItem)
+    [hr_item] = filter(lambda item: item.label == "hr", test_db_item.fetch_children())
+    hr_item.fetch_children()
+    [payroll_item, *_] = connection.search_catalog("payroll")
+    assert payroll_item.qualified_identifier == '"hr"."payroll"'
+
+
+def test_search_catalog_ranks_across_schemas(
+    connection: HarlequinPostgresConnection,
+) -> None:
+    # weaker schema matches fill the limit before any relation is expanded
+    for i in range(25):
+        connection.execute(f"create schema xorders_archive_{i:02}")
+    connection.execute("create table public.orders (id int)")
+    connection.execute("create table public.orders_2 (id int)")
+
+    items = connection.search_catalog("orders", limit=20)
+    assert [item.qualified_identifier for item in items[:2]] == [
+        '"public"."orders"',
+        '"public"."orders_2"',
+    ]
+    assert len(items) == 20
+
+
+def test_maintenance_interactions() -> None:
+    maintenance = {"Vacuum Analyze", "Reindex Concurrently"}
+    for item_class in (
+        TableCatalogItem,
+        PartitionedTableCatalogItem,
+        MaterializedViewCatalogItem,
+    ):
+        labels = {label for label, _ in item_class.INTERACTIONS}
+        assert maintenance <= labels, item_class
+    assert "Refresh Materialized View" in {
+        label for label, _ in MaterializedViewCatalogItem.INTERACTIONS
+    }
+    # other connections can't see this session's temporary tables
+    temp_labels = {label for label, _ in TempTableCatalogItem.INTERACTIONS}
+    assert not maintenance & temp_labels
+    assert "Describe Indexes" in temp_labels
+    assert not maintenance & {label for label, _ in ViewCatalogItem.INTERACTIONS}
+
+
+def test_column_interactions() -> None:
+    labels = {label for label, _ in ColumnCatalogItem.INTERACTIONS}
+    assert labels == {"Column Stats", "Column Profile (Sampled)"}
+
+
+def test_sample_data_interactions() -> None:
+    for item_class in (
+        TableCatalogItem,
+        PartitionedTableCatalogItem,
+        TempTableCatalogItem,
+        MaterializedViewCatalogItem,
+    ):
+        assert "Sample Data" in {label for label, _ in item_class.INTERACTIONS}
+    # views and foreign tables can't be sampled
+    for other_class in (ViewCatalogItem, ForeignCatalogItem):
+        assert "Sample Data" not in {label for label, _ in other_class.INTERACTIONS}